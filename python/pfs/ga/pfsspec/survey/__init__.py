@@ -1 +1,4 @@
-from .survey import Survey
\ No newline at end of file
+from .survey import Survey
+from .surveystore import SurveyStore, PickleSurveyStore
+from .hdf5surveystore import Hdf5SurveyStore
+from .surveyspectra import SurveySpectra
\ No newline at end of file
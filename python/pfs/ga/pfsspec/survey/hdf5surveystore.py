@@ -0,0 +1,239 @@
+import pickle
+import numpy as np
+import pandas as pd
+import h5py
+
+from .surveystore import SurveyStore
+
+class Hdf5SurveyStore(SurveyStore):
+    """
+    Implements a survey store in an HDF5 file.
+
+    The params are stored as a table, one dataset per column. Spectra are not
+    uniform, so they are pickled one by one and concatenated into a single
+    chunked, compressed byte array with an index of offsets. Any spectrum can be
+    read without reading the rest of the file and new spectra are appended by
+    resizing the datasets, without rewriting the file.
+
+    Layout of the file:
+
+        /params/index       index of the params DataFrame
+        /params/0, 1, ...   columns of the params DataFrame, names in attribute `columns`
+        /params/0_null, ... null mask of string columns with missing values
+        /spectra/data       pickled spectra, concatenated
+        /spectra/offsets    offset of each spectrum in `data`, plus the end of the last one
+        /spectra/index      index of each spectrum
+
+    Variables
+    ---------
+    compression : str
+        Compression filter of the spectrum data, or None.
+    chunk_size : int
+        Size of the chunks of the spectrum data, in bytes.
+    """
+
+    # Default chunk size of the spectrum data
+    CHUNK_SIZE = 1 << 20
+
+    # Pickled spectra are written in batches of this size
+    WRITE_BUFFER_SIZE = 16 << 20
+
+    # Size of the HDF5 chunk cache so that consecutive reads hit decompressed chunks
+    CHUNK_CACHE_SIZE = 64 << 20
+
+    def __init__(self, filename=None, compression='gzip', chunk_size=None, orig=None):
+        super().__init__(filename=filename, orig=orig)
+
+        if not isinstance(orig, Hdf5SurveyStore):
+            self.__compression = compression
+            self.__chunk_size = chunk_size if chunk_size is not None else Hdf5SurveyStore.CHUNK_SIZE
+        else:
+            self.__compression = orig.__compression
+            self.__chunk_size = chunk_size if chunk_size is not None else orig.__chunk_size
+
+        self.__file = None
+        self.__offsets = None
+        self.__buffer = None
+        self.__buffer_index = None
+        self.__buffer_size = 0
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_Hdf5SurveyStore__file'] = None
+        state['_Hdf5SurveyStore__buffer'] = None
+        state['_Hdf5SurveyStore__buffer_index'] = None
+        state['_Hdf5SurveyStore__buffer_size'] = 0
+        return state
+
+    #region Properties
+
+    def __get_compression(self):
+        return self.__compression
+
+    def __set_compression(self, value):
+        self.__compression = value
+
+    compression = property(__get_compression, __set_compression)
+
+    def __get_chunk_size(self):
+        return self.__chunk_size
+
+    def __set_chunk_size(self, value):
+        self.__chunk_size = value
+
+    chunk_size = property(__get_chunk_size, __set_chunk_size)
+
+    #endregion
+
+    def _open(self, mode):
+        self.__file = h5py.File(self.filename, mode, rdcc_nbytes=Hdf5SurveyStore.CHUNK_CACHE_SIZE)
+        self.__buffer = []
+        self.__buffer_index = []
+        self.__buffer_size = 0
+
+        if 'spectra' in self.__file:
+            g = self.__file['spectra']
+            self.__offsets = g['offsets'][:]
+            keys = g['index'][:]
+        else:
+            if mode != 'r':
+                self.__create_spectra()
+            self.__offsets = np.zeros(1, dtype=np.int64)
+            keys = []
+
+        return keys
+
+    def _close(self):
+        if self.__file is not None:
+            if self.__file.mode != 'r':
+                self.__flush()
+            self.__file.close()
+            self.__file = None
+
+    def __create_spectra(self):
+        g = self.__file.create_group('spectra')
+        g.create_dataset('data', shape=(0,), dtype=np.uint8, maxshape=(None,),
+                         chunks=(self.__chunk_size,), compression=self.__compression)
+        g.create_dataset('offsets', data=np.zeros(1, dtype=np.int64), maxshape=(None,), chunks=True)
+        g.create_dataset('index', shape=(0,), dtype=np.int64, maxshape=(None,), chunks=True)
+
+    def __flush(self):
+        # Write the buffered spectra into the datasets
+        if len(self.__buffer) == 0:
+            return
+
+        data = np.frombuffer(b''.join(self.__buffer), dtype=np.uint8)
+        lengths = np.array([ len(b) for b in self.__buffer ], dtype=np.int64)
+        offsets = self.__offsets[-1] + np.cumsum(lengths)
+
+        g = self.__file['spectra']
+        for k, v in [ ('data', data), ('offsets', offsets), ('index', np.array(self.__buffer_index, dtype=np.int64)) ]:
+            ds = g[k]
+            n = ds.shape[0]
+            ds.resize((n + v.shape[0],))
+            ds[n:] = v
+
+        self.__offsets = np.concatenate([ self.__offsets, offsets ])
+        self.__buffer = []
+        self.__buffer_index = []
+        self.__buffer_size = 0
+
+    #region Params
+
+    def _write_params(self, params):
+        if 'params' in self.__file:
+            del self.__file['params']
+
+        if params is None:
+            return
+
+        g = self.__file.create_group('params')
+        self.__write_column(g, 'index', params.index)
+        for i, c in enumerate(params.columns):
+            self.__write_column(g, str(i), params[c])
+        g.attrs['columns'] = [ str(c) for c in params.columns ]
+
+    def __write_column(self, g, name, data):
+        # Columns are stored so that they are read back unchanged: strings with a
+        # null mask and their original dtype, anything that cannot be stored
+        # natively, such as mixed types or booleans with missing values, is pickled.
+        # Pandas extension types are converted to objects with None as missing value.
+        pandas_dtype = None
+        if not isinstance(data.dtype, np.dtype):
+            pandas_dtype = str(data.dtype)
+            data = np.asarray(data.astype(object).where(data.notna(), None), dtype=object)
+        else:
+            data = data.to_numpy()
+
+        if data.dtype.kind in 'biuf':
+            ds = g.create_dataset(name, data=data)
+        elif data.dtype.kind == 'M':
+            ds = g.create_dataset(name, data=data.view(np.int64))
+            ds.attrs['dtype'] = str(data.dtype)
+        elif data.dtype.kind in 'US' or all(v is None or isinstance(v, str) for v in data):
+            null = np.array([ v is None for v in data ], dtype=bool)
+            values = np.array([ '' if v is None else str(v) for v in data ], dtype=object)
+            ds = g.create_dataset(name, data=values, dtype=h5py.string_dtype())
+            ds.attrs['dtype'] = data.dtype.str
+            if null.any():
+                g.create_dataset(name + '_null', data=null)
+        else:
+            ds = g.create_dataset(name, data=np.frombuffer(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL), dtype=np.uint8))
+            ds.attrs['dtype'] = 'pickle'
+
+        if pandas_dtype is not None:
+            ds.attrs['pandas_dtype'] = pandas_dtype
+
+    def _read_params(self):
+        if 'params' not in self.__file:
+            return None
+
+        g = self.__file['params']
+        columns = list(g.attrs['columns'])
+        data = { c: self.__read_column(g, str(i)) for i, c in enumerate(columns) }
+        return pd.DataFrame(data, index=self.__read_column(g, 'index'), columns=columns)
+
+    def __read_column(self, g, name):
+        data = self.__read_column_data(g, name)
+        pandas_dtype = g[name].attrs.get('pandas_dtype')
+        if pandas_dtype is not None:
+            data = pd.array(data, dtype=pandas_dtype)
+        return data
+
+    def __read_column_data(self, g, name):
+        ds = g[name]
+        dtype = ds.attrs.get('dtype')
+        if h5py.check_string_dtype(ds.dtype) is not None:
+            data = ds.asstr()[:]
+            if name + '_null' in g:
+                data[g[name + '_null'][:]] = None
+            if dtype is not None and np.dtype(dtype).kind in 'US':
+                data = data.astype(dtype)
+            return data
+        elif dtype is not None and dtype.startswith('datetime64'):
+            return ds[:].view(dtype)
+        elif dtype == 'pickle':
+            return pickle.loads(ds[:].tobytes())
+        else:
+            return ds[:]
+
+    #endregion
+    #region Spectra
+
+    def _write_record(self, index, spec):
+        data = pickle.dumps(spec, protocol=pickle.HIGHEST_PROTOCOL)
+        self.__buffer.append(data)
+        self.__buffer_index.append(index)
+        self.__buffer_size += len(data)
+
+        if self.__buffer_size >= Hdf5SurveyStore.WRITE_BUFFER_SIZE:
+            self.__flush()
+
+    def _read_record(self, r):
+        if r >= self.__offsets.shape[0] - 1:
+            self.__flush()
+
+        start, end = self.__offsets[r], self.__offsets[r + 1]
+        return pickle.loads(self.__file['spectra/data'][start:end].tobytes())
+
+    #endregion
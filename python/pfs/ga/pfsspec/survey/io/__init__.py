@@ -1,2 +1,5 @@
 from .surveydownloader import SurveyDownloader
-from .surveyreader import SurveyReader
\ No newline at end of file
+from .surveyreader import SurveyReader
+from .bulkdownloader import BulkDownloader
+from .surveycrawler import SurveyCrawler
+from .surveypipeline import SurveyPipeline
\ No newline at end of file
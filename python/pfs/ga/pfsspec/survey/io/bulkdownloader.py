@@ -0,0 +1,336 @@
+import os
+import time
+import json
+import hashlib
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..setup_logger import logger
+
+class BulkDownloader():
+    """
+    Implements concurrent, resumable download of many files over pooled,
+    keep-alive HTTP sessions.
+
+    Each worker thread uses its own session so connections to the server are
+    reused between files. Files are downloaded into a `.part` file that is
+    renamed to the final name only after its size and checksum are verified,
+    and failed downloads are retried with exponential backoff. Completed
+    downloads are recorded in a manifest file so that re-runs skip them
+    without looking at the target files.
+
+    Variables
+    ---------
+    outdir : str
+        Root directory of the downloaded files. Paths are relative to this.
+    headers : dict
+        HTTP headers sent with every request, such as authorization.
+    threads : int
+        Number of concurrent downloads.
+    retries : int
+        Number of times a failed download is retried.
+    backoff : float
+        Wait time before the first retry, in seconds. Doubled after every retry.
+    timeout : float
+        Connection and read timeout, in seconds.
+    resume : bool
+        If True, partially downloaded files are continued with range requests.
+    manifest : str
+        Path to the manifest file. Defaults to `MANIFEST_FILE` in `outdir`.
+    """
+
+    DEFAULT_THREADS = 8
+    DEFAULT_RETRIES = 5
+    DEFAULT_BACKOFF = 1.0
+    DEFAULT_TIMEOUT = 60.0
+
+    MANIFEST_FILE = '.manifest.jsonl'
+
+    # Size of the blocks read from the HTTP stream
+    CHUNK_SIZE = 1 << 20
+
+    # HTTP status codes that are worth retrying
+    RETRY_STATUS = [ 408, 429, 500, 502, 503, 504 ]
+
+    def __init__(self, outdir=None, headers=None, threads=None, retries=None, backoff=None,
+                 timeout=None, resume=True, manifest=None, orig=None):
+
+        if not isinstance(orig, BulkDownloader):
+            self.outdir = outdir
+            self.headers = headers if headers is not None else {}
+            self.threads = threads if threads is not None else BulkDownloader.DEFAULT_THREADS
+            self.retries = retries if retries is not None else BulkDownloader.DEFAULT_RETRIES
+            self.backoff = backoff if backoff is not None else BulkDownloader.DEFAULT_BACKOFF
+            self.timeout = timeout if timeout is not None else BulkDownloader.DEFAULT_TIMEOUT
+            self.resume = resume
+            self.manifest = manifest
+        else:
+            self.outdir = outdir if outdir is not None else orig.outdir
+            self.headers = headers if headers is not None else orig.headers
+            self.threads = threads if threads is not None else orig.threads
+            self.retries = retries if retries is not None else orig.retries
+            self.backoff = backoff if backoff is not None else orig.backoff
+            self.timeout = timeout if timeout is not None else orig.timeout
+            self.resume = resume
+            self.manifest = manifest if manifest is not None else orig.manifest
+
+        self.__local = threading.local()
+        self.__sessions = []
+        self.__lock = threading.Lock()
+        self.__completed = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self.__lock:
+            for s in self.__sessions:
+                s.close()
+            self.__sessions = []
+        self.__local = threading.local()
+
+    #region Sessions
+
+    def create_session(self):
+        session = requests.Session()
+        session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def get_session(self):
+        """
+        Returns the HTTP session of the calling thread.
+        """
+
+        session = getattr(self.__local, 'session', None)
+        if session is None:
+            session = self.create_session()
+            self.__local.session = session
+            with self.__lock:
+                self.__sessions.append(session)
+        return session
+
+    #endregion
+    #region Manifest
+
+    def get_manifest_filename(self):
+        if self.manifest is not None:
+            return self.manifest
+        elif self.outdir is not None:
+            return os.path.join(self.outdir, BulkDownloader.MANIFEST_FILE)
+        else:
+            return None
+
+    def load_manifest(self):
+        """
+        Reads the list of completed downloads from the manifest file.
+
+        Returns
+        -------
+        dict
+            Manifest entries keyed by the relative path of the file.
+        """
+
+        completed = {}
+        fn = self.get_manifest_filename()
+        if fn is not None and os.path.isfile(fn):
+            with open(fn, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        completed[entry['path']] = entry
+                    except (ValueError, KeyError):
+                        # Last line might be incomplete if the process was killed
+                        logger.warning(f'Skipping invalid line in download manifest `{fn}`.')
+
+        return completed
+
+    def __get_completed(self):
+        with self.__lock:
+            if self.__completed is None:
+                self.__completed = self.load_manifest()
+            return self.__completed
+
+    def __add_completed(self, entry):
+        fn = self.get_manifest_filename()
+        with self.__lock:
+            if fn is not None:
+                os.makedirs(os.path.dirname(fn) or '.', exist_ok=True)
+                with open(fn, 'a') as f:
+                    f.write(json.dumps(entry) + '\n')
+            if self.__completed is not None:
+                self.__completed[entry['path']] = entry
+
+    def is_completed(self, path, size=None, sha256=None):
+        """
+        Returns True if the file is listed in the manifest as downloaded, with
+        matching size and checksum, if specified.
+        """
+
+        entry = self.__get_completed().get(path)
+        return entry is not None \
+            and (size is None or entry.get('size') == size) \
+            and (sha256 is None or entry.get('sha256') == sha256)
+
+    #endregion
+    #region Download
+
+    def download(self, url, path, size=None, sha256=None, force=False):
+        """
+        Downloads a single file, unless it's already listed in the manifest.
+
+        Arguments
+        ---------
+        url : str
+            URL of the file.
+        path : str
+            Path of the output file, relative to `outdir`.
+        size : int
+            Expected size of the file in bytes, if known.
+        sha256 : str
+            Expected SHA-256 checksum of the file as a hex string, if known.
+        force : bool
+            If True, download the file even if it's listed in the manifest.
+
+        Returns
+        -------
+        bool
+            True if the file was downloaded, False if it was skipped.
+        """
+
+        if not force and self.is_completed(path, size=size, sha256=sha256):
+            logger.debug(f'Skipping `{path}`, already downloaded.')
+            return False
+
+        entry = self.__retry(url, self.__download, url, path, size, sha256)
+        self.__add_completed(entry)
+        return True
+
+    def get_text(self, url):
+        """
+        Fetches a small text document, such as a directory listing, with the
+        same session and retry policy as the downloads.
+        """
+
+        def get(url):
+            r = self.get_session().get(url, timeout=self.timeout)
+            r.raise_for_status()
+            return r.text
+
+        return self.__retry(url, get, url)
+
+    def __retry(self, url, func, *args):
+        attempt = 0
+        while True:
+            try:
+                return func(*args)
+            except Exception as ex:
+                if attempt >= self.retries or not self.is_retryable(ex):
+                    raise ex
+
+                wait = self.backoff * 2 ** attempt
+                logger.warning(f'Request to `{url}` failed, retrying in {wait:.1f} s: {ex}')
+                time.sleep(wait)
+                attempt += 1
+
+    def is_retryable(self, ex):
+        if isinstance(ex, requests.HTTPError):
+            return ex.response is not None and ex.response.status_code in BulkDownloader.RETRY_STATUS
+        else:
+            return isinstance(ex, (requests.ConnectionError, requests.Timeout, IOError))
+
+    def __download(self, url, path, size, sha256):
+        outfile = os.path.join(self.outdir, path) if self.outdir is not None else path
+        partfile = outfile + '.part'
+        os.makedirs(os.path.dirname(outfile) or '.', exist_ok=True)
+
+        # Continue a partial download if possible
+        offset = os.path.getsize(partfile) if self.resume and os.path.isfile(partfile) else 0
+        headers = { 'Range': f'bytes={offset}-' } if offset > 0 else None
+
+        session = self.get_session()
+        with session.get(url, headers=headers, stream=True, timeout=self.timeout) as r:
+            if r.status_code == 416 and offset > 0:
+                # The part file is already complete or corrupt, start over
+                os.remove(partfile)
+                raise IOError(f'Invalid range requested from `{url}`.')
+            r.raise_for_status()
+
+            if r.status_code != 206:
+                offset = 0
+
+            length = r.headers.get('Content-Length')
+            expected = offset + int(length) if length is not None and 'Content-Encoding' not in r.headers else None
+
+            with open(partfile, 'ab' if offset > 0 else 'wb') as f:
+                for chunk in r.iter_content(chunk_size=BulkDownloader.CHUNK_SIZE):
+                    f.write(chunk)
+
+        actual = os.path.getsize(partfile)
+        if (expected is not None and actual != expected) or (size is not None and actual != size):
+            if size is not None and actual > size:
+                os.remove(partfile)
+            raise IOError(f'Size mismatch of `{url}`, got {actual} bytes, expected {size or expected}.')
+
+        digest = self.get_sha256(partfile)
+        if sha256 is not None and digest != sha256.lower():
+            # The partial file is no good to resume from
+            os.remove(partfile)
+            raise IOError(f'Checksum mismatch of `{url}`.')
+
+        os.replace(partfile, outfile)
+
+        return { 'path': path, 'url': url, 'size': actual, 'sha256': digest, 'time': time.time() }
+
+    def get_sha256(self, filename):
+        h = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(BulkDownloader.CHUNK_SIZE), b''):
+                h.update(block)
+        return h.hexdigest()
+
+    def download_many(self, items):
+        """
+        Downloads many files concurrently.
+
+        Arguments
+        ---------
+        items : iterable
+            Dictionaries with the keys `url`, `path` and, optionally, `size` and `sha256`.
+
+        Returns
+        -------
+        list of SimpleNamespace
+            Outcome of each download, in the order of `items`, with the fields
+            `url`, `path`, `downloaded` and `error`.
+        """
+
+        def download_item(item):
+            res = SimpleNamespace(url=item['url'], path=item['path'], downloaded=False, error=None)
+            try:
+                res.downloaded = self.download(item['url'], item['path'],
+                                               size=item.get('size'), sha256=item.get('sha256'))
+            except Exception as ex:
+                logger.error(f'Failed to download `{item["url"]}`: {ex}')
+                res.error = ex
+            return res
+
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            results = list(executor.map(download_item, items))
+
+        n = sum(1 for r in results if r.downloaded)
+        e = sum(1 for r in results if r.error is not None)
+        logger.info(f'Downloaded {n} files, skipped {len(results) - n - e}, failed {e}.')
+
+        return results
+
+    #endregion
@@ -0,0 +1,151 @@
+import asyncio
+from html.parser import HTMLParser
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+from ..setup_logger import logger
+
+class HrefParser(HTMLParser):
+    """
+    Collects the targets of the links of an HTML directory listing.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.hrefs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            for k, v in attrs:
+                if k == 'href' and v is not None:
+                    self.hrefs.append(v)
+
+class SurveyCrawler():
+    """
+    Implements a crawler that walks the directory listings of a survey web
+    server and downloads the files it discovers.
+
+    Listing and downloading run concurrently on an asyncio event loop: every
+    listing that is fetched can fan out into further listings and files, files
+    are put into the download queue as soon as they are discovered and the
+    total number of HTTP requests in flight is limited by a single semaphore.
+    The HTTP requests themselves are executed by a `BulkDownloader` on a thread
+    pool so that connections are pooled and failed requests are retried.
+
+    The structure of the listings is survey specific and is implemented by the
+    `visit` function, which is called with each listing and the links found in
+    it, and returns the listings to fetch next and the files to download.
+
+    Variables
+    ---------
+    downloader : BulkDownloader
+        Downloader that executes the HTTP requests.
+    visit : callable
+        Function `visit(listing, hrefs)` that returns a tuple of a list of further
+        listings and a list of files. Listings are objects with a `url` attribute,
+        files are dictionaries accepted by `BulkDownloader.download`.
+    concurrency : int
+        Maximum number of HTTP requests in flight.
+    list_workers : int
+        Number of tasks fetching listings.
+    queue_size : int
+        Maximum number of files waiting to be downloaded.
+    """
+
+    DEFAULT_CONCURRENCY = 16
+    DEFAULT_LIST_WORKERS = 4
+    DEFAULT_QUEUE_SIZE = 10000
+
+    def __init__(self, downloader, visit, concurrency=None, list_workers=None, queue_size=None):
+        self.downloader = downloader
+        self.visit = visit
+        self.concurrency = concurrency if concurrency is not None else SurveyCrawler.DEFAULT_CONCURRENCY
+        self.list_workers = list_workers if list_workers is not None else SurveyCrawler.DEFAULT_LIST_WORKERS
+        self.queue_size = queue_size if queue_size is not None else SurveyCrawler.DEFAULT_QUEUE_SIZE
+
+    @staticmethod
+    def parse_href(html):
+        parser = HrefParser()
+        parser.feed(html)
+        return parser.hrefs
+
+    def run(self, roots):
+        """
+        Crawls the listings starting from `roots` and downloads all files found.
+
+        Arguments
+        ---------
+        roots : list
+            Listings to start from, objects with a `url` attribute.
+
+        Returns
+        -------
+        SimpleNamespace
+            Statistics of the crawl with the fields `listings`, `files`,
+            `downloaded` and `errors`.
+        """
+
+        return asyncio.run(self.crawl(roots))
+
+    async def crawl(self, roots):
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        list_queue = asyncio.Queue()
+        file_queue = asyncio.Queue(maxsize=self.queue_size)
+        stats = SimpleNamespace(listings=0, files=0, downloaded=0, errors=[])
+
+        async def run_request(func, *args):
+            async with semaphore:
+                return await loop.run_in_executor(executor, func, *args)
+
+        async def list_worker():
+            while True:
+                listing = await list_queue.get()
+                try:
+                    html = await run_request(self.downloader.get_text, listing.url)
+                    listings, files = self.visit(listing, SurveyCrawler.parse_href(html))
+                    stats.listings += 1
+                    for l in listings:
+                        list_queue.put_nowait(l)
+                    for f in files:
+                        # Blocks when the download queue is full
+                        await file_queue.put(f)
+                except Exception as ex:
+                    logger.error(f'Failed to list `{listing.url}`: {ex}')
+                    stats.errors.append((listing.url, ex))
+                finally:
+                    list_queue.task_done()
+
+        async def download_worker():
+            while True:
+                f = await file_queue.get()
+                try:
+                    stats.files += 1
+                    if await run_request(self.downloader.download, f['url'], f['path'], f.get('size'), f.get('sha256')):
+                        stats.downloaded += 1
+                except Exception as ex:
+                    logger.error(f'Failed to download `{f["url"]}`: {ex}')
+                    stats.errors.append((f['url'], ex))
+                finally:
+                    file_queue.task_done()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for r in roots:
+                list_queue.put_nowait(r)
+
+            workers = [ asyncio.create_task(list_worker()) for _ in range(self.list_workers) ]
+            workers += [ asyncio.create_task(download_worker()) for _ in range(self.concurrency) ]
+
+            # Listings are done when the list queue is drained, downloads can
+            # only finish after that because listings keep adding files
+            await list_queue.join()
+            await file_queue.join()
+
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        logger.info(f'Crawled {stats.listings} listings, found {stats.files} files, '
+                    f'downloaded {stats.downloaded}, {len(stats.errors)} errors.')
+
+        return stats
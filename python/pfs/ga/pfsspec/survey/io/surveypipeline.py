@@ -0,0 +1,170 @@
+import os
+import queue
+import threading
+from types import SimpleNamespace
+
+from ..setup_logger import logger
+
+class SurveyPipeline():
+    """
+    Implements a staged pipeline that imports survey spectra with file I/O,
+    decoding and writing running at the same time.
+
+    The stages are connected with bounded queues:
+
+        producer -> fetch workers -> decode workers -> writer
+
+    The producer iterates over the items, such as the rows of the params table.
+    Fetch workers do the I/O bound part of loading a spectrum, for example
+    downloading or reading the file, decode workers turn the fetched data into
+    spectrum objects and the writer, running on the calling thread, stores
+    them. Each stage has its own number of workers and when a stage falls
+    behind, the queue in front of it fills up and the stages upstream wait, so
+    only a limited number of items are in memory at any time.
+
+    Items that fail to fetch or decode are logged and skipped. Errors of the
+    producer and the writer stop the pipeline and are raised by `run`.
+
+    Variables
+    ---------
+    fetch_workers : int
+        Number of threads fetching items.
+    decode_workers : int
+        Number of threads decoding items.
+    queue_size : int
+        Maximum number of items waiting in front of each stage.
+    """
+
+    DEFAULT_FETCH_WORKERS = 8
+    DEFAULT_DECODE_WORKERS = os.cpu_count() or 4
+    DEFAULT_QUEUE_SIZE = 64
+
+    # Interval of checking whether the pipeline has been stopped, in seconds
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, fetch_workers=None, decode_workers=None, queue_size=None):
+        self.fetch_workers = fetch_workers if fetch_workers is not None else SurveyPipeline.DEFAULT_FETCH_WORKERS
+        self.decode_workers = decode_workers if decode_workers is not None else SurveyPipeline.DEFAULT_DECODE_WORKERS
+        self.queue_size = queue_size if queue_size is not None else SurveyPipeline.DEFAULT_QUEUE_SIZE
+
+    def run(self, items, fetch, decode, write):
+        """
+        Runs all items through the pipeline.
+
+        Arguments
+        ---------
+        items : iterable
+            Items to process, iterated by the producer.
+        fetch : callable
+            Function `fetch(item)` that returns the fetched data of an item.
+        decode : callable
+            Function `decode(item, data)` that returns the decoded item, or None
+            to skip it.
+        write : callable
+            Function `write(result)` called with each decoded item, in the order
+            they're decoded.
+
+        Returns
+        -------
+        SimpleNamespace
+            Statistics of the run with the fields `items`, `written` and `errors`.
+        """
+
+        fetch_queue = queue.Queue(maxsize=self.queue_size)
+        decode_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        lock = threading.Lock()
+        stats = SimpleNamespace(items=0, written=0, errors=[])
+        failures = []
+        done = object()
+
+        def put(q, item):
+            # Wait for space in the queue unless the pipeline is stopped
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=SurveyPipeline.POLL_INTERVAL)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def get(q):
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=SurveyPipeline.POLL_INTERVAL)
+                except queue.Empty:
+                    pass
+            return done
+
+        def producer():
+            try:
+                for item in items:
+                    if not put(fetch_queue, item):
+                        return
+                    stats.items += 1
+            except Exception as ex:
+                failures.append(ex)
+                stop.set()
+            finally:
+                for _ in range(self.fetch_workers):
+                    put(fetch_queue, done)
+
+        def stage(name, inq, outq, func, workers, remaining):
+            # The last worker of a stage to finish tells the next stage to finish
+            while True:
+                item = get(inq)
+                if item is done:
+                    break
+                try:
+                    res = func(item)
+                except Exception as ex:
+                    logger.error(f'Failed to {name} item: {ex}')
+                    with lock:
+                        stats.errors.append((item, ex))
+                    continue
+                if res is not None and not put(outq, res):
+                    break
+
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                for _ in range(workers):
+                    put(outq, done)
+
+        # Workers of a stage share the counter of running workers
+        fetch_args = ('fetch', fetch_queue, decode_queue, lambda item: (item, fetch(item)),
+                      self.decode_workers, [ self.fetch_workers ])
+        decode_args = ('decode', decode_queue, write_queue, lambda item: decode(*item),
+                       1, [ self.decode_workers ])
+
+        threads = [ threading.Thread(target=producer, daemon=True) ]
+        threads += [ threading.Thread(target=stage, args=fetch_args, daemon=True) for _ in range(self.fetch_workers) ]
+        threads += [ threading.Thread(target=stage, args=decode_args, daemon=True) for _ in range(self.decode_workers) ]
+
+        for t in threads:
+            t.start()
+
+        try:
+            while True:
+                res = get(write_queue)
+                if res is done:
+                    break
+                write(res)
+                stats.written += 1
+        except Exception as ex:
+            failures.append(ex)
+            raise
+        finally:
+            if len(failures) > 0:
+                stop.set()
+            for t in threads:
+                t.join()
+
+        if len(failures) > 0:
+            raise failures[0]
+
+        logger.info(f'Pipeline processed {stats.items} items, written {stats.written}, {len(stats.errors)} errors.')
+
+        return stats
@@ -6,10 +6,24 @@ import pfs.ga.pfsspec.core.util as util
 from pfs.ga.pfsspec.core.util import SmartParallel
 from pfs.ga.pfsspec.core.io import Importer
 from ..survey import Survey
+from .surveypipeline import SurveyPipeline
 
 class SurveyReader(Importer):
     """
     Implements function to read spectra of a survey.
+
+    In streaming mode, spectra are written to the survey store one by one as
+    they are loaded by the workers instead of collecting them in memory and
+    saving the entire survey at the end.
+
+    In pipeline mode, loading a spectrum is split into fetching the data, see
+    `fetch_item`, and decoding it, see `decode_item`, which run in separate
+    pools of threads connected by bounded queues, see `SurveyPipeline`.
+
+    The rows of the params table are passed to `load_spectrum`, `fetch_item` and
+    `decode_item` as dictionaries of column values, see `get_rows`, not as
+    `pd.Series`. Use `row['col']` instead of `row.col`; the index of the row
+    is passed separately instead of `row.name`.
     """
 
     def __init__(self, orig=None):
@@ -17,25 +31,73 @@ class SurveyReader(Importer):
 
         if isinstance(orig, SurveyReader):
             self.outdir = orig.outdir
+            self.stream = orig.stream
+            self.survey_format = orig.survey_format
+            self.pipeline = orig.pipeline
+            self.fetch_threads = orig.fetch_threads
+            self.decode_threads = orig.decode_threads
+            self.queue_size = orig.queue_size
+            self.survey = None
+            self.store = None
         else:
             self.outdir = None
+            self.stream = False
+            self.survey_format = 'pickle'
+            self.pipeline = False
+            self.fetch_threads = None
+            self.decode_threads = None
+            self.queue_size = None
+            self.survey = None
+            self.store = None
+
+    def __getstate__(self):
+        # The reader is sent to worker processes with its bound methods. Workers only
+        # return the spectra, they don't need the store, its open file and lock.
+        state = self.__dict__.copy()
+        state['store'] = None
+        return state
 
     def add_args(self, parser, config):
         super().add_args(parser, config)
 
+        parser.add_argument('--stream', action='store_true', help='Write spectra to disk as they are loaded.\n')
+        parser.add_argument('--survey-format', type=str, choices=['pickle', 'h5'], help='Survey file format.\n')
+
+        parser.add_argument('--pipeline', action='store_true', help='Fetch, decode and write spectra in parallel stages.\n')
+        parser.add_argument('--fetch-threads', type=int, help='Number of threads fetching spectra.\n')
+        parser.add_argument('--decode-threads', type=int, help='Number of threads decoding spectra.\n')
+        parser.add_argument('--queue-size', type=int, help='Number of spectra waiting between stages.\n')
+
     def init_from_args(self, config, args):
         super().init_from_args(config, args)
 
+        self.stream = self.get_arg('stream', self.stream, args)
+        self.survey_format = self.get_arg('survey_format', self.survey_format, args)
+
+        self.pipeline = self.get_arg('pipeline', self.pipeline, args)
+        self.fetch_threads = self.get_arg('fetch_threads', self.fetch_threads, args)
+        self.decode_threads = self.get_arg('decode_threads', self.decode_threads, args)
+        self.queue_size = self.get_arg('queue_size', self.queue_size, args)
+
     def open_data(self, args, indir, outdir):
-        fn = os.path.join(outdir, 'spectra.dat')
+        fn = os.path.join(outdir, 'spectra.h5' if self.survey_format == 'h5' else 'spectra.dat')
 
         self.outdir = outdir
         self.survey = self.create_survey()
         self.survey.filename = fn
-        self.survey.fileformat = 'pickle'
+        self.survey.fileformat = self.survey_format
+
+        if self.stream:
+            self.store = self.survey.create_store()
+            self.store.open(fn, 'w')
 
     def save_data(self, args, output_path):
-        self.survey.save()
+        if self.stream:
+            # Spectra are already written, only close the file
+            self.store.close()
+            logger.info(f'Written {len(self.store)} spectra to `{self.store.filename}`.')
+        else:
+            self.survey.save()
 
     def create_survey(self):
         raise NotImplementedError()
@@ -57,22 +119,57 @@ class SurveyReader(Importer):
     def process_item_error(self, ex, ix_row):
         raise NotImplementedError()
 
-    def store_item(self, ix_row, spec):
-        # TODO: When optimizing memory use to process larger surveys,
-        #       implement this function similarly to DatasetBuilder.store_item
-        raise NotImplementedError()
+    def fetch_item(self, index, row):
+        """
+        Does the I/O bound part of loading a spectrum in pipeline mode, such as
+        downloading the file, and returns what `decode_item` needs. By default,
+        nothing is fetched and `decode_item` loads the entire spectrum.
+        """
+
+        return None
+
+    def decode_item(self, index, row, data):
+        """
+        Creates the spectrum from the data returned by `fetch_item`.
+        """
+
+        return self.load_spectrum(index, row)
+
+    def finish_item(self):
+        """
+        Called in the main process for every item the workers are done with,
+        whether it was loaded, skipped or failed, in the order they finish.
+        """
+
+        pass
+
+    def store_item(self, spec):
+        # Spectra arrive in the order the workers finish, the store
+        # keeps track of the index to return them in order when read back
+        self.store.append(spec)
+
+    def get_rows(self, params):
+        # Converting the whole table at once is much faster than iterrows and
+        # keeps the original data types of the columns
+        return list(zip(params.index, params.to_dict('records')))
 
     def load_survey(self, params):
+        if self.pipeline:
+            self.pipeline_survey(params)
+            return
+
+        if self.stream:
+            self.stream_survey(params)
+            return
+
         self.survey.params = params
         self.survey.spectra = []
 
-        # TODO: this requires loading everything into memory
-        #       consider redesigning the storage and read the spectra on
-        #       multiple threads instead
-
-        rows = [(index, row) for index, row in params.iterrows()]
+        rows = self.get_rows(params)
         with SmartParallel(verbose=self.verbose, parallel=self.parallel, threads=self.threads) as p:
-            self.survey.spectra = [r for r in p.map(self.process_item, self.process_item_error, rows)]
+            for spec in p.map(self.process_item, self.process_item_error, rows):
+                self.finish_item()
+                self.survey.spectra.append(spec)
         
         # In case errors happened we get Nones
         self.survey.spectra = list(filter(lambda s: s is not None, self.survey.spectra))
@@ -80,6 +177,68 @@ class SurveyReader(Importer):
         # Parallel will likely shuffle the spectra    
         self.survey.spectra.sort(key=lambda s: s.index)
 
+    def stream_survey(self, params):
+        """
+        Loads the spectra and writes them to the survey store as soon as they
+        are returned by the workers so that only a few of them are kept in
+        memory at any time.
+        """
+
+        self.survey.params = params
+        self.survey.spectra = None
+        self.store.write_params(params)
+
+        rows = self.get_rows(params)
+        with SmartParallel(verbose=self.verbose, parallel=self.parallel, threads=self.threads) as p:
+            for spec in p.map(self.process_item, self.process_item_error, rows):
+                self.finish_item()
+                # In case errors happened we get Nones
+                if spec is not None:
+                    self.store_item(spec)
+
+    def create_pipeline(self):
+        return SurveyPipeline(fetch_workers=self.fetch_threads,
+                              decode_workers=self.decode_threads if self.decode_threads is not None else self.threads,
+                              queue_size=self.queue_size)
+
+    def pipeline_survey(self, params):
+        """
+        Loads the spectra with fetching, decoding and writing running at the
+        same time. In streaming mode, spectra are written to the survey store,
+        otherwise collected in memory.
+        """
+
+        self.survey.params = params
+
+        if self.stream:
+            self.survey.spectra = None
+            self.store.write_params(params)
+            write = self.store_item
+        else:
+            self.survey.spectra = []
+            write = self.survey.spectra.append
+
+        def fetch(ix_row):
+            try:
+                return self.fetch_item(*ix_row)
+            except Exception:
+                # Items that fail to fetch are not decoded
+                self.finish_item()
+                raise
+
+        def decode(ix_row, data):
+            try:
+                return self.decode_item(*ix_row, data)
+            finally:
+                self.finish_item()
+
+        pipeline = self.create_pipeline()
+        pipeline.run(self.get_rows(params), fetch, decode, write)
+
+        if not self.stream:
+            # Decode workers will likely shuffle the spectra
+            self.survey.spectra.sort(key=lambda s: s.index)
+
     def run(self):
         raise NotImplementedError()
 
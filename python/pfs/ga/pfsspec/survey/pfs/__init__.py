@@ -4,4 +4,6 @@ from .pfsfilesystemconfig import PfsFileSystemConfig
 from .pfsgen3filesystemconfig import PfsGen3FileSystemConfig
 from .pfsgen3butlerconfig import PfsGen3ButlerConfig
 from .pfsgafilesystemconfig import PfsGAFileSystemConfig
+from .skyindex import SkyIndex
+from .fibercatalog import PfsFiberCatalog
 from .pfsgen3repo import PfsGen3Repo
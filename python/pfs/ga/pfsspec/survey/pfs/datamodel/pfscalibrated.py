@@ -1,9 +1,14 @@
 from types import SimpleNamespace
+import numpy as np
 
 from ..setup_logger import logger
 
 try:
+    import yaml
+    import astropy.io.fits
     from pfs.datamodel import PfsCalibrated as PfsCalibratedBase
+    from pfs.datamodel import Target, Observations, TargetType, MaskHelper
+    from pfs.datamodel.fluxTable import FluxTable
 except ImportError as ex:
     logger.warning('Cannot import PFS data model. Is package `pfs.datamodel` available?')
     logger.exception(ex)
@@ -15,6 +20,9 @@ class PfsCalibrated(PfsCalibratedBase):
     A collection of PfsSingle (calibrated spectra) indexed by target
     """
 
+    # Columns of the TARGET table that can be used to filter the targets
+    FILTER_COLUMNS = [ 'targetId', 'catId', 'tract', 'patch', 'objId', 'targetType' ]
+
     def extract(self):
         # TODO: what if the container has different types of spectra?
         pfsSingle = []
@@ -33,6 +41,137 @@ class PfsCalibrated(PfsCalibratedBase):
             )
             pfsSingle.append(s)
             ids.append(id)
-        
+
         return pfsSingle, ids
-        
\ No newline at end of file
+
+    @classmethod
+    def iterFits(cls, filename, **filters):
+        """
+        Iterate over the spectra of a PfsCalibrated file one target at a time.
+
+        The file is opened with memory mapping and only the rows of the targets
+        that match the filters are decoded, so the memory footprint doesn't depend
+        on the number of spectra in the container.
+
+        Arguments
+        ---------
+        filename : str
+            Path to the FITS file.
+        filters : dict
+            Values to match against the columns of the TARGET table, such as
+            `catId`, `objId` or `targetType`. Values can be scalars or lists.
+
+        Returns
+        -------
+        generator
+            Generator of PfsSingle objects.
+        """
+
+        with astropy.io.fits.open(filename, memmap=True) as fits:
+            targetHdu = fits["TARGET"].data
+
+            # Select the rows of the targets that match the filters
+            mask = np.full(len(targetHdu), True)
+            for k, v in filters.items():
+                if v is not None and k in cls.FILTER_COLUMNS and k in targetHdu.columns.names:
+                    if k == 'patch':
+                        mask &= np.isin(np.char.strip(targetHdu[k].astype(str)), np.atleast_1d(v).astype(str))
+                    else:
+                        mask &= np.isin(targetHdu[k], np.atleast_1d(v))
+
+            rows = np.nonzero(mask)[0]
+            if rows.size == 0:
+                return
+
+            hdus = SimpleNamespace(
+                target = targetHdu,
+                targetFlux = fits["TARGETFLUX"].data,
+                observations = fits["OBSERVATIONS"].data,
+                wavelength = fits["WAVELENGTH"].data,
+                flux = fits["FLUX"].data,
+                mask = fits["MASK"].data,
+                sky = fits["SKY"].data,
+                covar = fits["COVAR"].data,
+                covar2 = fits["COVAR2"].data if "COVAR2" in fits else None,
+                metadata = fits["METADATA"].data,
+                fluxTable = fits["FLUXTABLE"].data,
+                notes = cls.NotesClass.readHdu(fits),
+            )
+
+            # The targetId columns of the per-target tables are only read once
+            targetFluxIds = np.asarray(hdus.targetFlux.targetId)
+            observationsIds = np.asarray(hdus.observations.targetId)
+
+            for ii in rows:
+                yield cls.__readTarget(hdus, ii, targetFluxIds, observationsIds)
+
+    @classmethod
+    def __readTarget(cls, hdus, ii, targetFluxIds, observationsIds):
+        # Decode the spectrum of a single target, following PfsTargetSpectra.readFits.
+        # Rows are copied out of the memory mapped arrays so that the file can be closed.
+
+        row = hdus.target[ii]
+        targetId = row["targetId"]
+
+        select = np.nonzero(targetFluxIds == targetId)[0]
+        filterNames = [ "".join(np.char.decode(ss.astype("S"))) for ss in hdus.targetFlux.filterName[select] ]
+        fiberFlux = dict(zip(filterNames, hdus.targetFlux.fiberFlux[select]))
+        fiberFluxErr = dict(zip(filterNames, hdus.targetFlux.fiberFluxErr[select]))
+        target = Target(
+            row["catId"],
+            row["tract"],
+            "".join(row["patch"]),
+            row["objId"],
+            row["ra"],
+            row["dec"],
+            TargetType(row["targetType"]),
+            fiberFlux=fiberFlux,
+            fiberFluxErr=fiberFluxErr,
+        )
+
+        select = np.nonzero(observationsIds == targetId)[0]
+        observations = Observations(
+            hdus.observations.visit[select],
+            [ "".join(np.char.decode(ss.astype("S"))) for ss in hdus.observations.arm[select] ],
+            hdus.observations.spectrograph[select],
+            hdus.observations.pfsDesignId[select],
+            hdus.observations.fiberId[select],
+            hdus.observations.pfiNominal[select],
+            hdus.observations.pfiCenter[select],
+        )
+
+        metadataRow = hdus.metadata[ii]
+        metadata = yaml.load(
+            # This complicated conversion is required in order to preserve the newlines
+            "".join(np.char.decode(metadataRow["metadata"].astype("S"))),
+            Loader=yaml.SafeLoader,
+        )
+        flags = MaskHelper.fromFitsHeader(metadata, strip=True)
+
+        fluxTableRow = hdus.fluxTable[ii]
+        fluxTable = FluxTable(
+            np.array(fluxTableRow["wavelength"]),
+            np.array(fluxTableRow["flux"]),
+            np.array(fluxTableRow["error"]),
+            np.array(fluxTableRow["mask"]),
+            flags,
+        )
+
+        notes = cls.PfsFiberArrayClass.NotesClass(
+            **{ col.name: hdus.notes[col.name][ii] for col in hdus.notes.columns }
+        )
+
+        return cls.PfsFiberArrayClass(
+            target,
+            observations,
+            np.array(hdus.wavelength[ii]),
+            np.array(hdus.flux[ii]),
+            np.array(hdus.mask[ii]),
+            np.array(hdus.sky[ii]),
+            np.array(hdus.covar[ii]),
+            np.array(hdus.covar2[ii]) if hdus.covar2 is not None else [],
+            flags,
+            metadata,
+            fluxTable,
+            notes,
+        )
@@ -0,0 +1,361 @@
+import os
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+import numpy as np
+import h5py
+
+from .setup_logger import logger
+from .skyindex import SkyIndex
+
+class PfsFiberCatalog():
+    """
+    Implements a columnar catalog of the fibers of all PfsConfig files of a
+    data repository, stored in an HDF5 file.
+
+    The catalog consists of a table of visits and a table of fibers, each
+    stored as a group of one-dimensional, resizable datasets, one per column.
+    New visits are appended incrementally and the entire catalog is held in
+    memory once loaded, so object searches reduce to vectorized masks over
+    the columns instead of opening every PfsConfig file.
+
+    Visits are identified by the visit number and the data processing run, so
+    the PfsConfig files of the same visit from different runs can be cataloged
+    side by side.
+
+    Variables
+    ---------
+    filename : str
+        Path to the HDF5 file.
+    """
+
+    VISIT_COLUMNS = [ 'visit', 'pfsDesignId', 'obstime', 'arms', 'date', 'run' ]
+    FIBER_COLUMNS = [ 'visit', 'run', 'fiberId', 'spectrograph', 'fiberStatus', 'proposalId', 'catId', 'objId',
+                      'tract', 'patch', 'targetType', 'obCode', 'ra', 'dec' ]
+
+    def __init__(self, filename):
+        self.__filename = filename
+        self.__visits = None
+        self.__fibers = None
+        self.__visit_set = None
+        self.__fiber_rows = None
+        self.__sky_index = None
+        self.__lock = threading.RLock()
+
+    #region Properties
+
+    def __get_filename(self):
+        return self.__filename
+
+    filename = property(__get_filename)
+
+    def __get_visits(self):
+        self.__ensure_loaded()
+        return self.__visits
+
+    visits = property(__get_visits)
+
+    def __get_fibers(self):
+        self.__ensure_loaded()
+        return self.__fibers
+
+    fibers = property(__get_fibers)
+
+    def __get_sky_index(self):
+        # Build the spatial index of the fibers when it is first used
+        with self.__lock:
+            fibers = self.fibers
+            if self.__sky_index is None and fibers is not None:
+                self.__sky_index = SkyIndex(fibers.ra, fibers.dec)
+            return self.__sky_index
+
+    sky_index = property(__get_sky_index)
+
+    #endregion
+
+    def __len__(self):
+        fibers = self.fibers
+        return len(fibers.visit) if fibers is not None else 0
+
+    def has_visit(self, visit, run=None):
+        """
+        Returns True if the visit is in the catalog, from any run if `run` is None.
+        """
+
+        self.__ensure_loaded()
+        if run is None:
+            return any(v == visit for v, r in self.__visit_set)
+        else:
+            return (visit, str(run)) in self.__visit_set
+
+    #region Load and save
+
+    def __ensure_loaded(self):
+        with self.__lock:
+            if self.__visits is None:
+                self.load()
+
+    def load(self):
+        """
+        Reads the catalog from the HDF5 file into memory. If the file doesn't
+        exist yet, the catalog is empty.
+        """
+
+        with self.__lock:
+            if os.path.isfile(self.__filename):
+                with h5py.File(self.__filename, 'r') as f:
+                    self.__visits = self.__read_table(f, 'visits', PfsFiberCatalog.VISIT_COLUMNS)
+                    self.__fibers = self.__read_table(f, 'fibers', PfsFiberCatalog.FIBER_COLUMNS)
+                logger.debug(f'Loaded fiber catalog `{self.__filename}` with {len(self.__visits.visit)} visits '
+                             f'and {len(self.__fibers.visit)} fibers.')
+            else:
+                self.__visits = None
+                self.__fibers = None
+
+            self.__visit_set = set(zip(self.__visits.visit.tolist(), self.__visits.run.tolist())) if self.__visits is not None else set()
+            self.__fiber_rows = None
+            self.__sky_index = None
+
+    def __read_table(self, f, name, columns):
+        if name not in f:
+            return None
+
+        g = f[name]
+        table = SimpleNamespace()
+        for k in columns:
+            ds = g[k]
+            if h5py.check_string_dtype(ds.dtype) is not None:
+                data = ds.asstr()[:].astype(str)
+            else:
+                data = ds[:]
+            setattr(table, k, data)
+
+        return table
+
+    def __write_table(self, f, name, table):
+        g = f.require_group(name)
+        for k, data in table.items():
+            if data.dtype.kind in 'UO':
+                data = data.astype(object)
+                dtype = h5py.string_dtype()
+            else:
+                dtype = data.dtype
+
+            if k not in g:
+                g.create_dataset(k, data=data, dtype=dtype, maxshape=(None,), chunks=True)
+            else:
+                ds = g[k]
+                n = ds.shape[0]
+                ds.resize((n + data.shape[0],))
+                ds[n:] = data
+
+    def __concat_table(self, table, new):
+        if table is None:
+            return SimpleNamespace(**new)
+        else:
+            return SimpleNamespace(**{ k: np.concatenate([ getattr(table, k), v ]) for k, v in new.items() })
+
+    #endregion
+    #region Update
+
+    def __get_date(self, value):
+        # Dates are stored as days since the epoch, visits without a date as NaT
+        if value is None:
+            return np.datetime64('NaT', 'D')
+        elif isinstance(value, datetime):
+            return np.datetime64(value.date(), 'D')
+        else:
+            return np.datetime64(value, 'D')
+
+    def append(self, pfs_configs, dates=None, runs=None):
+        """
+        Appends the fibers of PfsConfig files to the catalog. Visits that are
+        already in the catalog from the same run are skipped.
+
+        Arguments
+        ---------
+        pfs_configs : dict
+            Dictionary of PfsConfig objects, keyed by visit.
+        dates : dict
+            Optional dictionary of observation dates, keyed by visit.
+        runs : dict
+            Optional dictionary of the data processing runs, keyed by visit.
+
+        Returns
+        -------
+        int
+            Number of visits added to the catalog.
+        """
+
+        dates = dates if dates is not None else {}
+        runs = runs if runs is not None else {}
+
+        with self.__lock:
+            self.__ensure_loaded()
+
+            visits = { k: [] for k in PfsFiberCatalog.VISIT_COLUMNS }
+            fibers = { k: [] for k in PfsFiberCatalog.FIBER_COLUMNS }
+            for visit, config in pfs_configs.items():
+                run = str(runs.get(visit, ''))
+                if (visit, run) in self.__visit_set:
+                    continue
+
+                visits['visit'].append(visit)
+                visits['pfsDesignId'].append(config.pfsDesignId)
+                visits['obstime'].append(str(config.obstime))
+                visits['arms'].append(str(config.arms))
+                visits['date'].append(self.__get_date(dates.get(visit)))
+                visits['run'].append(run)
+
+                n = len(config.fiberId)
+                fibers['visit'].append(np.full(n, visit, dtype=np.int64))
+                fibers['run'].append(np.full(n, run, dtype=object))
+                for k in PfsFiberCatalog.FIBER_COLUMNS[2:]:
+                    fibers[k].append(np.asarray(getattr(config, k)))
+
+            if len(visits['visit']) == 0:
+                return 0
+
+            visits = {
+                'visit': np.array(visits['visit'], dtype=np.int64),
+                'pfsDesignId': np.array(visits['pfsDesignId'], dtype=np.int64),
+                'obstime': np.array(visits['obstime'], dtype=str),
+                'arms': np.array(visits['arms'], dtype=str),
+                'date': np.array(visits['date'], dtype='datetime64[D]').astype(np.int64),
+                'run': np.array(visits['run'], dtype=str),
+            }
+            fibers = { k: np.concatenate(v) for k, v in fibers.items() }
+            for k in [ 'run', 'proposalId', 'patch', 'obCode' ]:
+                fibers[k] = fibers[k].astype(str)
+
+            dir = os.path.dirname(self.__filename)
+            if dir != '' and not os.path.exists(dir):
+                os.makedirs(dir, exist_ok=True)
+
+            with h5py.File(self.__filename, 'a') as f:
+                self.__write_table(f, 'visits', visits)
+                self.__write_table(f, 'fibers', fibers)
+
+            self.__visits = self.__concat_table(self.__visits, visits)
+            self.__fibers = self.__concat_table(self.__fibers, fibers)
+            self.__visit_set.update(zip(visits['visit'].tolist(), visits['run'].tolist()))
+            self.__fiber_rows = None
+            self.__sky_index = None
+
+            logger.info(f'Added {len(visits["visit"])} visits and {len(fibers["visit"])} fibers '
+                        f'to fiber catalog `{self.__filename}`.')
+
+            return len(visits['visit'])
+
+    #endregion
+    #region Query
+
+    def __get_fiber_rows(self):
+        # Index of the row of the visits table each fiber belongs to, found by
+        # joining the tables on visit and run
+        with self.__lock:
+            if self.__fiber_rows is None:
+                runs, codes = np.unique(np.concatenate([ self.__visits.run, self.__fibers.run ]), return_inverse=True)
+                n = self.__visits.visit.shape[0]
+                vkeys = self.__visits.visit.astype(np.int64) * len(runs) + codes[:n]
+                fkeys = self.__fibers.visit.astype(np.int64) * len(runs) + codes[n:]
+                order = np.argsort(vkeys, kind='stable')
+                self.__fiber_rows = order[np.searchsorted(vkeys[order], fkeys)]
+            return self.__fiber_rows
+
+    def query(self, visit=None, date=None, run=None, object_filters=None, cone=None, box=None):
+        """
+        Returns the fibers matching the filters, grouped by visit.
+
+        Arguments
+        ---------
+        visit : IntFilter
+            Filter on the visit.
+        date : DateFilter
+            Filter on the date of the observation.
+        run : StringFilter
+            Filter on the data processing run.
+        object_filters : SimpleNamespace
+            Filters on the fiber columns, such as catId or objId.
+        cone : tuple
+            Cone search as (ra, dec, radius), in degrees.
+        box : tuple
+            Box search as (ra_min, ra_max, dec_min, dec_max), in degrees.
+
+        Returns
+        -------
+        dict
+            Dictionary of SimpleNamespace objects with the fiber columns as
+            numpy arrays, keyed by visit.
+        """
+
+        self.__ensure_loaded()
+        if self.__visits is None:
+            return {}
+
+        # Select the visits first
+        vmask = np.full(self.__visits.visit.shape, True)
+        if visit is not None:
+            vmask &= visit.mask(self.__visits.visit)
+        if date is not None and not date.is_none:
+            vmask &= date.mask(self.__visits.date.astype('datetime64[D]'))
+        if run is not None and not run.is_none:
+            vmask &= run.mask(self.__visits.run)
+
+        vidx = np.nonzero(vmask)[0]
+        if vidx.size == 0:
+            return {}
+
+        # When multiple runs of a visit match, the last one added wins, just like
+        # when the PfsConfig files are loaded directly
+        _, last = np.unique(self.__visits.visit[vidx][::-1], return_index=True)
+        vidx = np.sort(vidx[::-1][last])
+
+        # Select the fibers of the visits matching the object filters
+        fibers = self.__fibers
+        mask = np.isin(self.__get_fiber_rows(), vidx)
+        if object_filters is not None:
+            for k, p in object_filters.__dict__.items():
+                if hasattr(fibers, k) and k not in [ 'visit', 'run' ]:
+                    mask &= p.mask(getattr(fibers, k))
+        if cone is not None:
+            mask &= self.sky_index.cone(*cone)
+        if box is not None:
+            mask &= self.sky_index.box(*box)
+
+        idx = np.nonzero(mask)[0]
+        if idx.size == 0:
+            return {}
+
+        # Split the selected fibers by visit, keeping the order of the visits
+        idx = idx[np.argsort(fibers.visit[idx], kind='stable')]
+        visits, start, count = np.unique(fibers.visit[idx], return_index=True, return_counts=True)
+        vpos = dict(zip(self.__visits.visit[vidx].tolist(), vidx.tolist()))
+
+        identities = {}
+        for v, s, n in zip(visits.tolist(), start.tolist(), count.tolist()):
+            i = vpos[v]
+            ix = idx[s:s + n]
+            identities[v] = SimpleNamespace(
+                visit = np.full(n, v),
+                pfsDesignId = np.full(n, self.__visits.pfsDesignId[i]),
+                obstime = np.full(n, self.__visits.obstime[i]),
+                exptime = np.array(n * [None]),
+                fiberId = fibers.fiberId[ix],
+                spectrograph = fibers.spectrograph[ix],
+                arms = np.full(n, self.__visits.arms[i]),
+                fiberStatus = fibers.fiberStatus[ix],
+                proposalId = fibers.proposalId[ix],
+                catId = fibers.catId[ix],
+                objId = fibers.objId[ix],
+                tract = fibers.tract[ix],
+                patch = fibers.patch[ix],
+                targetType = fibers.targetType[ix],
+                obCode = fibers.obCode[ix],
+                ra = fibers.ra[ix],
+                dec = fibers.dec[ix],
+            )
+
+        return identities
+
+    #endregion
@@ -1,3 +1,4 @@
 from .pfssurveydownloader import PfsSurveyDownloader
+from .fiberindex import FiberIndex
 from .pfsspectrumreader import PfsSpectrumReader
 from .pfsstellarspectrumreader import PfsStellarSpectrumReader
@@ -0,0 +1,150 @@
+import hashlib
+import threading
+import weakref
+import numpy as np
+
+from ...repo import LruCache
+
+class FiberIndex():
+    """
+    Implements an index over a column of identifiers of a data product, such as
+    fiberId or objId, to look up the row of one or many identifiers without a
+    linear scan.
+
+    Scalar lookups use a dictionary, array lookups use a binary search over the
+    sorted identifiers. When an identifier appears multiple times, the first
+    row is returned, just like `np.where(values == value)[0][0]`.
+
+    Variables
+    ---------
+    values : array
+        Identifiers to index.
+    """
+
+    # Indexes are cached for the lifetime of the data product objects
+    __cache = weakref.WeakKeyDictionary()
+    __cache_lock = threading.Lock()
+
+    # Indexes of PfsConfig objects are also cached by pfsDesignId, visit and the
+    # checksum of the column so that they are reused even when the same PfsConfig
+    # file is loaded multiple times, but not after the fibers are selected or reordered
+    PFSCONFIG_CACHE = LruCache(maxsize=256)
+
+    def __init__(self, values):
+        self.__values = np.asarray(values)
+        self.__sorter = np.argsort(self.__values, kind='stable')
+        self.__sorted = self.__values[self.__sorter]
+        self.__map = None
+
+    #region Properties
+
+    def __get_values(self):
+        return self.__values
+
+    values = property(__get_values)
+
+    #endregion
+
+    def __len__(self):
+        return self.__values.shape[0]
+
+    def __contains__(self, value):
+        return self.__get_map().get(value) is not None
+
+    def __get_map(self):
+        if self.__map is None:
+            # Iterate in reverse so that the first occurrence wins
+            self.__map = { v: i for i, v in reversed(list(enumerate(self.__values.tolist()))) }
+        return self.__map
+
+    def get_index(self, values, required=True):
+        """
+        Return the row of each identifier. Missing identifiers raise a KeyError,
+        unless `required` is False, in which case -1 is returned for them.
+
+        Arguments
+        ---------
+        values : scalar or array
+            Identifiers to look up.
+        required : bool
+            If True, raise an exception when an identifier is not found.
+
+        Returns
+        -------
+        int or array of int
+            Row index of each identifier.
+        """
+
+        if np.ndim(values) == 0:
+            index = self.__get_map().get(values.item() if isinstance(values, np.generic) else values)
+            if index is None:
+                if required:
+                    raise KeyError(f'Identifier {values} not found.')
+                return -1
+            return index
+
+        values = np.asarray(values)
+        if self.__sorted.shape[0] == 0:
+            found = np.full(values.shape, False)
+            index = np.full(values.shape, -1)
+        else:
+            pos = np.searchsorted(self.__sorted, values)
+            pos = np.minimum(pos, self.__sorted.shape[0] - 1)
+            found = self.__sorted[pos] == values
+            index = np.where(found, self.__sorter[pos], -1)
+
+        if required and not np.all(found):
+            raise KeyError(f'Identifiers {values[~found][:10].tolist()} not found.')
+
+        return index
+
+    @staticmethod
+    def __get_cached(data, column, create):
+        # Look up the index of the column in the cache of the object, or create it
+
+        with FiberIndex.__cache_lock:
+            try:
+                indexes = FiberIndex.__cache.get(data)
+            except TypeError:
+                # Objects that don't support weak references are not cached
+                return create()
+
+            if indexes is None:
+                indexes = {}
+                FiberIndex.__cache[data] = indexes
+
+            if column not in indexes:
+                indexes[column] = create()
+
+            return indexes[column]
+
+    @staticmethod
+    def from_product(data, column='fiberId'):
+        """
+        Return the index over a column of a data product. The index is built once
+        and reused for as long as the data product object is alive.
+        """
+
+        return FiberIndex.__get_cached(data, column, lambda: FiberIndex(getattr(data, column)))
+
+    @staticmethod
+    def from_pfsConfig(pfsConfig, column='fiberId'):
+        """
+        Return the index over a column of a PfsConfig object, such as fiberId or
+        objId. Indexes are cached for the lifetime of the object and, across
+        objects, by pfsDesignId, visit and the checksum of the column.
+        """
+
+        def create():
+            values = np.ascontiguousarray(getattr(pfsConfig, column))
+            checksum = hashlib.blake2b(values.tobytes(), digest_size=16)
+            checksum.update(str(values.dtype).encode('ascii'))
+
+            key = (int(pfsConfig.pfsDesignId), int(pfsConfig.visit), column, checksum.hexdigest())
+            index = FiberIndex.PFSCONFIG_CACHE.get(key)
+            if index is None:
+                index = FiberIndex(values)
+                FiberIndex.PFSCONFIG_CACHE.set(key, index)
+            return index
+
+        return FiberIndex.__get_cached(pfsConfig, column, create)
@@ -15,6 +15,7 @@ from ..datamodel import *
 from ..utils import *
 
 from ..setup_logger import logger
+from .fiberindex import FiberIndex
 
 class PfsSpectrumReader(SpectrumReader):
     def __init__(self, wave_lim=None, orig=None):
@@ -79,7 +80,7 @@ class PfsSpectrumReader(SpectrumReader):
                 logger.warning(f'Arm {arm} not available in {get_type_string()} object.')
                 return False
 
-            if fiberid is not None and fiberid not in data.fiberId:
+            if fiberid is not None and fiberid not in FiberIndex.from_product(data, 'fiberId'):
                 logger.warning(f'Fiber ID {fiberid} not available in {get_type_string()} object.')
                 return False
             
@@ -103,11 +104,11 @@ class PfsSpectrumReader(SpectrumReader):
                 logger.warning(f'Arm {arm} not available in {get_type_string()} object with {get_id_string()}.')
                 return False
 
-            if objid is not None and objid not in data.objId:
+            if objid is not None and objid not in FiberIndex.from_pfsConfig(data, 'objId'):
                 logger.warning(f'Object {objid} not available in {get_type_string()} object with {get_id_string()}.')
                 return False
 
-            if fiberid is not None and fiberid not in data.fiberId:
+            if fiberid is not None and fiberid not in FiberIndex.from_pfsConfig(data, 'fiberId'):
                 logger.warning(f'Fiber {fiberid} not available in {get_type_string()} object with {get_id_string()}.')
                 return False
             
@@ -139,7 +140,7 @@ class PfsSpectrumReader(SpectrumReader):
         return spec
     
     def read_from_pfsFiberArray(self, data, spec, arm=None,
-                                wave_limits=None, wave_mask=None):
+                                wave_limits=None, wave_mask=None, copy=True):
         """
         Read a spectrum from a PfsFiberArray object (PfsSingle, PfsObject or PfsStar).
 
@@ -157,6 +158,9 @@ class PfsSpectrumReader(SpectrumReader):
             The wavelength limits of the arm.
         arm_mask : array-like
             A mask defining the pixels of the arm.
+        copy : bool
+            If False, the data vectors of the spectrum are views into the arrays
+            of the data product whenever the selected pixels are contiguous.
         """
 
         # TODO: What if the arms overlap?
@@ -223,14 +227,17 @@ class PfsSpectrumReader(SpectrumReader):
 
         # Extract the spectrum
 
+        # Select the pixels before any conversion so that only those are materialized
+        s = self.__get_wave_slice(data.fluxTable.wavelength, wave_mask, wave_limits)
+
         # nm -> A
-        wave = Physics.nm_to_angstrom(data.fluxTable.wavelength)
+        wave = Physics.nm_to_angstrom(data.fluxTable.wavelength[s])
 
         # nJy -> erg s-1 cm-2 A-1
-        flux = 1e-32 * Physics.fnu_to_flam(wave, data.fluxTable.flux)
-        flux_err = 1e-32 * Physics.fnu_to_flam(wave, data.fluxTable.error)
+        flux = 1e-32 * Physics.fnu_to_flam(wave, data.fluxTable.flux[s])
+        flux_err = 1e-32 * Physics.fnu_to_flam(wave, data.fluxTable.error[s])
         flux_sky = None
-        mask = data.fluxTable.mask
+        mask = data.fluxTable.mask[s]
 
         # Covariances 
         # TODO: these are not used anywhere yet and empty in PfsCalibrated files
@@ -245,7 +252,7 @@ class PfsSpectrumReader(SpectrumReader):
 
         self.__set_data_vectors(spec, wave, flux, flux_err, flux_sky,
                                 mask, data.flags['UNMASKEDNAN'],
-                                wave_mask, wave_limits)
+                                copy=copy)
 
         filename = data.filenameFormat % dict(**data.target.identity, visit=data.observations.visit[0])
         spec.history.append(f'Loaded from PfsFiberArraySet `{filename}`.')
@@ -258,122 +265,188 @@ class PfsSpectrumReader(SpectrumReader):
         
         if index is None:
             if fiberid is not None:
-                index = np.where(pfsConfig.fiberId == fiberid)[0][0]
+                index = FiberIndex.from_pfsConfig(pfsConfig, 'fiberId').get_index(fiberid)
             elif objid is not None:
-                index = np.where(pfsConfig.objId == objid)[0][0]
+                index = FiberIndex.from_pfsConfig(pfsConfig, 'objId').get_index(objid)
             else:
                 raise ValueError('Either fiberId or objId must be specified if index is None.')
 
-        if fiberid is None:
-            fiberid = pfsConfig.fiberId[index]
-
-        if objid is None:
-            objid = pfsConfig.objId[index]
-
-        spec.id = objid
-        spec.catid = pfsConfig.catId[index]
+        self.read_many_from_pfsConfig(pfsConfig, [ spec ], arm=arm, indices=[ index ])
 
-        spec.ra = pfsConfig.ra[index]
-        spec.dec = pfsConfig.dec[index]
+    def read_many_from_pfsConfig(self, pfsConfig: PfsConfig, specs, arm=None, objids=None, fiberids=None, indices=None):
+        """
+        Read the headers of many spectra from a PfsConfig object at once. The columns
+        of the selected fibers are gathered with a single indexing operation for all
+        spectra and the fibers are looked up in the cached index of the PfsConfig.
 
-        spec.redshift = np.nan
-        spec.redshift_err = np.nan
+        Parameters
+        ----------
+        pfsConfig : PfsConfig
+            The PfsConfig object.
+        specs : list of Spectrum
+            The spectra to fill, one for each fiber.
+        objids : array-like
+            Object IDs of the spectra.
+        fiberids : array-like
+            Fiber IDs of the spectra. Ignored when `objids` is set.
+        indices : array-like
+            Row indices of the spectra. Ignored when `objids` or `fiberids` is set.
+
+        Returns
+        -------
+        list of Spectrum
+            The filled spectra.
+        """
 
-        spec.exp_count = 1              # TODO
-        spec.exp_time = np.nan
-        spec.seeing = np.nan
-        spec.ext = np.nan
+        if objids is not None:
+            indices = FiberIndex.from_pfsConfig(pfsConfig, 'objId').get_index(np.atleast_1d(objids))
+        elif fiberids is not None:
+            indices = FiberIndex.from_pfsConfig(pfsConfig, 'fiberId').get_index(np.atleast_1d(fiberids))
+        elif indices is not None:
+            indices = np.atleast_1d(indices)
+        else:
+            raise ValueError('Either fiberIds, objIds or indices must be specified.')
         
-        spec.mjd = np.nan
-        spec.airmass = np.nan
+        if len(specs) != indices.shape[0]:
+            raise ValueError(f'Number of spectra {len(specs)} does not match the number of fibers {indices.shape[0]}.')
+
+        # Gather the columns of all fibers at once
+        objId = pfsConfig.objId[indices]
+        catId = pfsConfig.catId[indices]
+        tract = pfsConfig.tract[indices]
+        patch = pfsConfig.patch[indices]
+        ra = pfsConfig.ra[indices]
+        dec = pfsConfig.dec[indices]
+        targetType = pfsConfig.targetType[indices]
+        spectrograph = pfsConfig.spectrograph[indices]
+        fiberId = pfsConfig.fiberId[indices]
+        pfiNominal = pfsConfig.pfiNominal[indices]
+        pfiCenter = pfsConfig.pfiCenter[indices]
+
+        # These are the same for every fiber of the visit
+        shape = np.atleast_1d(pfsConfig.visit).shape
+        visit = np.atleast_1d(pfsConfig.visit)
+        arms = np.full(shape, arm) if arm is not None else np.atleast_1d(pfsConfig.arms)
+        pfsDesignId = np.atleast_1d(pfsConfig.pfsDesignId)
+        filename = pfsConfig.fileNameFormat % (pfsConfig.pfsDesignId, pfsConfig.visit)
 
-        spec.snr = np.nan
-        spec.mag = np.nan
+        for i, spec in enumerate(specs):
+            index = indices[i]
 
-        spec.spectrograph = pfsConfig.spectrograph[index]
-        spec.fiberid = pfsConfig.fiberId[index]
+            spec.id = objId[i]
+            spec.catid = catId[i]
 
-        if spec.target is None:
-            spec.target = Target(
-                catId = int(pfsConfig.catId[index]),
-                tract = int(pfsConfig.tract[index]),
-                patch = str(pfsConfig.patch[index]),
-                objId = int(pfsConfig.objId[index]),
-                ra = float(pfsConfig.ra[index]),
-                dec = float(pfsConfig.dec[index]),
-                targetType = pfsConfig.targetType[index],
-            )
+            spec.ra = ra[i]
+            spec.dec = dec[i]
 
-        # pfsConfig doesn't always have the fiberFlux so use whichever is available
-        spec.target.fiberFlux = {}
-        spec.target.psfFlux = {}
-        spec.target.totalFlux = {}
-        for target_flux, config_flux in zip(
-            [spec.target.fiberFlux, spec.target.psfFlux, spec.target.totalFlux],
-            [pfsConfig.fiberFlux[index], pfsConfig.psfFlux[index], pfsConfig.totalFlux[index]],
-        ):
-            for j, filter_name in enumerate(pfsConfig.filterNames[index]):
-                if filter_name is not None and filter_name != 'none' and \
-                    np.isfinite(config_flux[j]) and not np.isnan(config_flux[j]):
-                
-                    target_flux[filter_name] = float(config_flux[j])
+            spec.redshift = np.nan
+            spec.redshift_err = np.nan
 
-        shape = np.atleast_1d(pfsConfig.visit).shape
-        spec.observations = Observations(
-            visit = np.atleast_1d(pfsConfig.visit),
-            # If the arms are specified, override the metadata
-            arm = np.full(shape, arm) if arm is not None else np.atleast_1d(pfsConfig.arms),
-            spectrograph = np.atleast_1d(pfsConfig.spectrograph[index]),
-            pfsDesignId = np.atleast_1d(pfsConfig.pfsDesignId),
-            fiberId = np.atleast_1d(pfsConfig.fiberId[index]),
-            pfiNominal = np.atleast_2d(pfsConfig.pfiNominal[index]),
-            pfiCenter = np.atleast_2d(pfsConfig.pfiCenter[index]),
-            obsTime = np.atleast_1d(Identity.defaultObsTime),
-            expTime = np.atleast_1d(Identity.defaultExpTime),
-        )
+            spec.exp_count = 1              # TODO
+            spec.exp_time = np.nan
+            spec.seeing = np.nan
+            spec.ext = np.nan
+            
+            spec.mjd = np.nan
+            spec.airmass = np.nan
+
+            spec.snr = np.nan
+            spec.mag = np.nan
+
+            spec.spectrograph = spectrograph[i]
+            spec.fiberid = fiberId[i]
+
+            if spec.target is None:
+                spec.target = Target(
+                    catId = int(catId[i]),
+                    tract = int(tract[i]),
+                    patch = str(patch[i]),
+                    objId = int(objId[i]),
+                    ra = float(ra[i]),
+                    dec = float(dec[i]),
+                    targetType = targetType[i],
+                )
+
+            # pfsConfig doesn't always have the fiberFlux so use whichever is available
+            spec.target.fiberFlux = {}
+            spec.target.psfFlux = {}
+            spec.target.totalFlux = {}
+            for target_flux, config_flux in zip(
+                [spec.target.fiberFlux, spec.target.psfFlux, spec.target.totalFlux],
+                [pfsConfig.fiberFlux[index], pfsConfig.psfFlux[index], pfsConfig.totalFlux[index]],
+            ):
+                for j, filter_name in enumerate(pfsConfig.filterNames[index]):
+                    if filter_name is not None and filter_name != 'none' and np.isfinite(config_flux[j]):
+                        target_flux[filter_name] = float(config_flux[j])
+
+            spec.observations = Observations(
+                visit = visit,
+                # If the arms are specified, override the metadata
+                arm = arms,
+                spectrograph = np.atleast_1d(spectrograph[i]),
+                pfsDesignId = pfsDesignId,
+                fiberId = np.atleast_1d(fiberId[i]),
+                pfiNominal = np.atleast_2d(pfiNominal[i]),
+                pfiCenter = np.atleast_2d(pfiCenter[i]),
+                obsTime = np.atleast_1d(Identity.defaultObsTime),
+                expTime = np.atleast_1d(Identity.defaultExpTime),
+            )
 
-        # Extract Pfs header information, this is different what the
-        # data model uses for the identity, we collect all fields here that
-        # are necessary to uniquely identify the spectrum
-        identity = Identity(
-            visit = int(pfsConfig.visit),
-            arm = arm if arm is not None else pfsConfig.arms,
-            spectrograph = int(pfsConfig.spectrograph[index]),
-            pfsDesignId = int(pfsConfig.pfsDesignId),
-            obsTime = Identity.defaultObsTime,
-            expTime = Identity.defaultExpTime
-        )
-        
-        if spec.identity is None:
-            spec.identity = identity
-        else:
-            spec.identity = merge_identity(spec.identity, identity, arm=arm)
+            # Extract Pfs header information, this is different what the
+            # data model uses for the identity, we collect all fields here that
+            # are necessary to uniquely identify the spectrum
+            identity = Identity(
+                visit = int(pfsConfig.visit),
+                arm = arm if arm is not None else pfsConfig.arms,
+                spectrograph = int(spectrograph[i]),
+                pfsDesignId = int(pfsConfig.pfsDesignId),
+                obsTime = Identity.defaultObsTime,
+                expTime = Identity.defaultExpTime
+            )
             
+            if spec.identity is None:
+                spec.identity = identity
+            else:
+                spec.identity = merge_identity(spec.identity, identity, arm=arm)
 
-        filename = pfsConfig.fileNameFormat % (pfsConfig.pfsDesignId, pfsConfig.visit)
-        spec.history.append(f'Loaded from PfsFiberArraySet `{filename}`, index={index}.')
+            spec.history.append(f'Loaded from PfsFiberArraySet `{filename}`, index={index}.')
+
+        return specs
     
     def read_from_pfsFiberArraySet(self, data, spec, arm=None,
                                    fiberid=None, index=None,
-                                   wave_limits=None, wave_mask=None):
+                                   wave_limits=None, wave_mask=None, copy=True):
+        """
+        Read a spectrum of a single fiber from a PfsFiberArraySet object (PfsArm,
+        PfsMerged or PfsCalibrated).
+
+        The wavelength range is selected on the row of the product with a binary
+        search, so that unit conversions are only done on the selected pixels.
+        When `copy` is False and the selected pixels are contiguous, the flux, sky
+        and mask vectors of the spectrum are views into the arrays of the product,
+        which are memory mapped when the product was read from a FITS file.
+        """
     
         if index is None:
             if fiberid is not None:
-                index = np.where(data.fiberId == fiberid)[0][0]
+                index = FiberIndex.from_product(data, 'fiberId').get_index(fiberid)
             else:
                 raise ValueError('Either fiberId or objId must be specified if index is None.')
         
         # Extract the spectrum
 
+        # Select the pixels before any conversion so that only those are materialized
+        s = self.__get_wave_slice(data.wavelength[index], wave_mask, wave_limits)
+
         # nm -> A
-        wave = Physics.nm_to_angstrom(data.wavelength[index])
+        wave = Physics.nm_to_angstrom(data.wavelength[index][s])
         
         # nJy -> erg s-1 cm-2 A-1
-        flux = data.flux[index]
-        flux_err = np.sqrt(data.variance[index])
-        flux_sky = data.sky[index]
+        flux = data.flux[index][s]
+        flux_err = np.sqrt(data.variance[index][s])
+        flux_sky = data.sky[index][s]
 
-        mask = data.mask[index]
+        mask = data.mask[index][s]
         
         # TODO: covariances? norm?
         # data.covar - (nfiber, 3, nwave) flux covariance band matrix, still all nan
@@ -386,8 +459,8 @@ class PfsSpectrumReader(SpectrumReader):
         spec.mask_flags = self.__get_mask_flags(data)
 
         self.__set_data_vectors(spec, wave, flux, flux_err, flux_sky,
-                        mask, data.flags['UNMASKEDNAN'],
-                        wave_mask, wave_limits)
+                                mask, data.flags['UNMASKEDNAN'],
+                                copy=copy)
         
         if spec.identity is None:
             spec.identity = data.identity
@@ -397,33 +470,194 @@ class PfsSpectrumReader(SpectrumReader):
         filename = data.getFilename(data.identity)
         spec.history.append(f'Loaded from PfsFiberArraySet `{filename}`, index={index}.')
 
-    def __set_data_vectors(self, spec,
-                           wave, flux, flux_err, flux_sky,
-                           mask, unmasked_nan_flag,
-                           wave_mask, wave_limits):
+    def read_block_from_pfsFiberArraySet(self, data, fiberids=None, indices=None,
+                                         wave_limits=None):
+        """
+        Extract the spectra of many fibers from a PfsFiberArraySet object (PfsArm,
+        PfsMerged or PfsCalibrated) in a single vectorized pass.
+
+        The spectra are returned as 2D blocks with one row per fiber. Since the
+        wavelength grid can differ from fiber to fiber, the columns span the union
+        of the pixels within `wave_limits` of all selected fibers.
+
+        Parameters
+        ----------
+        data : PfsFiberArraySet
+            The data product.
+        fiberids : array-like
+            Fiber IDs of the spectra to extract.
+        indices : array-like
+            Row indices of the spectra to extract. Ignored when `fiberids` is set.
+        wave_limits : tuple
+            Wavelength limits in A.
+
+        Returns
+        -------
+        SimpleNamespace
+            Fields `index`, `fiberId`, `wave`, `flux`, `flux_err`, `flux_sky` and `mask`.
+        """
+
+        if fiberids is not None:
+            indices = FiberIndex.from_product(data, 'fiberId').get_index(np.atleast_1d(fiberids))
+        elif indices is not None:
+            indices = np.atleast_1d(indices)
+        else:
+            indices = np.arange(len(data.fiberId))
+
+        # Find the columns within the wavelength limits of any of the fibers
+        if wave_limits is not None:
+            wave = Physics.nm_to_angstrom(data.wavelength[indices])
+            cols = np.flatnonzero(((wave >= wave_limits[0]) & (wave <= wave_limits[1])).any(axis=0))
+            s = slice(cols[0], cols[-1] + 1) if cols.size > 0 else slice(0, 0)
+            wave = wave[:, s]
+        else:
+            s = slice(None)
+            wave = Physics.nm_to_angstrom(data.wavelength[indices])
+
+        flux = data.flux[indices, s]
+        flux_err = np.sqrt(data.variance[indices, s])
+        flux_sky = data.sky[indices, s]
+        mask = data.mask[indices, s]
+
+        # Make sure pixels with nan and inf are masked
+        bad = ~(np.isfinite(flux) & np.isfinite(flux_err))
+        if bad.any():
+            mask = np.where(bad, mask | data.flags['UNMASKEDNAN'], mask)
+
+        return SimpleNamespace(
+            index = indices,
+            fiberId = np.asarray(data.fiberId)[indices],
+            wave = wave,
+            flux = flux,
+            flux_err = flux_err,
+            flux_sky = flux_sky,
+            mask = mask,
+        )
+
+    def read_many_from_pfsFiberArraySet(self, data, specs, arm=None,
+                                        fiberids=None, indices=None,
+                                        wave_limits=None):
+        """
+        Fill many spectra from a PfsFiberArraySet object at once. The data are
+        extracted with `read_block_from_pfsFiberArraySet` and the vectors of each
+        spectrum are views into the rows of the blocks, limited to the pixels
+        within the wavelength limits of the fiber.
+
+        Parameters
+        ----------
+        data : PfsFiberArraySet
+            The data product.
+        specs : list of Spectrum
+            The spectra to fill, one for each fiber.
+        fiberids : array-like
+            Fiber IDs of the spectra to extract.
+        indices : array-like
+            Row indices of the spectra to extract. Ignored when `fiberids` is set.
+        wave_limits : tuple
+            Wavelength limits in A.
+
+        Returns
+        -------
+        list of Spectrum
+            The filled spectra.
+        """
+
+        block = self.read_block_from_pfsFiberArraySet(data, fiberids=fiberids, indices=indices,
+                                                      wave_limits=wave_limits)
         
-        # Apply the arm mask
-        if wave_mask is None:
+        if len(specs) != block.index.shape[0]:
+            raise ValueError(f'Number of spectra {len(specs)} does not match the number of fibers {block.index.shape[0]}.')
+
+        mask_flags = self.__get_mask_flags(data)
+        filename = data.getFilename(data.identity)
+
+        for i, spec in enumerate(specs):
+            # Limit the row to the pixels of the fiber within the wavelength limits
             if wave_limits is not None:
-                wave_mask = (wave >= wave_limits[0]) & (wave <= wave_limits[1])
+                s = self.__get_wave_slice(block.wave[i], (block.wave[i] >= wave_limits[0]) & (block.wave[i] <= wave_limits[1]), None)
             else:
-                wave_mask = ()
+                s = slice(None)
 
-        if isinstance(wave_mask, np.ndarray) and wave_mask.sum() == 0:
+            spec.is_flux_calibrated = False
+            spec.mask_bits = 0
+            spec.mask_flags = mask_flags
+
+            self.__set_data_vectors(spec, block.wave[i][s], block.flux[i][s], block.flux_err[i][s], block.flux_sky[i][s],
+                                    block.mask[i][s], data.flags['UNMASKEDNAN'],
+                                    copy=False)
+
+            if spec.identity is None:
+                spec.identity = data.identity
+            else:
+                spec.identity = merge_identity(spec.identity, data.identity, arm=arm)
+
+            spec.history.append(f'Loaded from PfsFiberArraySet `{filename}`, index={block.index[i]}.')
+
+        return specs
+
+    def __get_wave_slice(self, wave, wave_mask, wave_limits):
+        """
+        Return an index into the wavelength vector, in nm, that selects the pixels
+        of the mask or within the wavelength limits, in A. A slice is returned
+        whenever the selected pixels are contiguous, so that indexing returns views.
+        """
+
+        if wave_mask is not None:
+            if isinstance(wave_mask, np.ndarray) and wave_mask.dtype == bool:
+                idx = np.flatnonzero(wave_mask)
+                if idx.size > 0 and idx[-1] - idx[0] + 1 == idx.size:
+                    return slice(idx[0], idx[-1] + 1)
+            return wave_mask
+        elif wave_limits is None:
+            return slice(None)
+        elif wave.size > 1 and not np.all(wave[1:] >= wave[:-1]):
+            # The wavelength grid is not sorted, fall back to a boolean mask
+            wave = Physics.nm_to_angstrom(wave)
+            return (wave >= wave_limits[0]) & (wave <= wave_limits[1])
+        else:
+            # Binary search for the limits in nm, then correct the edges by comparing
+            # the converted values to get exactly the same pixels as the boolean mask
+            lo = np.searchsorted(wave, wave_limits[0] / Physics.nm_to_angstrom(1.0), side='left')
+            hi = np.searchsorted(wave, wave_limits[1] / Physics.nm_to_angstrom(1.0), side='right')
+            while lo > 0 and Physics.nm_to_angstrom(wave[lo - 1]) >= wave_limits[0]:
+                lo -= 1
+            while lo < wave.size and Physics.nm_to_angstrom(wave[lo]) < wave_limits[0]:
+                lo += 1
+            while hi < wave.size and Physics.nm_to_angstrom(wave[hi]) <= wave_limits[1]:
+                hi += 1
+            while hi > lo and Physics.nm_to_angstrom(wave[hi - 1]) > wave_limits[1]:
+                hi -= 1
+            return slice(lo, max(lo, hi))
+
+    def __set_data_vectors(self, spec,
+                           wave, flux, flux_err, flux_sky,
+                           mask, unmasked_nan_flag,
+                           copy=True):
+        
+        # The vectors are already limited to the selected pixels
+        if wave.size == 0:
             logger.warning(f'No data points found in the specified wavelength range for spectrum {spec.get_name()}.')
             return None
+        
+        if copy:
+            # Only copy the views into the arrays of the product, vectors computed
+            # by the caller, such as unit conversions, are already owned
+            def own(a):
+                return np.array(a) if a is not None and a.base is not None else a
 
-        spec.wave = wave[wave_mask]
+            wave, flux, flux_err, flux_sky, mask = own(wave), own(flux), own(flux_err), own(flux_sky), own(mask)
+
+        spec.wave = wave
         spec.wave_edges = Binning.find_wave_edges(spec.wave)
-        spec.flux = flux[wave_mask]
-        spec.flux_err = flux_err[wave_mask]
-        self.flux_sky = flux_sky[wave_mask] if flux_sky is not None else None
-        spec.mask = mask[wave_mask]
+        spec.flux = flux
+        spec.flux_err = flux_err
+        self.flux_sky = flux_sky
+        spec.mask = mask
 
-        # Make sure pixels with nan and inf are masked
-        spec.mask = np.where(np.isnan(spec.flux) | np.isinf(spec.flux) | np.isnan(spec.flux_err) | np.isinf(spec.flux_err),
-                             spec.mask | unmasked_nan_flag,
-                             spec.mask)
+        # Make sure pixels with nan and inf are masked, only allocate a new mask if necessary
+        bad = ~(np.isfinite(spec.flux) & np.isfinite(spec.flux_err))
+        if bad.any():
+            spec.mask = np.where(bad, spec.mask | unmasked_nan_flag, spec.mask)
 
         spec.resolution = np.round(np.median(0.5 * (spec.wave[1:] + spec.wave[:-1]) / np.diff(spec.wave)), -3)
         spec.is_wave_regular = False
@@ -444,7 +678,7 @@ class PfsSpectrumReader(SpectrumReader):
         spec.airmass = 1 / np.cos(np.radians(90 - spec.alt))
 
     def read_from_pfsTargetSpectra(self, data, spec, arm=None, objid=None,
-                                   wave_limits=None, wave_mask=None):
+                                   wave_limits=None, wave_mask=None, copy=True):
         
         for target in data.keys():
             if (objid is None or target.identity['objId'] == objid) \
@@ -452,6 +686,7 @@ class PfsSpectrumReader(SpectrumReader):
                 
                 return self.read_from_pfsFiberArray(data[target], spec, arm=arm,
                                                     wave_limits=wave_limits,
-                                                    wave_mask=wave_mask)
+                                                    wave_mask=wave_mask,
+                                                    copy=copy)
 
         raise ValueError(f'Arm {arm} or objId {objid} not available in PfsTargetSpectra object.')
\ No newline at end of file
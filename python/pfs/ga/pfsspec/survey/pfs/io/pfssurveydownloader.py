@@ -1,10 +1,12 @@
-import os
 import re
 import urllib.parse
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
 
-from pfs.ga.pfsspec.core.util import SmartParallel
-from pfs.ga.pfsspec.core.util.dict import pivot_array_of_dicts, pivot_dict_of_arrays
-from ...io import SurveyDownloader
+from pfs.ga.pfsspec.core.util.dict import pivot_dict_of_arrays
+from ...io import SurveyDownloader, BulkDownloader, SurveyCrawler
+from ...repo import SearchFilter, IntFilter, HexFilter, StringFilter
 
 from ..setup_logger import logger
 
@@ -13,6 +15,14 @@ class PfsSurveyDownloader(SurveyDownloader):
     Implements function to download spectra from a survey.
 
     Tokens can be requested through the science portal.
+
+    The directory listings of the catalogs, tracts and patches are crawled
+    concurrently and the files are downloaded as soon as they are found. Multiple
+    catIds, tracts and patches can be specified, when tracts or patches are not
+    specified, all of them are listed.
+
+    Listings are kept as columns of numpy arrays and filtered with the masks
+    of the search filters on catId, tract, patch, objId and visit.
     """
 
     PORTAL_URL = 'https://hscpfs.mtk.nao.ac.jp/portal'
@@ -24,66 +34,149 @@ class PfsSurveyDownloader(SurveyDownloader):
         if not isinstance(orig, PfsSurveyDownloader):
             self.base_url = PfsSurveyDownloader.DOWNLOAD_URL
             self.token = None
+            self.max_retries = BulkDownloader.DEFAULT_RETRIES
 
             self.rerun_dir = None
-            self.catId = None
-            self.tract = None
-            self.patch = None
-            self.visit = None
-            self.objId = None
+            self.catId = IntFilter(name='catId', format='{:05d}')
+            self.tract = IntFilter(name='tract', format='{:05d}')
+            self.patch = StringFilter(name='patch')
+            self.visit = IntFilter(name='visit', format='{:06d}')
+            self.objId = HexFilter(name='objId', format='{:016x}')
         else:
             self.base_url = orig.base_url
             self.token = orig.token
+            self.max_retries = orig.max_retries
 
             self.rerun_dir = orig.rerun_dir
-            self.catId = orig.catId
-            self.tract = orig.tract
-            self.patch = orig.patch
-            self.visit = orig.visit
-            self.objId = orig.objId
+            self.catId = orig.catId.copy()
+            self.tract = orig.tract.copy()
+            self.patch = orig.patch.copy()
+            self.visit = orig.visit.copy()
+            self.objId = orig.objId.copy()
 
     def add_args(self, parser, config):
         super().add_args(parser, config)
 
         parser.add_argument('--base-url', dest='base_url', type=str, default=None, help='Base URL of the survey')
         parser.add_argument('--token', dest='token', type=str, default=None, help='Token to access the survey')
+        parser.add_argument('--max-retries', dest='max_retries', type=int, default=None, help='Number of retries of failed downloads')
 
         parser.add_argument('--rerun-dir', dest='rerun_dir', type=str, default=None, help='Rerun directory')
-        parser.add_argument('--catId', dest='catId', type=int, default=None, help='Catalog ID')
-        parser.add_argument('--tract', dest='tract', type=int, default=None, help='Tract')
-        parser.add_argument('--patch', dest='patch', type=str, default=None, help='Patch')
-        parser.add_argument('--visit', dest='visit', type=int, default=None, help='Visit')
-        parser.add_argument('--objId', dest='objId', type=str, default=None, help='Object ID')
+        parser.add_argument('--catId', dest='catId', type=str, nargs='*', default=None, help='Catalog ID')
+        parser.add_argument('--tract', dest='tract', type=str, nargs='*', default=None, help='Tract')
+        parser.add_argument('--patch', dest='patch', type=str, nargs='*', default=None, help='Patch')
+        parser.add_argument('--visit', dest='visit', type=str, nargs='*', default=None, help='Visit')
+        parser.add_argument('--objId', dest='objId', type=str, nargs='*', default=None, help='Object ID, in hex even without the 0x prefix')
 
     def init_from_args(self, script, config, args):
         super().init_from_args(script, config, args)
     
         self.base_url = self.get_arg('base_url', self.base_url, args)
         self.token = self.get_arg('token', self.token, args)
+        self.max_retries = self.get_arg('max_retries', self.max_retries, args)
         
         self.rerun_dir = self.get_arg('rerun_dir', self.rerun_dir, args)
-        self.catId = self.get_arg('catId', self.catId, args)
-        self.tract = self.get_arg('tract', self.tract, args)
-        self.patch = self.get_arg('patch', self.patch, args)
-        self.visit = self.get_arg('visit', self.visit, args)
-        self.objId = self.get_arg('objId', self.objId, args)
-        if self.objId is not None and self.objId.startswith('0x'):
-            self.objId = int(self.objId, 16)
-        elif self.objId is not None:
-            self.objId = int(self.objId)
+        # Parse the filters, these can be lists of values and ranges
+        for k in [ 'catId', 'tract', 'patch', 'visit', 'objId' ]:
+            arg = self.get_arg(k, None, args)
+            if arg is not None:
+                getattr(self, k).parse(arg)
 
     def run(self):
         # TODO: now this only downloads pfsSingle files,
         #       extend this to process other types of files
 
-        # Grab the list of files based on the catId, tract, and patch
-        ids = self.get_pfsSingle_list(self.catId, self.tract, self.patch)
+        if self.catId.is_none:
+            raise ValueError('At least one catId must be specified.')
 
-        # Filter the list to a certain objId and visit
-        ids = self.filter_pfsSingle_list(ids, self.catId, self.tract, self.patch, self.objId, self.visit)
+        with self.create_bulk_downloader() as downloader:
+            crawler = SurveyCrawler(downloader, self.visit_pfsSingle_listing, concurrency=downloader.threads)
+            stats = crawler.run(self.get_pfsSingle_roots())
+
+        # The crawl continues past failed listings and downloads, report them at the end
+        if len(stats.errors) > 0:
+            url, ex = stats.errors[0]
+            raise IOError(f'Failed to list or download {len(stats.errors)} URLs, first failed `{url}`: {ex}')
+
+        return stats
+
+    def __get_explicit_values(self, filter):
+        # Return the list of values if the filter consists of individual values only,
+        # otherwise the directories have to be listed and matched against the filter
+        if filter.is_none:
+            return None
+
+        values = []
+        for v in filter.values:
+            if isinstance(v, tuple):
+                if isinstance(filter, IntFilter) and v[1] - v[0] < 1000:
+                    values.extend(range(v[0], v[1] + 1))
+                else:
+                    return None
+            elif isinstance(v, str) and any(c in v for c in '*?['):
+                return None
+            else:
+                values.append(v)
+
+        return values
+
+    def get_pfsSingle_roots(self):
+        # Start the crawl as deep in the directory tree as the filters allow
+        # to avoid listing directories that are not needed
+        catIds = self.__get_explicit_values(self.catId)
+        tracts = self.__get_explicit_values(self.tract)
+        patches = self.__get_explicit_values(self.patch)
+
+        if catIds is None:
+            raise ValueError('Catalog IDs must be specified as values or short ranges.')
+
+        roots = []
+        for catId in catIds:
+            if tracts is None:
+                roots.append(SimpleNamespace(url=self.get_full_url(f'pfsSingle/{catId:05d}/'),
+                                             catId=catId, tract=None, patch=None))
+            else:
+                for tract in tracts:
+                    if patches is None:
+                        roots.append(SimpleNamespace(url=self.get_full_url(f'pfsSingle/{catId:05d}/{tract:05d}/'),
+                                                     catId=catId, tract=tract, patch=None))
+                    else:
+                        for patch in patches:
+                            roots.append(SimpleNamespace(url=self.get_full_url(self.get_pfsSingle_dir(catId, tract, patch)),
+                                                         catId=catId, tract=tract, patch=patch))
+
+        return roots
+
+    def visit_pfsSingle_listing(self, listing, hrefs):
+        """
+        Processes a directory listing of the crawl. Listings of catalogs return
+        the tract directories, listings of tracts return the patch directories and
+        listings of patches return the pfsSingle files to download.
+        """
+
+        listings = []
+        files = []
+
+        if listing.tract is None or listing.patch is None:
+            for href in hrefs:
+                if not href.endswith('/'):
+                    continue
+
+                name = urllib.parse.unquote(href.rstrip('/').split('/')[-1])
+                url = urllib.parse.urljoin(listing.url, href)
+                if listing.tract is None and re.match(r'^\d{5}$', name):
+                    if self.tract.match(int(name)):
+                        listings.append(SimpleNamespace(url=url, catId=listing.catId, tract=int(name), patch=None))
+                elif listing.tract is not None and re.match(r'^\d+,\d+$', name):
+                    if self.patch.match(name):
+                        listings.append(SimpleNamespace(url=url, catId=listing.catId, tract=listing.tract, patch=name))
+        else:
+            ids = self.parse_pfsSingle_list(hrefs)
+            ids = self.filter_pfsSingle_list(ids, self.catId, self.tract, self.patch, self.objId, self.visit)
+            files = [ self.get_pfsSingle_download(identity) for identity in pivot_dict_of_arrays(ids) ]
+
+        return listings, files
 
-        self.download_pfsSingle_list(ids)
-    
     def get_auth_headers(self):
         return { 'Authorization': f'Bearer {self.token}' }
     
@@ -120,60 +213,98 @@ class PfsSurveyDownloader(SurveyDownloader):
         url = self.get_full_url(self.get_pfsSingle_dir(catId, tract, patch))
         headers = self.get_auth_headers()
         html = self.http_get(url, headers=headers).text
-        urls = self.parse_href(html)
-        ids = { k: [] for k in ['catId', 'tract', 'patch', 'objId', 'visit']}
-        for url in urls:
-            r = self.parse_pfsSingle_path(url)
-            if r is not None:
-                for k in ids:
-                    ids[k].append(r[k])
-
-        return ids
-    
+        return self.parse_pfsSingle_list(self.parse_href(html))
+
+    def parse_pfsSingle_list(self, urls):
+        """
+        Parses the identities of pfsSingle files from a list of URLs.
+
+        Returns
+        -------
+        dict of arrays
+            Columns of the identities, catId, tract, patch, objId and visit.
+        """
+
+        names = pd.Series([ url.split('/')[-1] for url in urls ], dtype=str)
+        m = names.str.extract(r"^pfsSingle-(\d{5})-(\d{5})-(.*)-([0-9a-f]{16})-(\d{6})\.fits.*$").dropna()
+
+        return {
+            'catId': m[0].to_numpy(dtype=np.int32) if len(m) > 0 else np.zeros(0, dtype=np.int32),
+            'tract': m[1].to_numpy(dtype=np.int32) if len(m) > 0 else np.zeros(0, dtype=np.int32),
+            'patch': np.array([ urllib.parse.unquote(p) for p in m[2] ], dtype=str),
+            'objId': np.array([ int(o, 16) for o in m[3] ], dtype=np.int64),
+            'visit': m[4].to_numpy(dtype=np.int32) if len(m) > 0 else np.zeros(0, dtype=np.int32),
+        }
+
+    def __get_filter(self, filter_type, value):
+        if isinstance(value, SearchFilter):
+            return value
+        elif value is None:
+            return filter_type()
+        else:
+            return filter_type(*np.atleast_1d(value).tolist())
+
     def filter_pfsSingle_list(self, ids, catId, tract, patch, objId, visit):
-        # Filter the list to a certain objId and visit)
-        filtered_ids = { k: [] for k in ids }
-        for i in range(len(ids['catId'])):
-            if catId is None or ids['catId'][i] == catId \
-                and tract is None or ids['tract'][i] == tract \
-                and patch is None or ids['patch'][i] == patch \
-                and objId is None or ids['objId'][i] == objId \
-                and visit is None or ids['visit'][i] == visit:
-
-                for k in ids:
-                    filtered_ids[k].append(ids[k][i])
-
-        return filtered_ids
-    
+        """
+        Filters a list of pfsSingle identities. The filters can be None, single
+        values, lists of values or search filters with values and ranges.
+
+        Arguments
+        ---------
+        ids : dict of arrays
+            Columns of the identities, as returned by `parse_pfsSingle_list`.
+
+        Returns
+        -------
+        dict of arrays
+            Columns of the identities that match all filters.
+        """
+
+        filters = {
+            'catId': self.__get_filter(IntFilter, catId),
+            'tract': self.__get_filter(IntFilter, tract),
+            'patch': self.__get_filter(StringFilter, patch),
+            'objId': self.__get_filter(HexFilter, objId),
+            'visit': self.__get_filter(IntFilter, visit),
+        }
+
+        ids = { k: np.asarray(v) for k, v in ids.items() }
+        mask = np.full(ids['catId'].shape, True)
+        for k, f in filters.items():
+            if not f.is_none:
+                mask &= f.mask(ids[k])
+
+        return { k: v[mask] for k, v in ids.items() }
+
+    def get_pfsSingle_download(self, identity):
+        # Construct the download URL and the output path of a pfsSingle file
+
+        path = self.get_pfsSingle_path(identity['catId'], identity['tract'], identity['patch'],
+                                       identity['objId'], identity['visit'])
+        return { 'url': self.get_full_url(path), 'path': path }
+
+    def create_bulk_downloader(self):
+        return BulkDownloader(
+            outdir = self.outdir,
+            headers = self.get_auth_headers(),
+            threads = self.threads if self.parallel else 1,
+            retries = self.max_retries,
+            resume = self.resume)
+
     def download_pfsSingle(self, identity):
         # Download a pfsSingle file and save it
 
-        catId = identity['catId']
-        tract = identity['tract']
-        patch = identity['patch']
-        objId = identity['objId']
-        visit = identity['visit']
-
-        # Construct the download URL
-        path = self.get_pfsSingle_path(catId, tract, patch, objId, visit)
-        url = self.get_full_url(path)
-
-        # Construct the output path
-        outfile = os.path.join(self.outdir, path)
-        
-        headers = self.get_auth_headers()
-        self.wget_download(url, outfile, headers=headers, resume=self.resume)
+        item = self.get_pfsSingle_download(identity)
+        with self.create_bulk_downloader() as downloader:
+            downloader.download(item['url'], item['path'])
 
         return True
-        
-
-    def download_pfsSingle_error(self, ex, i):
-        raise ex
 
     def download_pfsSingle_list(self, ids):
+        # Download the files on pooled connections, files that have already been
+        # downloaded are skipped based on the manifest in the output directory
         ids = pivot_dict_of_arrays(ids)
+        items = [ self.get_pfsSingle_download(identity) for identity in ids ]
 
-        with SmartParallel(verbose=self.verbose, parallel=self.parallel, threads=self.threads) as p:
-            res = [r for r in p.map(self.download_pfsSingle, self.download_pfsSingle_error, ids)]
-
-
+        with self.create_bulk_downloader() as downloader:
+            return downloader.download_many(items)
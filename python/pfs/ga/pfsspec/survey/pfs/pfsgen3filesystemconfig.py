@@ -41,17 +41,17 @@ def load_PfsCalibrated_PfsSingle(identity, filename, dir, **kwargs):
         # Limit id fields to those that are in the PfsCalibrated class
         valid = ['targetId', 'catId', 'tract', 'patch', 'objId', 'targetType']
         params = { k: v for k, v in { **(identity.__dict__), **kwargs }.items() if k in valid }
-        results = PfsCalibrated.readFits(filename, **params)
-        
+
+        # Stream the spectra from the container one target at a time
         return (
             (
-                results[k],
+                s,
                 SimpleNamespace(
-                    **results[k].getIdentity(),
-                    visit = results[k].observations.visit[0],
+                    **s.getIdentity(),
+                    visit = s.observations.visit[0],
                     run = identity.run,
                 )
-            ) for k in results.keys()
+            ) for s in PfsCalibrated.iterFits(filename, **params)
         )
     else:
         raise NotImplementedError()
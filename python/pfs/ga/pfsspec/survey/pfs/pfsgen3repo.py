@@ -1,23 +1,57 @@
+import os
 import re
 from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from collections import defaultdict
 import numpy as np
 
 from ..repo import *
+from .setup_logger import logger
 from .pfsgen3filesystemconfig import PfsGen3FileSystemConfig
+from .fibercatalog import PfsFiberCatalog
+from .skyindex import SkyIndex
 from .datamodel import *
 
 class PfsGen3Repo():
     """
     Wraps a data repository object to implement a PFS specific
     interface for accessing data products.
+
+    PfsConfig files are loaded in parallel and kept in a process-wide cache
+    keyed by path and modification time, so that repeated object searches
+    don't read the same files again. Cached PfsConfig objects are shared and
+    should not be modified.
+
+    When a fiber catalog is configured, objects are looked up in the catalog
+    instead of the PfsConfig files. The catalog is only updated with new visits
+    when it's first created or when a refresh is requested, otherwise searches
+    don't touch the file system.
+
+    Variables
+    ---------
+    fiber_catalog : str
+        Path to the optional HDF5 fiber catalog file.
+    refresh_catalog : bool
+        If True, the fiber catalog is updated before each search.
     """
 
-    def __init__(self, repo_type=ButlerRepo, config=PfsGen3FileSystemConfig):
+    # Default number of threads used to load products
+    DEFAULT_LOAD_THREADS = 8
+
+    # Process-wide cache of loaded PfsConfig objects
+    PFSCONFIG_CACHE = LruCache(maxsize=512)
+
+    def __init__(self, repo_type=ButlerRepo, config=PfsGen3FileSystemConfig, load_threads=None, fiber_catalog=None, refresh_catalog=False):
         # Initizalize the repository
         self.__repo = self.__init_repo(repo_type, config)
         self.__object_filters = self.__init_object_filters()
+        self.__load_threads = load_threads if load_threads is not None else PfsGen3Repo.DEFAULT_LOAD_THREADS
+        self.__fiber_catalog = fiber_catalog
+        self.__refresh_catalog = refresh_catalog
+        self.__catalog = None
+        self.__cone = None
+        self.__box = None
 
     def __init_repo(self, repo_type, config):
         return repo_type(config)
@@ -59,6 +93,47 @@ class PfsGen3Repo():
 
     is_filesystem_repo = property(__get_is_filesystem_repo)
 
+    def __get_load_threads(self):
+        return self.__load_threads
+    
+    def __set_load_threads(self, value):
+        self.__load_threads = value
+
+    load_threads = property(__get_load_threads, __set_load_threads)
+
+    def __get_fiber_catalog(self):
+        return self.__fiber_catalog
+    
+    def __set_fiber_catalog(self, value):
+        self.__fiber_catalog = value
+        self.__catalog = None
+
+    fiber_catalog = property(__get_fiber_catalog, __set_fiber_catalog)
+
+    def __get_refresh_catalog(self):
+        return self.__refresh_catalog
+    
+    def __set_refresh_catalog(self, value):
+        self.__refresh_catalog = value
+
+    refresh_catalog = property(__get_refresh_catalog, __set_refresh_catalog)
+
+    def __get_cone(self):
+        return self.__cone
+    
+    def __set_cone(self, value):
+        self.__cone = value
+
+    cone = property(__get_cone, __set_cone)
+
+    def __get_box(self):
+        return self.__box
+    
+    def __set_box(self, value):
+        self.__box = value
+
+    box = property(__get_box, __set_box)
+
     #endregion
 
     def add_args(self,
@@ -78,10 +153,54 @@ class PfsGen3Repo():
                            nargs='*',
                            help=f'Filter on {k}',
                            ignore_duplicate=ignore_duplicates)
+            
+        script.add_arg('--load-threads',
+                       type=int,
+                       help='Number of threads to load data products with',
+                       ignore_duplicate=ignore_duplicates)
+        
+        script.add_arg('--fiber-catalog',
+                       type=str,
+                       help='Path to the fiber catalog file',
+                       ignore_duplicate=ignore_duplicates)
+        
+        script.add_arg('--refresh-catalog',
+                       action='store_true',
+                       help='Add new PfsConfig files to the fiber catalog before searching',
+                       ignore_duplicate=ignore_duplicates)
+        
+        script.add_arg('--cone',
+                       type=float,
+                       nargs=3,
+                       metavar=('RA', 'DEC', 'RADIUS'),
+                       help='Cone search around RA, DEC within RADIUS, in degrees',
+                       ignore_duplicate=ignore_duplicates)
+        
+        script.add_arg('--box',
+                       type=float,
+                       nargs=4,
+                       metavar=('RA_MIN', 'RA_MAX', 'DEC_MIN', 'DEC_MAX'),
+                       help='Box search within RA and DEC limits, in degrees',
+                       ignore_duplicate=ignore_duplicates)
         
     def init_from_args(self, script):
         self.__repo.init_from_args(script)
 
+        if script.is_arg('load_threads'):
+            self.__load_threads = script.get_arg('load_threads')
+
+        if script.is_arg('fiber_catalog'):
+            self.fiber_catalog = script.get_arg('fiber_catalog')
+
+        if script.is_arg('refresh_catalog'):
+            self.__refresh_catalog = script.get_arg('refresh_catalog')
+
+        if script.is_arg('cone'):
+            self.__cone = tuple(script.get_arg('cone'))
+
+        if script.is_arg('box'):
+            self.__box = tuple(script.get_arg('box'))
+
         for k, p in self.__object_filters.__dict__.items():
             if script.is_arg(k.lower()):
                 p.parse(script.get_arg(k.lower()))
@@ -152,6 +271,10 @@ class PfsGen3Repo():
 
     def load_product(self, *args, **kwargs):
         return self.__repo.load_product(*args, **kwargs)
+    
+    def load_products(self, *args, threads=None, **kwargs):
+        threads = threads if threads is not None else self.__load_threads
+        return self.__repo.load_products(*args, threads=threads, **kwargs)
 
     def save_product(self, *args, **kwargs):
         return self.__repo.save_product(*args, **kwargs)
@@ -159,12 +282,32 @@ class PfsGen3Repo():
     #endregion
     #region Object search
 
-    def find_objects(self, product=PfsConfig, pfs_configs=None, groupby='visit', configrun=None, **kwargs):
+    def find_objects(self, product=PfsConfig, pfs_configs=None, groupby='visit', configrun=None, cone=None, box=None,
+                     refresh_catalog=None, **kwargs):
         
         """
         Find individual objects by looking them up in the config files.
+
+        In addition to the object filters, targets can be selected by sky position
+        with a cone search, `cone=(ra, dec, radius)`, or a box search,
+        `box=(ra_min, ra_max, dec_min, dec_max)`, all in degrees.
+
+        Depending on `groupby`, the results are returned as a dictionary keyed
+        by visit ('visit') or objId ('objid'), as a single namespace of arrays
+        ('none'), or as a single namespace grouped by objId ('objid_offsets')
+        with the fields `objId`, `offset`, `count` and `ids`, where the
+        observations of `objId[i]` are in `ids` at `offset[i]:offset[i] + count[i]`.
+        Objects are listed in the order they first appear in the visits.
+
+        When a fiber catalog is configured, it is only updated from the PfsConfig
+        files if `refresh_catalog` is True, the catalog is empty or some of the
+        individual visits of the query are not in the catalog yet.
         """
 
+        cone = cone if cone is not None else self.__cone
+        box = box if box is not None else self.__box
+        refresh_catalog = refresh_catalog if refresh_catalog is not None else self.__refresh_catalog
+
         # Update the parameters with the values provided in kwargs
 
         repo_filters = deepcopy(self.__repo.filters)
@@ -178,7 +321,22 @@ class PfsGen3Repo():
                 getattr(object_filters, k).values = v
 
         # We either look up objects in PfsConfig files or look for the available PfsSingle files
-        if product is PfsConfig:
+        if product is PfsConfig and pfs_configs is None and self.__fiber_catalog is not None:
+            # Bring the catalog up to date, if requested, and look up the objects in it
+            catalog = self.__get_catalog()
+            if refresh_catalog or len(catalog) == 0:
+                self.update_fiber_catalog(visit=repo_filters.visit, date=repo_filters.date, run=configrun)
+            else:
+                self.__update_missing_visits(repo_filters.visit, date=repo_filters.date, run=configrun)
+            identities = self.__get_catalog().query(
+                visit=repo_filters.visit,
+                date=repo_filters.date,
+                run=StringFilter(configrun, name='run') if configrun is not None else None,
+                object_filters=object_filters,
+                cone=cone,
+                box=box,
+            )
+        elif product is PfsConfig:
             # If not provided, load the config files for each visit
             if pfs_configs is None:
                 pfs_configs = self.load_pfsConfigs(
@@ -199,6 +357,11 @@ class PfsGen3Repo():
                 mask &= object_filters.proposalId.mask(psf_config.proposalId)
                 mask &= object_filters.obCode.mask(psf_config.obCode)
 
+                if cone is not None:
+                    mask &= SkyIndex.cone_mask(psf_config.ra, psf_config.dec, *cone)
+                if box is not None:
+                    mask &= SkyIndex.box_mask(psf_config.ra, psf_config.dec, *box)
+
                 n = mask.sum()
                 if n > 0:
                     identities[visit] = SimpleNamespace(
@@ -227,78 +390,189 @@ class PfsGen3Repo():
             return self.__group_objects_by_visit(identities)
         elif groupby == 'objid':
             return self.__group_objects_by_objid(identities)
+        elif groupby == 'objid_offsets':
+            return self.__group_objects_by_objid_offsets(identities)
         elif groupby == 'none':
             return self.__group_objects_by_none(identities)
         else:
             raise NotImplementedError()
 
-    def load_pfsConfigs(self, visit=None, date=None, run=None):
+    def load_pfsConfigs(self, visit=None, date=None, run=None, threads=None):
         """
         Load all PfsConfig files matching the visit and date filters.
+
+        The files are loaded on a thread pool and cached process-wide, keyed
+        by the path and modification time of the file.
         """
 
         visit = visit if visit is not None else self.__repo.filters.visit
         date = date if date is not None else self.__repo.filters.date
         run = run if run is not None else self.__repo.filters.run
+        threads = threads if threads is not None else self.__load_threads
 
         files, ids = self.find_product(PfsConfig, visit=visit, date=date, run=run)
         configs = {}
-        for file in files:
-            config, id, fn = self.load_product(PfsConfig, filename=file)
-
-            # If the file is missing, and ignore_missing_files is True,
-            # the function silently returns a None, so simply skip it
-            if config is not None:
-                configs[id.visit] = config
+        with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+            for config, id, fn in executor.map(self.__load_pfsConfig, files):
+                # If the file is missing, and ignore_missing_files is True,
+                # the function silently returns a None, so simply skip it
+                if config is not None:
+                    configs[id.visit] = config
 
         return configs
+    
+    def __get_catalog(self):
+        # Lazily open the fiber catalog when it is first used
+        if self.__catalog is None and self.__fiber_catalog is not None:
+            filename = self.__repo.expand_variables(self.__fiber_catalog, self.__repo.variables)
+            filename = self.__repo.expand_variables(filename, os.environ)
+            self.__catalog = PfsFiberCatalog(filename)
+
+        return self.__catalog
+
+    def update_fiber_catalog(self, visit=None, date=None, run=None, threads=None):
+        """
+        Add the PfsConfig files matching the visit, date and run filters to the
+        fiber catalog. Only visits not yet in the catalog from the same run are
+        loaded.
+
+        Returns
+        -------
+        int
+            Number of visits added to the catalog.
+        """
+
+        catalog = self.__get_catalog()
+        if catalog is None:
+            raise ValueError('Fiber catalog is not configured.')
+
+        visit = visit if visit is not None else self.__repo.filters.visit
+        date = date if date is not None else self.__repo.filters.date
+        run = run if run is not None else self.__repo.filters.run
+        threads = threads if threads is not None else self.__load_threads
+
+        files, ids = self.find_product(PfsConfig, visit=visit, date=date, run=run)
+        
+        # Collect the files of the visits not cataloged yet from the same run
+        runs = [ str(r) if r is not None else '' for r in ids.run ] if hasattr(ids, 'run') else len(files) * [ '' ]
+        new = {}
+        for i, v in enumerate(ids.visit):
+            if not catalog.has_visit(v, runs[i]):
+                new[(v, runs[i])] = i
+
+        if len(new) == 0:
+            return 0
+
+        filenames = [ files[i] for i in new.values() ]
+        configs = defaultdict(dict)
+        dates = defaultdict(dict)
+        with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+            for (v, r), i, (config, id, fn) in zip(new.keys(), new.values(), executor.map(self.__load_pfsConfig, filenames)):
+                if config is not None:
+                    configs[r][v] = config
+                    if hasattr(ids, 'date'):
+                        dates[r][v] = ids.date[i]
+
+        # The catalog takes the PfsConfig objects of one run at a time
+        added = 0
+        for r in configs.keys():
+            added += catalog.append(configs[r], dates=dates[r], runs={ v: r for v in configs[r].keys() })
+
+        return added
+
+    def __update_missing_visits(self, visit, date=None, run=None):
+        # Visits of the query that are not in the catalog would silently return no
+        # objects, so add them. Ranges of visits are not checked, only individual values.
+        catalog = self.__get_catalog()
+        visits = [ v for v in visit.values if not isinstance(v, tuple) ] if not visit.is_none else []
+        missing = [ v for v in visits if not catalog.has_visit(v, run) ]
+        if len(missing) == 0:
+            return
+
+        self.update_fiber_catalog(visit=IntFilter(*missing, name='visit', format=visit.format), date=date, run=run)
+
+        missing = [ v for v in missing if not catalog.has_visit(v, run) ]
+        if len(missing) > 0:
+            logger.warning(f'Visits {missing} are not in the fiber catalog and no PfsConfig files were found for them.')
+
+    def __load_pfsConfig(self, filename):
+        # Look up the file in the cache first, files that cannot be stat'ed,
+        # such as remote URIs, are not cached
+        try:
+            key = (os.path.abspath(filename), os.stat(filename).st_mtime_ns)
+        except OSError:
+            key = None
+
+        if key is not None:
+            res = PfsGen3Repo.PFSCONFIG_CACHE.get(key)
+            if res is not None:
+                return res
+
+        # The file name is known so there's no need to locate the file again
+        res = self.load_product(PfsConfig, filename=filename, skip_locate=True)
+
+        if key is not None and res[0] is not None:
+            PfsGen3Repo.PFSCONFIG_CACHE.set(key, res)
+
+        return res
 
     def __group_objects_by_visit(self, identities):
         return identities
 
-    def __group_objects_by_objid(self, identities):
-        results = {}
-        for visit, ids in identities.items():
-            for i in range(len(ids.fiberId)):
-                objid = ids.objId[i]
-
-                # Exclude engineering fibers
-                if objid != -1:
-                    id = SimpleNamespace(
-                        visit = [visit],
-                        pfsDesignId = [ids.pfsDesignId[i]],
-                        obstime = [ids.obstime[i]],
-                        exptime = [ids.exptime[i]],
-                        fiberId = [ids.fiberId[i]],
-                        spectrograph = [ids.spectrograph[i]],
-                        arms = [ids.arms[i]],
-                        fiberStatus = [ids.fiberStatus[i]],
-                        proposalId = [ids.proposalId[i]],
-                        catId = [ids.catId[i]],
-                        objId = [ids.objId[i]],
-                        tract = [ids.tract[i]],
-                        patch = [ids.patch[i]],
-                        targetType = [ids.targetType[i]],
-                        obCode = [ids.obCode[i]],
-                        ra = [ids.ra[i]],
-                        dec = [ids.dec[i]]
-                    )
+    def __sort_objects_by_objid(self, identities):
+        # Concatenate all visits and group the fibers by objId. Objects are ordered
+        # by their first appearance and the sort is stable so observations of the
+        # same object remain in the order of the visits.
+        if len(identities) == 0:
+            return None, None, None, None
+        
+        ids = self.__group_objects_by_none(identities)
 
-                    if objid not in results:
-                        results[objid] = id
-                    else:
-                        # Merge lists
-                        r = results[objid]
-                        for k, v in id.__dict__.items():
-                            getattr(r, k).extend(v)
+        # Exclude engineering fibers
+        idx = np.nonzero(ids.objId != -1)[0]
+        objids, first, inverse, count = np.unique(ids.objId[idx], return_index=True, return_inverse=True, return_counts=True)
 
-        # Convert lists to numpy arrays
-        for objid, ids in results.items():
-            for k, v in ids.__dict__.items():
-                setattr(ids, k, np.array(v))
+        # Rank the objects by their first appearance and sort the fibers by rank
+        order = np.argsort(first, kind='stable')
+        rank = np.empty_like(order)
+        rank[order] = np.arange(order.size)
+        idx = idx[np.argsort(rank[inverse.ravel()], kind='stable')]
+
+        objids = objids[order]
+        count = count[order]
+        start = np.cumsum(count) - count
+
+        return ids, idx, objids, np.stack([start, count], axis=-1)
+
+    def __group_objects_by_objid(self, identities):
+        ids, idx, objids, slices = self.__sort_objects_by_objid(identities)
+        if ids is None:
+            return {}
+
+        results = {}
+        for objid, (s, n) in zip(objids.tolist(), slices.tolist()):
+            ix = idx[s:s + n]
+            results[objid] = SimpleNamespace(**{ k: v[ix] for k, v in ids.__dict__.items() })
 
         return results
     
+    def __group_objects_by_objid_offsets(self, identities):
+        # Return a single structure grouped by objId, in the order the objects first
+        # appear, with the offsets of the groups instead of a namespace for each object
+        ids, idx, objids, slices = self.__sort_objects_by_objid(identities)
+        if ids is None:
+            return SimpleNamespace(objId=np.zeros(0, dtype=np.int64),
+                                   offset=np.zeros(0, dtype=int),
+                                   count=np.zeros(0, dtype=int),
+                                   ids=SimpleNamespace())
+
+        return SimpleNamespace(
+            objId = objids,
+            offset = slices[:, 0],
+            count = slices[:, 1],
+            ids = SimpleNamespace(**{ k: v[idx] for k, v in ids.__dict__.items() })
+        )
+    
     def __group_objects_by_none(self, identities):
         # Concatenate everything into a single namespace
         results = defaultdict(list)
@@ -0,0 +1,130 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+class SkyIndex():
+    """
+    Implements a spatial index over sky positions for cone and box searches.
+
+    Positions are converted to unit vectors and stored in a k-d tree so that
+    a cone search becomes a search for points within the chord length that
+    corresponds to the angular radius. All coordinates are in degrees.
+
+    Variables
+    ---------
+    ra : array
+        Right ascension of the indexed positions.
+    dec : array
+        Declination of the indexed positions.
+    """
+
+    def __init__(self, ra, dec):
+        self.__ra = np.asarray(ra, dtype=float)
+        self.__dec = np.asarray(dec, dtype=float)
+
+        # Positions without valid coordinates are not indexed
+        self.__valid = np.nonzero(np.isfinite(self.__ra) & np.isfinite(self.__dec))[0]
+        self.__tree = cKDTree(SkyIndex.to_unit_vectors(self.__ra[self.__valid], self.__dec[self.__valid]))
+
+    #region Properties
+
+    def __get_ra(self):
+        return self.__ra
+
+    ra = property(__get_ra)
+
+    def __get_dec(self):
+        return self.__dec
+
+    dec = property(__get_dec)
+
+    #endregion
+
+    def __len__(self):
+        return self.__ra.shape[0]
+
+    @staticmethod
+    def to_unit_vectors(ra, dec):
+        ra = np.radians(np.asarray(ra, dtype=float))
+        dec = np.radians(np.asarray(dec, dtype=float))
+        cos_dec = np.cos(dec)
+        return np.stack([ cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec) ], axis=-1)
+
+    @staticmethod
+    def cone_mask(ra, dec, ra0, dec0, radius):
+        """
+        Return a boolean mask with True where the positions are within `radius`
+        of the center (`ra0`, `dec0`). Use this on small arrays where building a
+        tree is not worth it.
+        """
+
+        xyz = SkyIndex.to_unit_vectors(ra, dec)
+        xyz0 = SkyIndex.to_unit_vectors(ra0, dec0)
+        return np.dot(xyz, xyz0) >= np.cos(np.radians(radius))
+
+    @staticmethod
+    def box_mask(ra, dec, ra_min, ra_max, dec_min, dec_max):
+        """
+        Return a boolean mask with True where the positions are within the box.
+        If `ra_min` is greater than `ra_max`, the box wraps around RA = 0.
+        """
+
+        ra = np.mod(np.asarray(ra, dtype=float), 360.0)
+        dec = np.asarray(dec, dtype=float)
+        ra_min, ra_max = ra_min % 360.0, ra_max % 360.0
+
+        if ra_min <= ra_max:
+            mask = (ra >= ra_min) & (ra <= ra_max)
+        else:
+            mask = (ra >= ra_min) | (ra <= ra_max)
+
+        return mask & (dec >= dec_min) & (dec <= dec_max)
+
+    def query_cone(self, ra, dec, radius):
+        """
+        Return the sorted indices of the positions within `radius` of the center.
+        """
+
+        # Convert the angular radius to the chord length between unit vectors
+        chord = 2.0 * np.sin(np.radians(min(radius, 180.0)) / 2.0)
+        idx = self.__tree.query_ball_point(SkyIndex.to_unit_vectors(ra, dec), chord)
+        return np.sort(self.__valid[np.asarray(idx, dtype=int)])
+
+    def query_box(self, ra_min, ra_max, dec_min, dec_max):
+        """
+        Return the sorted indices of the positions within the box.
+        """
+
+        # Narrow down the candidates with the bounding cone of the box when the
+        # box is small, otherwise evaluate the mask over all positions
+        dra = (ra_max - ra_min) % 360.0
+        if dra < 90 and dec_max - dec_min < 90:
+            ra0 = (ra_min + dra / 2.0) % 360.0
+            dec0 = (dec_min + dec_max) / 2.0
+            corners = SkyIndex.to_unit_vectors([ ra_min, ra_min, ra_max, ra_max, ra0, ra0 ],
+                                               [ dec_min, dec_max, dec_min, dec_max, dec_min, dec_max ])
+            center = SkyIndex.to_unit_vectors(ra0, dec0)
+            radius = np.degrees(np.arccos(np.clip(np.min(np.dot(corners, center)), -1, 1)))
+            idx = self.query_cone(ra0, dec0, radius + 1e-6)
+        else:
+            idx = self.__valid
+
+        mask = SkyIndex.box_mask(self.__ra[idx], self.__dec[idx], ra_min, ra_max, dec_min, dec_max)
+        return idx[mask]
+
+    def cone(self, ra, dec, radius):
+        """
+        Return a boolean mask over the indexed positions for a cone search.
+        """
+
+        mask = np.full(self.__ra.shape, False)
+        mask[self.query_cone(ra, dec, radius)] = True
+        return mask
+
+    def box(self, ra_min, ra_max, dec_min, dec_max):
+        """
+        Return a boolean mask over the indexed positions for a box search.
+        """
+
+        mask = np.full(self.__ra.shape, False)
+        mask[self.query_box(ra_min, ra_max, dec_min, dec_max)] = True
+        return mask
@@ -1,3 +1,4 @@
+from .searchfilter import SearchFilter
 from .intfilter import IntFilter
 from .enumfilter import EnumFilter
 from .hexfilter import HexFilter
@@ -5,6 +6,9 @@ from .stringfilter import StringFilter
 from .datefilter import DateFilter
 from .timefilter import TimeFilter
 
+from .lrucache import LruCache
+from .fileindex import FileIndex
+
 from .repo import Repo
 from .filesystemrepo import FileSystemRepo
 from .butlerrepo import ButlerRepo
\ No newline at end of file
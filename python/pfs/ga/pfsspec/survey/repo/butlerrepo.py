@@ -15,15 +15,38 @@ from .intfilter import IntFilter
 from .hexfilter import HexFilter
 from .datefilter import DateFilter
 from .stringfilter import StringFilter
+from .lrucache import LruCache
 
 class ButlerRepo(Repo):
+    """
+    Implements a data repository backed by the LSST Butler.
+
+    Dataset URIs are resolved in bulk and cached per collection, keyed by the
+    dataset id, so repeated queries don't have to go to the datastore again.
+
+    Variables
+    ---------
+    uri_cache_size : int
+        Maximum number of cached dataset URIs. Set to 0 to disable caching.
+    """
+
+    # Default number of cached dataset URIs
+    URI_CACHE_SIZE = 100000
+
     def __init__(self,
                  config=None,
+                 uri_cache_size=None,
                  orig=None):
     
         super().__init__(config=config, orig=orig)
 
+        if not isinstance(orig, ButlerRepo):
+            uri_cache_size = uri_cache_size if uri_cache_size is not None else ButlerRepo.URI_CACHE_SIZE
+        else:
+            uri_cache_size = uri_cache_size if uri_cache_size is not None else orig.__uri_cache.maxsize
+
         self.__butler = None
+        self.__uri_cache = LruCache(maxsize=uri_cache_size)
         
     #region Properties
 
@@ -47,8 +70,53 @@ class ButlerRepo(Repo):
 
     is_filesystem_repo = property(__get_is_filesystem_repo)
 
+    def __get_uri_cache_size(self):
+        return self.__uri_cache.maxsize
+    
+    def __set_uri_cache_size(self, value):
+        self.__uri_cache.maxsize = value
+
+    uri_cache_size = property(__get_uri_cache_size, __set_uri_cache_size)
+
     #endregion
 
+    def __get_uri_filename(self, uri):
+        if uri.scheme == 'file':
+            return uri.ospath
+        else:
+            return str(uri)
+
+    def __get_filenames(self, datasetRefs):
+        """
+        Resolves the file names of a list of dataset references. Cached names are
+        looked up first and the rest are resolved with a single call to the datastore.
+        """
+
+        collections = self.get_resolved_variable('butlercollections')
+        keys = [ (collections, dsref.id) for dsref in datasetRefs ]
+
+        filenames = [ self.__uri_cache.get(key) for key in keys ] if self.__uri_cache.maxsize != 0 else len(keys) * [ None ]
+        missing = [ i for i, f in enumerate(filenames) if f is None ]
+
+        if len(missing) > 0:
+            refs = [ datasetRefs[i] for i in missing ]
+
+            # Use the batched API of the Butler, if available, and fall back to
+            # resolving the URIs one by one
+            get_many_uris = getattr(self.butler, 'get_many_uris', None)
+            if get_many_uris is not None:
+                uris = get_many_uris(refs)
+                uris = [ uris[dsref].primaryURI for dsref in refs ]
+            else:
+                uris = [ self.butler.getURI(dsref) for dsref in refs ]
+
+            for i, uri in zip(missing, uris):
+                filenames[i] = self.__get_uri_filename(uri)
+                if self.__uri_cache.maxsize != 0:
+                    self.__uri_cache.set(keys[i], filenames[i])
+
+        return filenames
+
     def __find_datasets(self, product, params_regex, params, param_values, variables):
 
         product_name = self.config.products[product].name
@@ -91,28 +159,30 @@ class ButlerRepo(Repo):
             datasetRefs = []
 
         # Convert Butler datasets into file paths and identities
-        filenames = []
+        datasetRefs = list(datasetRefs)
+        filenames = self.__get_filenames(datasetRefs)
+
+        # Take the identities from the data ids of the datasets and only
+        # parse the file names when a parameter is not part of the data id.
+        # The run in the file name differs from the Butler run collection of
+        # the dataset, so it is parsed from the first file of each collection
+        # and reused for the rest.
+        runs = {}
         identities = { p: [] for p in params }
-        for dsref in datasetRefs:
-            # Get the file path
-            uri = self.butler.getURI(dsref)
-            if uri.scheme == 'file':
-                filename = uri.ospath
-            else:
-                filename = str(uri)
-
-            filenames.append(filename)
-
-            # Parse the identity from the file name
-            identity = self.parse_product_identity(product, filename, required=False)
-
+        for dsref, filename in zip(datasetRefs, filenames):
+            identity = None
             for p in params:
-                if p in dsref.dataId:
+                if p == 'run' and dsref.run in runs:
+                    identities[p].append(runs[dsref.run])
+                elif p != 'run' and p in dsref.dataId:
                     identities[p].append(dsref.dataId[p])
-                elif hasattr(identity, p):
-                    identities[p].append(getattr(identity, p))
                 else:
-                    identities[p].append(None)                    
+                    if identity is None:
+                        identity = self.parse_product_identity(product, filename, required=False)
+                    value = getattr(identity, p, None)
+                    if p == 'run' and value is not None:
+                        runs[dsref.run] = value
+                    identities[p].append(value)
 
         identities = SimpleNamespace(**identities)
 
@@ -1,5 +1,6 @@
 from .searchfilter import SearchFilter
-from datetime import date
+from datetime import date, timedelta
+import numpy as np
 import dateutil.parser as dateparser
 
 class DateFilter(SearchFilter):
@@ -55,6 +56,13 @@ class DateFilter(SearchFilter):
                     # Single date
                     self._values.append(self._parse_value(a))
 
+    def _get_mask_array(self, values):
+        # Compare dates as datetime64 to avoid comparing arrays of date objects
+        return np.asarray(values, dtype='datetime64[D]')
+
+    def _get_mask_value(self, value):
+        return np.datetime64(value, 'D')
+
     def get_glob_pattern(self):
         """
         Return a glob pattern that matches all dates in the filter.
@@ -68,4 +76,12 @@ class DateFilter(SearchFilter):
             for key, value in DateFilter.FORMAT_GLOB_PATTERNS.items():
                 glob_pattern = glob_pattern.replace(key, value)
 
-            return glob_pattern
\ No newline at end of file
+            return glob_pattern
+
+    def _get_range_glob_patterns(self, start, end, max_count):
+        # Enumerate the days within the range
+        days = (end - start).days + 1
+        if days <= max_count:
+            return [ self.format.format(start + timedelta(days=i)) for i in range(max(days, 0)) ]
+        else:
+            return None
\ No newline at end of file
@@ -1,4 +1,5 @@
 from enum import IntEnum
+import numpy as np
 
 from .searchfilter import SearchFilter
 
@@ -8,16 +9,31 @@ class EnumFilter(SearchFilter):
     ranges of enum values.
     """
 
-    def __init__(self, *values, enum_type=IntEnum, name=None, format=None, orig=None):
+    def __init__(self, *values, enum_type=None, name=None, format=None, orig=None):
         super().__init__(*values, name=name, format=format, orig=orig)
 
         if not isinstance(orig, EnumFilter):
-            self.__enum_type = enum_type
+            self.__enum_type = enum_type if enum_type is not None else IntEnum
         else:
             self.__enum_type = enum_type if enum_type is not None else orig.enum_type
 
+    def __get_enum_type(self):
+        return self.__enum_type
+
+    enum_type = property(__get_enum_type)
+
     def _parse_value(self, value):
         try:
             return int(value)
         except ValueError:
-            return getattr(self.__enum_type, value)
\ No newline at end of file
+            return getattr(self.__enum_type, value)
+
+    def _get_mask_array(self, values):
+        # Enum members are compared by their integer values
+        values = np.asarray(values)
+        if values.dtype == object:
+            values = values.astype(int)
+        return values
+
+    def _get_mask_value(self, value):
+        return int(value)
\ No newline at end of file
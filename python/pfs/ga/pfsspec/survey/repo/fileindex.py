@@ -0,0 +1,399 @@
+import os
+import re
+import sqlite3
+import hashlib
+import threading
+from fnmatch import fnmatchcase
+from numbers import Integral, Real
+from datetime import date, datetime
+from enum import Enum
+from types import SimpleNamespace
+
+from ..setup_logger import logger
+
+from .stringfilter import StringFilter
+from .datefilter import DateFilter
+from .timefilter import TimeFilter
+from .enumfilter import EnumFilter
+
+class FileIndex():
+    """
+    Implements a persistent index of data product files stored in an SQLite database.
+
+    The index stores the path of each file along with the identity parsed from the
+    file name with the regular expressions of the product configuration. The index is
+    built when a product is first queried and refreshed incrementally afterwards:
+    directories are only listed again when their modification time changes, and file
+    names are only parsed again when they are new. Queries are then answered with
+    indexed lookups in the database instead of glob and regex matching.
+
+    Variables
+    ---------
+    filename : str
+        Path to the SQLite database file.
+    """
+
+    __magic_regex = re.compile(r'[*?[]')
+
+    def __init__(self, filename):
+        self.__filename = filename
+        self.__conn = None
+        self.__lock = threading.RLock()
+        self.__tables = set()
+
+    def __del__(self):
+        self.close()
+
+    #region Properties
+
+    def __get_filename(self):
+        return self.__filename
+
+    filename = property(__get_filename)
+
+    #endregion
+    #region Database
+
+    def __get_connection(self):
+        if self.__conn is None:
+            dir = os.path.dirname(self.__filename)
+            if dir != '' and not os.path.exists(dir):
+                os.makedirs(dir, exist_ok=True)
+
+            logger.debug(f'Opening file index database `{self.__filename}`.')
+            self.__conn = sqlite3.connect(self.__filename, timeout=60, check_same_thread=False)
+            self.__conn.execute('PRAGMA journal_mode=WAL')
+            self.__conn.execute(
+                'CREATE TABLE IF NOT EXISTS dirs ('
+                'tbl TEXT NOT NULL, path TEXT NOT NULL, mtime INTEGER NOT NULL, entries TEXT NOT NULL, '
+                'PRIMARY KEY (tbl, path))')
+            self.__conn.commit()
+
+        return self.__conn
+
+    def close(self):
+        """
+        Closes the database connection. It is reopened automatically on next use.
+        """
+
+        with self.__lock:
+            if self.__conn is not None:
+                self.__conn.close()
+                self.__conn = None
+                self.__tables = set()
+
+    def get_table_name(self, name, params_regex):
+        """
+        Returns the name of the table that stores the files of a product. Products
+        are distinguished by their name and the regular expressions used to parse
+        the file names.
+        """
+
+        h = hashlib.sha1()
+        for regex in params_regex:
+            h.update(getattr(regex, 'pattern', regex).encode('utf-8'))
+        name = re.sub(r'\W', '_', name)
+        return f'files_{name}_{h.hexdigest()[:8]}'
+
+    def __ensure_table(self, conn, table, params):
+        if table not in self.__tables:
+            cols = ''.join(f', "{k}"' for k in params.keys())
+            conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (path TEXT PRIMARY KEY, dir TEXT NOT NULL{cols})')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "{table}_dir" ON "{table}" (dir)')
+            for k in params.keys():
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "{table}_{k}" ON "{table}" ("{k}")')
+            self.__tables.add(table)
+
+    #endregion
+    #region Value conversion
+
+    def _encode_value(self, param, value):
+        """
+        Converts a parameter value into a type that can be stored in and compared by SQLite.
+        Dates and times are stored as ISO strings which sort correctly.
+        """
+
+        if value is None:
+            return None
+        elif isinstance(value, str) and not isinstance(param, StringFilter):
+            value = param.parse_value(value)
+
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        elif isinstance(value, Enum):
+            return int(value.value)
+        elif isinstance(value, Integral):
+            return int(value)
+        elif isinstance(value, Real):
+            return float(value)
+        else:
+            return str(value)
+
+    def _decode_value(self, param, value):
+        """
+        Converts a value stored in the database back to the type returned by the filter.
+        """
+
+        if value is None:
+            return None
+        elif isinstance(param, TimeFilter):
+            return datetime.fromisoformat(value)
+        elif isinstance(param, DateFilter):
+            return date.fromisoformat(value)
+        elif isinstance(param, EnumFilter) and isinstance(value, Integral):
+            # Enums are stored by their integer value
+            try:
+                return param.enum_type(value)
+            except ValueError:
+                return value
+        elif isinstance(value, str):
+            return param.parse_value(value)
+        else:
+            return value
+
+    def __get_glob_expression(self, pattern):
+        # SQLite GLOB uses [^...] instead of [!...] for negated character classes
+        return pattern.replace('[!', '[^')
+
+    def __get_where_clause(self, params):
+        where = []
+        args = []
+        for k, p in params.items():
+            if p.is_none:
+                continue
+
+            ww = []
+            for v in p.values:
+                if isinstance(v, tuple):
+                    ww.append(f'("{k}" >= ? AND "{k}" <= ?)')
+                    args += [ self._encode_value(p, v[0]), self._encode_value(p, v[1]) ]
+                elif isinstance(p, StringFilter):
+                    ww.append(f'"{k}" GLOB ?')
+                    args.append(self.__get_glob_expression(str(v)))
+                else:
+                    ww.append(f'"{k}" = ?')
+                    args.append(self._encode_value(p, v))
+
+            # Parameters that are not part of the file name are stored as NULL and
+            # they always match the filter, just like when matching file names directly.
+            where.append(f'("{k}" IS NULL OR ' + ' OR '.join(ww) + ')')
+
+        return where, args
+
+    #endregion
+    #region File system traversal
+
+    def __split_pattern(self, pattern):
+        """
+        Splits a glob pattern into a root directory without wildcards and the
+        list of the remaining path components.
+        """
+
+        parts = pattern.split(os.sep)
+        i = 0
+        while i < len(parts) - 1 and FileIndex.__magic_regex.search(parts[i]) is None:
+            i += 1
+
+        root = os.sep.join(parts[:i])
+        if root == '' and pattern.startswith(os.sep):
+            root = os.sep
+
+        return root, parts[i:]
+
+    def __list_dir(self, conn, table, dir, changed):
+        """
+        Returns the entries of a directory with a trailing separator for subdirectories.
+        The listing is taken from the index when the modification time of the directory
+        hasn't changed since it was last listed.
+        """
+
+        try:
+            mtime = os.stat(dir).st_mtime_ns
+        except FileNotFoundError:
+            self.__remove_dir(conn, table, dir)
+            return None
+
+        row = conn.execute('SELECT mtime, entries FROM dirs WHERE tbl = ? AND path = ?', (table, dir)).fetchone()
+        if row is not None:
+            old_entries = row[1].split('\n') if row[1] != '' else []
+            if row[0] == mtime:
+                return old_entries
+        else:
+            old_entries = None
+
+        entries = []
+        with os.scandir(dir) as it:
+            for e in it:
+                try:
+                    entries.append(e.name + os.sep if e.is_dir() else e.name)
+                except OSError:
+                    pass
+
+        # Drop the index entries of subdirectories that have disappeared
+        if old_entries is not None:
+            removed = set(e for e in old_entries if e.endswith(os.sep)) - set(e for e in entries if e.endswith(os.sep))
+            for e in removed:
+                self.__remove_dir(conn, table, self.__join(dir, e[:-1]))
+
+        conn.execute('INSERT OR REPLACE INTO dirs (tbl, path, mtime, entries) VALUES (?, ?, ?, ?)',
+                     (table, dir, mtime, '\n'.join(entries)))
+        changed.add(dir)
+
+        return entries
+
+    def __join(self, dir, name):
+        # Do not prefix relative paths with ./ to return the same paths as glob
+        return name if dir == os.curdir else os.path.join(dir, name)
+
+    def __remove_dir(self, conn, table, dir):
+        prefix = dir.rstrip(os.sep) + os.sep
+        conn.execute('DELETE FROM dirs WHERE tbl = ? AND (path = ? OR substr(path, 1, ?) = ?)',
+                     (table, dir, len(prefix), prefix))
+        conn.execute(f'DELETE FROM "{table}" WHERE dir = ? OR substr(dir, 1, ?) = ?',
+                     (dir, len(prefix), prefix))
+
+    def __match_entry(self, name, pattern):
+        # Like glob, do not match hidden files with wildcards
+        if name.startswith('.') and not pattern.startswith('.'):
+            return False
+        return fnmatchcase(name, pattern)
+
+    def __match_path(self, path, patterns):
+        # SQLite GLOB lets * match the path separator, so match the path
+        # component by component, like glob does
+        parts = path.split(os.sep)
+        for pattern in patterns:
+            pp = pattern.split(os.sep)
+            if len(pp) == len(parts) and all(p == q or self.__match_entry(q, p) for p, q in zip(pp, parts)):
+                return True
+        return False
+
+    def __walk(self, conn, table, dir, parts, changed, leaves):
+        entries = self.__list_dir(conn, table, dir, changed)
+        if entries is None:
+            return
+
+        if len(parts) == 1:
+            # Index all files of the directory, not only those matching the current pattern,
+            # because the directory won't be listed again until it changes
+            leaves.append((dir, [ e for e in entries if not e.endswith(os.sep) ]))
+        else:
+            for e in entries:
+                if e.endswith(os.sep) and self.__match_entry(e[:-1], parts[0]):
+                    self.__walk(conn, table, self.__join(dir, e[:-1]), parts[1:], changed, leaves)
+
+    def __parse_identity(self, path, params, params_regex):
+        for regex in params_regex:
+            match = re.search(regex, path)
+            if match is not None:
+                groups = match.groupdict()
+                return { k: p.parse_value(groups[k]) if k in groups else None for k, p in params.items() }
+        return None
+
+    def refresh(self, table, glob_pattern, params, params_regex):
+        """
+        Updates the index for all files matching the glob pattern. Only directories
+        with a changed modification time are listed and only new files are parsed.
+
+        Arguments
+        ---------
+        table : str
+            Name of the table that stores the files of the product.
+        glob_pattern : str
+            Glob pattern to match the files.
+        params : dict
+            Dictionary of parameter filters, as defined in the product configuration.
+        params_regex : list
+            Regular expressions to parse the parameters from the file names.
+        """
+
+        root, parts = self.__split_pattern(glob_pattern)
+
+        with self.__lock:
+            conn = self.__get_connection()
+            with conn:
+                self.__ensure_table(conn, table, params)
+
+                changed = set()
+                leaves = []
+                if root == '' or os.path.isdir(root):
+                    self.__walk(conn, table, root if root != '' else os.curdir, parts, changed, leaves)
+
+                # Update the files in the directories that have changed
+                cols = list(params.keys())
+                insert = f'INSERT OR REPLACE INTO "{table}" (path, dir' + ''.join(f', "{k}"' for k in cols) + \
+                         ') VALUES (?, ?' + ', ?' * len(cols) + ')'
+                added = 0
+                for dir, files in leaves:
+                    if dir not in changed:
+                        continue
+
+                    existing = set(r[0] for r in conn.execute(f'SELECT path FROM "{table}" WHERE dir = ?', (dir,)))
+                    paths = set(self.__join(dir, f) for f in files)
+                    for path in existing - paths:
+                        conn.execute(f'DELETE FROM "{table}" WHERE path = ?', (path,))
+                    for path in paths - existing:
+                        values = self.__parse_identity(path, params, params_regex)
+                        if values is not None:
+                            conn.execute(insert, (path, dir, *[ self._encode_value(params[k], values[k]) for k in cols ]))
+                            added += 1
+
+                logger.debug(f'Refreshed file index `{table}`, listed {len(changed)} directories, added {added} files.')
+
+    #endregion
+    #region Queries
+
+    def query(self, table, glob_pattern, params):
+        """
+        Returns the files and identities from the index that match the glob pattern and the filters.
+
+        Arguments
+        ---------
+        table : str
+            Name of the table that stores the files of the product.
+        glob_pattern : str or list of str
+            Glob pattern or patterns to match the files.
+        params : dict
+            Dictionary of parameter filters with the values to match.
+
+        Returns
+        -------
+        list of str
+            List of paths to the files that match the query.
+        SimpleNamespace
+            List of identifiers that match the query.
+        """
+
+        patterns = [ glob_pattern ] if isinstance(glob_pattern, str) else list(glob_pattern)
+
+        where, args = self.__get_where_clause(params)
+        where.insert(0, '(' + ' OR '.join('path GLOB ?' for _ in patterns) + ')')
+        args = [ self.__get_glob_expression(p) for p in patterns ] + args
+
+        cols = list(params.keys())
+        sql = 'SELECT path' + ''.join(f', "{k}"' for k in cols) + f' FROM "{table}" WHERE ' + ' AND '.join(where) + ' ORDER BY path'
+
+        with self.__lock:
+            conn = self.__get_connection()
+            self.__ensure_table(conn, table, params)
+            rows = conn.execute(sql, args).fetchall()
+
+        rows = [ r for r in rows if self.__match_path(r[0], patterns) ]
+        filenames = [ r[0] for r in rows ]
+        ids = { k: [ self._decode_value(params[k], r[i + 1]) for r in rows ] for i, k in enumerate(cols) }
+
+        return filenames, SimpleNamespace(**ids)
+
+    def find(self, table, glob_pattern, params, params_regex):
+        """
+        Refreshes the index for the glob pattern and returns the matching files.
+        See `refresh` and `query` for the arguments.
+        """
+
+        patterns = [ glob_pattern ] if isinstance(glob_pattern, str) else list(glob_pattern)
+        for p in patterns:
+            self.refresh(table, p, params, params_regex)
+
+        return self.query(table, patterns, params)
+
+    #endregion
@@ -1,6 +1,9 @@
 import os
 import re
 from glob import glob
+from string import Formatter
+import itertools
+from math import prod
 from types import SimpleNamespace
 from collections.abc import Iterable
 
@@ -12,6 +15,7 @@ from .intfilter import IntFilter
 from .hexfilter import HexFilter
 from .datefilter import DateFilter
 from .stringfilter import StringFilter
+from .fileindex import FileIndex
 
 class FileSystemRepo(Repo):
     """
@@ -33,14 +37,29 @@ class FileSystemRepo(Repo):
     filters : dict
         Namespace of all parameters filter that appear in the config and can be
         used to filter the products.
+    file_index : str
+        Path to an optional persistent file index. When set, files are looked up
+        in the index which is refreshed incrementally instead of globbing the
+        file system on every query. Variables are expanded in the path.
     """
 
+    # Maximum number of glob patterns a query is expanded into
+    MAX_GLOB_PATTERNS = 64
+
     def __init__(self,
                  config=None,
+                 file_index=None,
                  orig=None):
         
         super().__init__(config=config, orig=orig)
 
+        if not isinstance(orig, FileSystemRepo):
+            self.__file_index = file_index
+        else:
+            self.__file_index = file_index if file_index is not None else orig.__file_index
+
+        self.__index = None
+
     #region Properties
 
     def __get_is_filesystem_repo(self):
@@ -48,10 +67,89 @@ class FileSystemRepo(Repo):
 
     is_filesystem_repo = property(__get_is_filesystem_repo)
 
+    def __get_file_index(self):
+        return self.__file_index
+    
+    def __set_file_index(self, value):
+        self.__file_index = value
+        if self.__index is not None:
+            self.__index.close()
+            self.__index = None
+
+    file_index = property(__get_file_index, __set_file_index)
+
+    #endregion
+    #region Command-line arguments
+
+    def add_args(self, script, include_variables=True, include_filters=True, ignore_duplicates=False):
+        super().add_args(script,
+                         include_variables=include_variables,
+                         include_filters=include_filters,
+                         ignore_duplicates=ignore_duplicates)
+        
+        script.add_arg('--file-index', type=str, default=None,
+                       help='Path to the persistent file index database.',
+                       ignore_duplicate=ignore_duplicates)
+
+    def init_from_args(self, script):
+        super().init_from_args(script)
+
+        if script.is_arg('file_index'):
+            self.file_index = script.get_arg('file_index')
+
     #endregion
     #region Utility functions
 
+    def __get_index(self):
+        # Lazily open the file index when it is first used
+        if self.__index is None and self.__file_index is not None:
+            filename = self.expand_variables(self.__file_index, self.variables)
+            filename = self.expand_variables(filename, os.environ)
+            self.__index = FileIndex(filename)
+
+        return self.__index
+
+    def __get_glob_patterns(self, patterns: list, params: dict):
+        """
+        Compose the list of glob patterns from the directory and file name pattern
+        template strings and the glob patterns of the filters. Filters with multiple
+        values or short ranges are expanded into several patterns to limit the
+        directories that need to be traversed. When the combined number of patterns
+        is too large, the filters with the most patterns are replaced with wildcards.
+        """
+
+        # Find the parameters that are referenced in the pattern templates
+        fields = set()
+        for p in patterns:
+            for _, field, _, _ in Formatter().parse(p):
+                if field is not None:
+                    fields.add(field[:-1] if field.endswith('_') else field)
+
+        parts = { k: p.get_glob_patterns() for k, p in params.items() if k in fields }
+
+        # Fall back to wildcards when the number of combinations is too large
+        while len(parts) > 0 and prod(len(v) for v in parts.values()) > FileSystemRepo.MAX_GLOB_PATTERNS:
+            k = max(parts, key=lambda k: len(parts[k]))
+            parts[k] = [ params[k].get_glob_pattern() ]
+
+        glob_patterns = []
+        for values in itertools.product(*parts.values()):
+            glob_pattern_parts = {}
+            for k, v in zip(parts.keys(), values):
+                glob_pattern_parts[k] = v
+                glob_pattern_parts[f'{k}_'] = v.replace('/', '_')
+
+            for k, p in params.items():
+                if k not in glob_pattern_parts:
+                    glob_pattern_parts[k] = p.get_glob_pattern()
+                    glob_pattern_parts[f'{k}_'] = p.get_glob_pattern().replace('/', '_')
+
+            glob_patterns.append(os.path.join(*[ p.format(**glob_pattern_parts) for p in patterns ]))
+
+        return list(dict.fromkeys(glob_patterns))
+
     def __find_files_and_match_params(self,
+                                      name: str,
                                       patterns: list,
                                       params: SimpleNamespace,
                                       param_values: dict,
@@ -65,6 +163,8 @@ class FileSystemRepo(Repo):
 
         Arguments
         ---------
+        name : str
+            Name of the product.
         patterns : str
             List of directory name glob pattern template strings.
         params : SimpleNamespace
@@ -117,19 +217,28 @@ class FileSystemRepo(Repo):
             p = self.expand_variables(p, os.environ)
             patts.append(p)
 
-        # Evaluate the glob pattern for each filter parameter
-        glob_pattern_parts = {}
-        for k, p in params.items():
-            glob_pattern_parts[k] = p.get_glob_pattern()
-            glob_pattern_parts[f'{k}_'] = p.get_glob_pattern().replace('/', '_')
+        # Evaluate the glob patterns for each filter parameter and compose
+        # the full glob patterns
+        glob_patterns = self.__get_glob_patterns(patts, params)
 
-        # Compose the full glob pattern
-        glob_pattern = os.path.join(*[ p.format(**glob_pattern_parts) for p in patts ])
+        # If the persistent index is enabled, look up the files in the index
+        index = self.__get_index()
+        if index is not None:
+            logger.debug(f'Finding files in the file index using patterns: `{glob_patterns}`.')
+            table = index.get_table_name(name, params_regex)
+            filenames, ids = index.find(table, glob_patterns, params, params_regex)
+            logger.debug(f'Found {len(filenames)} files matching the query.')
+            return filenames, ids
 
-        # Find the files that match the glob pattern.
+        # Find the files that match the glob patterns.
         # DEBUG: Set breakpoint here to debug issues regarding files not found
-        logger.debug(f'Finding files with glob using pattern: `{glob_pattern}`.')
-        paths = glob(glob_pattern)
+        paths = []
+        for glob_pattern in glob_patterns:
+            logger.debug(f'Finding files with glob using pattern: `{glob_pattern}`.')
+            paths += glob(glob_pattern)
+
+        # Patterns might overlap, remove duplicates but keep the order
+        paths = list(dict.fromkeys(paths))
         
         logger.debug(f'Found {len(paths)} files matching the pattern, starting filtering.')
         logger.debug(f'Filtering files matching the params {params}.')
@@ -199,6 +308,7 @@ class FileSystemRepo(Repo):
         logger.debug(f'Finding product {self.config.products[product].name} with parameters: {params_values}.')
 
         return self.__find_files_and_match_params(
+            name = self.config.products[product].name,
             patterns = [
                 *self.config.products[product].dir_format,
                 self.config.products[product].filename_format,
@@ -16,4 +16,7 @@ class HexFilter(SearchFilter):
         super().__init__(*values, name=name, format=format, orig=orig)
        
     def _parse_value(self, value):
-        return int(value, 16)
\ No newline at end of file
+        return int(value, 16)
+
+    def _get_range_glob_patterns(self, start, end, max_count):
+        return self._get_digit_range_glob_patterns(start, end, 16, max_count)
\ No newline at end of file
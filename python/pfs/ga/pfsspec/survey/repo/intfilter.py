@@ -7,4 +7,7 @@ class IntFilter(SearchFilter):
     """
 
     def _parse_value(self, value):
-        return int(value)
\ No newline at end of file
+        return int(value)
+
+    def _get_range_glob_patterns(self, start, end, max_count):
+        return self._get_digit_range_glob_patterns(start, end, 10, max_count)
\ No newline at end of file
@@ -0,0 +1,167 @@
+import time
+import threading
+from collections import OrderedDict
+
+class LruCache():
+    """
+    Implements a thread-safe, size-bounded cache that evicts the least recently
+    used items first.
+
+    Items can optionally expire after a time-to-live and be validated with a
+    stamp function, such as one returning the modification time of a file. The
+    stamp is computed when the item is added and again when it is looked up;
+    if the two differ, the item is considered stale and removed. Computing the
+    stamp can be expensive, so validation can be turned off.
+
+    Variables
+    ---------
+    maxsize : int
+        Maximum number of items in the cache. If None, the cache is unbounded.
+    ttl : float
+        Time-to-live of the items in seconds. If None, items don't expire.
+    get_stamp : callable
+        Function that takes an item value and returns a stamp to validate it with.
+    validate : bool
+        If False, the stamps are neither computed nor checked.
+    """
+
+    __NO_STAMP = object()
+
+    def __init__(self, maxsize=128, ttl=None, get_stamp=None, validate=True):
+        self.__maxsize = maxsize
+        self.__ttl = ttl
+        self.__get_stamp = get_stamp
+        self.__validate = validate
+        self.__items = OrderedDict()
+        self.__lock = threading.RLock()
+        self.__hits = 0
+        self.__misses = 0
+
+    #region Properties
+
+    def __get_maxsize(self):
+        return self.__maxsize
+
+    def __set_maxsize(self, value):
+        with self.__lock:
+            self.__maxsize = value
+            self.__evict()
+
+    maxsize = property(__get_maxsize, __set_maxsize)
+
+    def __get_ttl(self):
+        return self.__ttl
+    
+    def __set_ttl(self, value):
+        self.__ttl = value
+
+    ttl = property(__get_ttl, __set_ttl)
+
+    def __get_validate(self):
+        return self.__validate
+    
+    def __set_validate(self, value):
+        self.__validate = value
+
+    validate = property(__get_validate, __set_validate)
+
+    def __get_hits(self):
+        return self.__hits
+    
+    hits = property(__get_hits)
+
+    def __get_misses(self):
+        return self.__misses
+    
+    misses = property(__get_misses)
+
+    #endregion
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __contains__(self, key):
+        with self.__lock:
+            return self.__lookup(key) is not None
+
+    def __evict(self):
+        if self.__maxsize is not None:
+            while len(self.__items) > self.__maxsize:
+                self.__items.popitem(last=False)
+
+    def __lookup(self, key):
+        # Return the entry of a valid item, remove the item if it is stale
+        entry = self.__items.get(key)
+        if entry is None:
+            return None
+        
+        value, created, stamp = entry
+        if self.__ttl is not None and time.monotonic() - created > self.__ttl:
+            del self.__items[key]
+            return None
+        
+        # Items added while validation was turned off have no stamp to compare to
+        if self.__validate and self.__get_stamp is not None and stamp is not LruCache.__NO_STAMP \
+            and self.__get_stamp(value) != stamp:
+            del self.__items[key]
+            return None
+        
+        return entry
+
+    def get(self, key, default=None):
+        """
+        Returns the item associated with the key and marks it as most recently
+        used, or returns the default if the key is not in the cache or the item
+        is stale.
+        """
+
+        with self.__lock:
+            entry = self.__lookup(key)
+            if entry is not None:
+                self.__items.move_to_end(key)
+                self.__hits += 1
+                return entry[0]
+            else:
+                self.__misses += 1
+                return default
+
+    def set(self, key, value):
+        """
+        Adds or updates an item in the cache and evicts the least recently
+        used items if the cache is full.
+        """
+
+        if self.__validate and self.__get_stamp is not None:
+            stamp = self.__get_stamp(value)
+        else:
+            stamp = LruCache.__NO_STAMP
+        with self.__lock:
+            self.__items[key] = (value, time.monotonic(), stamp)
+            self.__items.move_to_end(key)
+            self.__evict()
+
+    def pop(self, key, default=None):
+        """
+        Removes an item from the cache and returns it.
+        """
+
+        with self.__lock:
+            entry = self.__items.pop(key, None)
+            return entry[0] if entry is not None else default
+
+    def clear(self):
+        """
+        Removes all items from the cache.
+        """
+
+        with self.__lock:
+            self.__items.clear()
+
+    def reset_stats(self):
+        """
+        Resets the hit and miss counters.
+        """
+
+        with self.__lock:
+            self.__hits = 0
+            self.__misses = 0
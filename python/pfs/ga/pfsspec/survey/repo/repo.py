@@ -1,15 +1,44 @@
 import os
 import re
 import inspect
+from string import Formatter
 from types import SimpleNamespace
+from collections import deque
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 from ..setup_logger import logger
+from .lrucache import LruCache
+from .searchfilter import SearchFilter
+
+def _load_product_file(load, identity, filename, ignore_missing_files, **kwargs):
+    # Call the load function of a product. This is a module-level function so that
+    # it can be sent to the workers of a process pool.
+    dir = os.path.dirname(filename)
+    try:
+        data = load(identity, filename, dir, **kwargs)
+    except FileNotFoundError as ex:
+        if ignore_missing_files:
+            logger.warning(f'File not found: {filename}. Ignoring missing file.')
+            return None, None, filename
+        else:
+            raise ex
+
+    return data, identity, filename
 
 class Repo():
     """
     Implements generic functions to access a data repository.
     """
 
+    # Default number of workers used to load products in batches
+    DEFAULT_LOAD_THREADS = 8
+
+    # Default size and time-to-live, in seconds, of the product location cache
+    LOCATION_CACHE_SIZE = 4096
+    LOCATION_CACHE_TTL = None
+    LOCATION_CACHE_VALIDATE = True
+
     __expandvars_regex = re.compile(r'\$(\w+|\{[^}]*\})', re.ASCII)
 
     def __init__(self, config=None, orig=None):
@@ -29,7 +58,24 @@ class Repo():
             self.__variables = orig.__variables
             self.__filters = self._init_filters()
 
-        self.__location_cache = {}
+        if not isinstance(orig, Repo):
+            maxsize, ttl, validate = Repo.LOCATION_CACHE_SIZE, Repo.LOCATION_CACHE_TTL, Repo.LOCATION_CACHE_VALIDATE
+        else:
+            maxsize, ttl, validate = orig.__location_cache.maxsize, orig.__location_cache.ttl, orig.__location_cache.validate
+
+        # Cached locations are dropped when the modification time of the file changes,
+        # unless validation is turned off to save a stat call on every hit
+        self.__location_cache = LruCache(maxsize=maxsize, ttl=ttl, get_stamp=Repo.__get_location_stamp, validate=validate)
+
+        # Results of `find_product` registered with `prewarm_location_cache`, by product and variables
+        self.__prewarmed_locations = {}
+
+    @staticmethod
+    def __get_location_stamp(location):
+        try:
+            return os.stat(location[0]).st_mtime_ns
+        except (OSError, TypeError, ValueError):
+            return None
 
     def _init_defaults(self):
         # Enumerate all product parameters in the config and make a
@@ -88,6 +134,11 @@ class Repo():
     
     variables = property(__get_variables)
 
+    def __get_location_cache(self):
+        return self.__location_cache
+    
+    location_cache = property(__get_location_cache)
+
     #endregion
     #region Command-line arguments
 
@@ -96,6 +147,19 @@ class Repo():
                        default=None,
                         help='Ignore missing data files.',
                         ignore_duplicate=ignore_duplicates)
+        
+        script.add_arg('--location-cache-size', type=int,
+                       help='Maximum number of cached product locations.',
+                       ignore_duplicate=ignore_duplicates)
+        
+        script.add_arg('--location-cache-ttl', type=float,
+                       help='Time-to-live of cached product locations in seconds.',
+                       ignore_duplicate=ignore_duplicates)
+        
+        script.add_arg('--no-location-cache-validate', action='store_true',
+                       default=None,
+                       help='Do not check if cached product locations still exist.',
+                       ignore_duplicate=ignore_duplicates)
 
         # Add arguments for the variables
         if include_variables:
@@ -112,6 +176,15 @@ class Repo():
     def init_from_args(self, script):
         self.__ignore_missing_files = script.get_arg('ignore_missing_files', default=self.__ignore_missing_files)
 
+        if script.is_arg('location_cache_size'):
+            self.__location_cache.maxsize = script.get_arg('location_cache_size')
+
+        if script.is_arg('location_cache_ttl'):
+            self.__location_cache.ttl = script.get_arg('location_cache_ttl')
+
+        if script.get_arg('no_location_cache_validate', default=None):
+            self.__location_cache.validate = False
+
         # Parse variables
         for k, v in self.__config.variables.items():
             if script.is_arg(k.lower()):
@@ -454,14 +527,149 @@ class Repo():
             The identity of the product that matches the query.
         """
 
-        key = (product,) + tuple(self.simplify_identity(product, kwargs).values())
-        if key in self.__location_cache:
-            return self.__location_cache[key]
-        else:
+        query = self.__get_location_query(product, kwargs)
+        res = self.__get_prewarmed_location(product, query, variables)
+        if res is not None:
+            return res
+
+        key = self.__get_location_key(product, query, variables)
+        res = self.__location_cache.get(key) if key is not None else None
+        if res is None:
             files, ids = self.find_product(product, variables=variables, **kwargs)
             res = self._get_single_file(files, ids)
-            self.__location_cache[key] = res
-            return res
+            if key is not None:
+                self.__location_cache.set(key, res)
+        
+        return res
+    
+    def __get_location_query(self, product, identity):
+        # Normalize the query to scalar values so that equal queries have equal keys.
+        # Search filters hash by identity, so constant filters are replaced by their
+        # value and queries with ranges or multiple values are not cached.
+        query = {}
+        for k, v in self.simplify_identity(product, identity, return_type='d').items():
+            if isinstance(v, SearchFilter):
+                if v.is_none:
+                    continue
+                elif v.is_constant:
+                    v = v.value
+                else:
+                    return None
+
+            if isinstance(v, np.generic):
+                v = v.item()
+
+            try:
+                hash(v)
+            except TypeError:
+                return None
+
+            query[k] = v
+
+        return query
+
+    def __get_variables_key(self, product, variables):
+        key = (product, tuple(sorted(variables.items())) if variables is not None else None)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def __get_location_key(self, product, query, variables):
+        # Parameters are included with their names so that different parameters with the
+        # same value don't collide
+        if query is None:
+            return None
+
+        key = self.__get_variables_key(product, variables)
+        if key is None:
+            return None
+
+        return key + tuple(sorted(query.items()))
+
+    def __get_prewarmed_location(self, product, query, variables):
+        # Look up the file among the prewarmed files if the query uniquely identifies one
+        if query is None or len(query) == 0:
+            return None
+
+        key = self.__get_variables_key(product, variables)
+        prewarmed = self.__prewarmed_locations.get(key) if key is not None else None
+        if prewarmed is None or not all(k in prewarmed.columns for k in query):
+            return None
+
+        # Index the files by the queried parameters on first use, -1 marks values
+        # shared by multiple files
+        fields = tuple(sorted(query.keys()))
+        index = prewarmed.indexes.get(fields)
+        if index is None:
+            index = {}
+            for i, values in enumerate(zip(*[ prewarmed.columns[k] for k in fields ])):
+                index[values] = -1 if values in index else i
+            prewarmed.indexes[fields] = index
+
+        i = index.get(tuple(query[k] for k in fields), -1)
+        if i < 0:
+            return None
+
+        filename = prewarmed.files[i]
+        if self.__location_cache.validate and not os.path.isfile(filename):
+            return None
+
+        identity = SimpleNamespace(**{ k: v[i] for k, v in prewarmed.identities.items() })
+        return filename, identity
+
+    def prewarm_location_cache(self, product, files, identities, variables=None):
+        """
+        Registers the results of `find_product`, so that subsequent calls to
+        `locate_product` don't need to search for the files when the parameters
+        of the call, which can be any of the parameters of the file name, identify
+        a single file. Registering the results of another search for the same
+        product and variables replaces the previous ones.
+
+        Arguments
+        ---------
+        product : type
+            Type of the product.
+        files : list of str
+            Paths to the files, as returned by `find_product`.
+        identities : SimpleNamespace
+            Identities of the files, as returned by `find_product`.
+        variables : dict
+            Dictionary of variables, as passed to `locate_product`.
+        """
+
+        key = self.__get_variables_key(product, variables)
+        if key is None:
+            return
+
+        # The files are kept in a map of their own, sized to the search result, instead
+        # of the location cache. Lookups are indexed lazily by the queried parameters.
+        fields = [ k for k in self._get_location_fields(product) if k in identities.__dict__ ]
+        self.__prewarmed_locations[key] = SimpleNamespace(
+            files = list(files),
+            identities = { k: list(v) for k, v in identities.__dict__.items() },
+            columns = { k: np.asarray(getattr(identities, k)).tolist() for k in fields },
+            indexes = {})
+
+    def _get_location_fields(self, product):
+        """
+        Returns the parameters of the product that appear in its file name or,
+        if the file name format is not known, all parameters.
+        """
+
+        config = self.__config.products[product]
+        fields = list(config.params.__dict__.keys())
+
+        filename_format = getattr(config, 'filename_format', None)
+        if filename_format is not None:
+            names = set()
+            for _, field, _, _ in Formatter().parse(filename_format):
+                if field is not None:
+                    names.add(field[:-1] if field.endswith('_') else field)
+            fields = [ k for k in fields if k in names ]
+
+        return fields
 
     def load_product(self,
                      product=None,
@@ -502,9 +710,16 @@ class Repo():
             Path to the file that was loaded.
         """
 
+        ignore_missing_files = ignore_missing_files if ignore_missing_files is not None else self.__ignore_missing_files
+        product, identity, filename = self.__prepare_load_product(product, filename, identity, variables, skip_locate, kwargs)
+
+        # Load the product via the dispatcher
+        logger.debug(f'Loading product {self.config.products[product].name} from {filename}.')
+        return _load_product_file(self.config.products[product].load, identity, filename, ignore_missing_files, **kwargs)
+    
+    def __prepare_load_product(self, product, filename, identity, variables, skip_locate, kwargs):
         self._ensure_one_arg(filename=filename, identity=identity)
         skip_locate = skip_locate if skip_locate is not None else False
-        ignore_missing_files = ignore_missing_files if ignore_missing_files is not None else self.__ignore_missing_files
 
         if product is None and filename is not None:
             product = self.match_product_type(filename)
@@ -530,21 +745,100 @@ class Repo():
             pass
         else:
             filename, identity = self.locate_product(product, variables=variables, **params)
-            
-        dir = os.path.dirname(filename)
 
-        # Load the product via the dispatcher
-        logger.debug(f'Loading product {self.config.products[product].name} from {filename}.')
-        try:
-            data = self.config.products[product].load(identity, filename, dir, **kwargs)
-        except FileNotFoundError as ex:
-            if ignore_missing_files:
-                logger.warning(f'File not found: {filename}. Ignoring missing file.')
-                return None, None, filename
-            else:
-                raise ex
+        return product, identity, filename
+
+    def load_products(self,
+                      product=None,
+                      files=None,
+                      identities=None,
+                      variables=None,
+                      skip_locate=None,
+                      ignore_missing_files=None,
+                      threads=None,
+                      executor=None,
+                      **kwargs):
+        
+        """
+        Loads many products concurrently and yields them in the order of the input.
 
-        return data, identity, filename
+        The files are located in the calling thread and loaded by a pool of workers.
+        Only a limited number of products are loaded ahead of the consumer, so I/O
+        overlaps with the processing of the results without holding all products
+        in memory.
+
+        Arguments
+        ---------
+        product : type
+            Type of the products to load.
+        files : list of str
+            Paths to the files to load, typically returned by `find_product`.
+        identities : SimpleNamespace or list
+            Identities of the products to load, either as returned by `find_product`
+            or as a list of SimpleNamespace objects. Ignored when `files` is set.
+        variables : dict
+            Dictionary of variables that can be expanded in the file paths.
+        skip_locate : bool
+            If True, the files are not located again. Defaults to True when `files` is set.
+        ignore_missing_files: bool
+            If True, missing files are ignored and None is returned instead of raising an exception.
+        threads : int
+            Number of workers.
+        executor : str
+            Either 'thread' or 'process'. Process pools require that the load functions
+            and the identities can be pickled.
+        kwargs : dict
+            Additional parameters to pass to the load function of the product.
+
+        Returns
+        -------
+        generator
+            Generator of (product, identity, filename) tuples.
+        """
+
+        ignore_missing_files = ignore_missing_files if ignore_missing_files is not None else self.__ignore_missing_files
+        threads = threads if threads is not None else Repo.DEFAULT_LOAD_THREADS
+        executor = executor if executor is not None else 'thread'
+
+        if files is not None:
+            items = [ dict(filename=f) for f in files ]
+            skip_locate = skip_locate if skip_locate is not None else True
+        elif isinstance(identities, SimpleNamespace):
+            n = len(next(iter(identities.__dict__.values()), []))
+            items = [ dict(identity=SimpleNamespace(**{ k: v[i] for k, v in identities.__dict__.items() })) for i in range(n) ]
+        elif identities is not None:
+            items = [ dict(identity=id) for id in identities ]
+        else:
+            raise ValueError('Either `files` or `identities` must be specified.')
+        
+        if executor == 'thread':
+            pool = ThreadPoolExecutor(max_workers=max(1, threads))
+        elif executor == 'process':
+            pool = ProcessPoolExecutor(max_workers=max(1, threads))
+        else:
+            raise NotImplementedError()
+
+        # Keep a bounded number of loads in flight and yield them in order
+        window = 2 * max(1, threads)
+        futures = deque()
+        try:
+            for item in items:
+                p, identity, filename = self.__prepare_load_product(product, item.get('filename'), item.get('identity'),
+                                                                    variables, skip_locate, kwargs)
+                logger.debug(f'Loading product {self.config.products[p].name} from {filename}.')
+                futures.append(pool.submit(_load_product_file, self.config.products[p].load,
+                                           identity, filename, ignore_missing_files, **kwargs))
+
+                while len(futures) >= window:
+                    yield futures.popleft().result()
+
+            while len(futures) > 0:
+                yield futures.popleft().result()
+        finally:
+            # Cancel pending loads when the consumer stops early
+            for f in futures:
+                f.cancel()
+            pool.shutdown(wait=True)
 
     def load_products_from_container(self,
                                      container,
@@ -576,6 +870,55 @@ class Repo():
             Additional parameters to pass to the load function of the product.
         """
 
+        ignore_missing_files = ignore_missing_files if ignore_missing_files is not None else self.__ignore_missing_files
+        load, identity, filename = self.__prepare_load_products_from_container(container, product, filename, identity, variables)
+
+        try:
+            return [ (d, id, filename) for d, id in load(identity, filename, os.path.dirname(filename), **kwargs) ]
+        except FileNotFoundError as ex:
+            if ignore_missing_files:
+                logger.warning(f'File not found: {filename}. Ignoring missing file.')
+                return None
+            else:
+                raise ex
+
+    def iter_products_from_container(self,
+                                     container,
+                                     product,
+                                     filename=None,
+                                     identity=None,
+                                     variables=None,
+                                     ignore_missing_files=None,
+                                     **kwargs):
+        
+        """
+        Iterate over the data products that are subproducts of a container product.
+        
+        Unlike `load_products_from_container`, the subproducts are yielded as the load
+        function of the product returns them, so when the load function streams the
+        container, only one subproduct is held in memory at a time. See
+        `load_products_from_container` for the arguments.
+
+        Returns
+        -------
+        generator
+            Generator of (product, identity, filename) tuples.
+        """
+
+        ignore_missing_files = ignore_missing_files if ignore_missing_files is not None else self.__ignore_missing_files
+        load, identity, filename = self.__prepare_load_products_from_container(container, product, filename, identity, variables)
+
+        try:
+            for d, id in load(identity, filename, os.path.dirname(filename), **kwargs):
+                yield d, id, filename
+        except FileNotFoundError as ex:
+            if ignore_missing_files:
+                logger.warning(f'File not found: {filename}. Ignoring missing file.')
+                return
+            else:
+                raise ex
+
+    def __prepare_load_products_from_container(self, container, product, filename, identity, variables):
         if filename is not None:
             cid = self.parse_product_identity(container, filename, required=True)
             params = cid.__dict__
@@ -589,7 +932,6 @@ class Repo():
         # The file name might not contain all information necessary to load the
         # product, so given the parsed identity, we need to locate the file.
         filename, cid = self.locate_product(container, variables=variables, **params)
-        dir = os.path.dirname(filename)
 
         # At this point cid contains the parameters that are associated with the container only,
         # but any additional filters that are defined on the class need to be applied.
@@ -599,22 +941,11 @@ class Repo():
             if p.is_constant:
                 params[k] = p.value
 
-        # Load the product via the dispatcher
+        # The load function expects an identity, it isn't supposed to support filters
+        # so pass in filters as part of the identity and assumed that there are no
+        # range filter in the list
         logger.debug(f'Loading product {self.config.products[(container, product)].name} from {filename}.')
-        try:
-            # load function expects an identity, it isn't supposed to support filters
-            # so pass in filters as part of the identity and assumed that there are no
-            # range filter in the list
-            identity = SimpleNamespace(**params)
-            data = self.config.products[(container, product)].load(identity, filename, dir, **kwargs)
-        except FileNotFoundError as ex:
-            if ignore_missing_files:
-                logger.warning(f'File not found: {filename}. Ignoring missing file.')
-                return None
-            else:
-                raise ex
-
-        return [ (d, id, filename) for d, id in data ]
+        return self.config.products[(container, product)].load, SimpleNamespace(**params), filename
 
     def save_product(self, data, filename=None, identity=None, variables=None,
                      exist_ok=True,
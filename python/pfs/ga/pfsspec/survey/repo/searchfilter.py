@@ -13,6 +13,11 @@ class SearchFilter():
     parsed into the list `['123', ('123', '127')]`.
     """
 
+    # Maximum number of glob patterns a filter is expanded into
+    MAX_GLOB_PATTERNS = 32
+
+    __DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
     def __init__(self, *values, name=None, format=None, orig=None):
         if not isinstance(orig, SearchFilter):
             self._name = name
@@ -201,21 +206,40 @@ class SearchFilter():
 
         The values match the filter if the filter is empty or the value
         is equal to one of the values or within the inclusive range of one
-        of the ranges in the filter. 
+        of the ranges in the filter. Individual values are matched with a
+        single call to `np.isin` and ranges with vectorized comparisons.
         """
 
-        mask = np.full_like(values, False, dtype=bool)
+        values = self._get_mask_array(values)
 
         if self._values is None or len(self._values) == 0:
-            return ~mask
+            return np.full(values.shape, True, dtype=bool)
+
+        literals = [ self._get_mask_value(v) for v in self._values if not isinstance(v, tuple) ]
+        if len(literals) > 0:
+            mask = np.isin(values, literals)
         else:
-            for v in self._values:
-                if isinstance(v, tuple):
-                    mask |= (values >= v[0]) & (values <= v[1])
-                else:
-                    mask |= values == v
+            mask = np.full(values.shape, False, dtype=bool)
+
+        for v in self._values:
+            if isinstance(v, tuple):
+                mask |= (values >= self._get_mask_value(v[0])) & (values <= self._get_mask_value(v[1]))
 
         return mask
+
+    def _get_mask_array(self, values):
+        """
+        Convert the values to be masked into an array that can be compared to the filter values.
+        """
+
+        return np.asarray(values)
+
+    def _get_mask_value(self, value):
+        """
+        Convert a filter value into a type that can be compared to the array of values to be masked.
+        """
+
+        return value
             
     def get_glob_pattern(self):
         """
@@ -226,6 +250,116 @@ class SearchFilter():
             return self._format.format(self._values[0])
         else:
             return '*'
+
+    def get_glob_patterns(self, max_count=None):
+        """
+        Return a list of glob patterns that together match all IDs in the filter.
+
+        Individual values are formatted into separate patterns and ranges are expanded
+        into as few patterns as possible. If the number of patterns would exceed
+        `max_count`, a single pattern is returned that matches all IDs, just like
+        `get_glob_pattern`. The patterns might match more IDs than the filter, so
+        matches still need to be filtered.
+        """
+
+        max_count = max_count if max_count is not None else SearchFilter.MAX_GLOB_PATTERNS
+
+        if self._values is None or len(self._values) == 0:
+            return [ self.get_glob_pattern() ]
+
+        patterns = []
+        for v in self._values:
+            if isinstance(v, tuple):
+                pp = self._get_range_glob_patterns(v[0], v[1], max_count)
+                if pp is None:
+                    return [ self.get_glob_pattern() ]
+                patterns += pp
+            else:
+                patterns.append(self._format.format(v))
+
+            if len(patterns) > max_count:
+                return [ self.get_glob_pattern() ]
+
+        # Remove duplicates but keep the order
+        return list(dict.fromkeys(patterns))
+
+    def _get_range_glob_patterns(self, start, end, max_count):
+        """
+        Return a list of glob patterns that match all IDs within the range or
+        None if the range cannot be expanded into at most `max_count` patterns.
+        """
+
+        return None
+
+    def _get_digit_range_glob_patterns(self, start, end, base, max_count):
+        """
+        Expand a range of integers into glob patterns. When the format string produces
+        fixed-width digit strings, the range is split into blocks that share a prefix,
+        so that `000120-000127` becomes `00012[0-7]` and `120000-129999` becomes `12????`.
+        Otherwise, the values of the range are enumerated.
+        """
+
+        digits = SearchFilter.__DIGITS[:base]
+
+        def is_fixed_width(s, value):
+            return all(c in digits for c in s) and int(s, base) == value
+
+        s_start, s_end = self._format.format(start), self._format.format(end)
+        if len(s_start) != len(s_end) or not is_fixed_width(s_start, start) or not is_fixed_width(s_end, end):
+            if end - start + 1 <= max_count:
+                return [ self._format.format(v) for v in range(start, end + 1) ]
+            else:
+                return None
+
+        width = len(s_start)
+
+        def to_digits(value):
+            s = ''
+            for _ in range(width):
+                value, d = divmod(value, base)
+                s = digits[d] + s
+            return s
+
+        # Split the range into aligned blocks of size base**k
+        blocks = []
+        lo = start
+        while lo <= end:
+            k = 0
+            while k < width and lo % base**(k + 1) == 0 and lo + base**(k + 1) - 1 <= end:
+                k += 1
+            blocks.append((to_digits(lo)[:width - k], k))
+            lo += base**k
+
+        # Merge consecutive blocks that only differ in the last digit of the prefix
+        # into a character class
+        patterns = []
+        i = 0
+        while i < len(blocks):
+            prefix, k = blocks[i]
+            j = i
+            while j + 1 < len(blocks) and blocks[j + 1][1] == k and len(prefix) > 0 and \
+                blocks[j + 1][0][:-1] == prefix[:-1]:
+                j += 1
+
+            if j == i:
+                patterns.append(prefix + '?' * k)
+            else:
+                # Render digits and letters as separate ranges of the character class
+                chars = digits[digits.index(prefix[-1]):digits.index(blocks[j][0][-1]) + 1]
+                cls = ''
+                for run in [ c for c in chars if c.isdigit() ], [ c for c in chars if c.isalpha() ]:
+                    if len(run) > 1:
+                        cls += f'{run[0]}-{run[-1]}'
+                    elif len(run) == 1:
+                        cls += run[0]
+                patterns.append(prefix[:-1] + f'[{cls}]' + '?' * k)
+
+            if len(patterns) > max_count:
+                return None
+
+            i = j + 1
+
+        return patterns
         
     def get_regex_pattern(self):
         raise NotImplementedError()
\ No newline at end of file
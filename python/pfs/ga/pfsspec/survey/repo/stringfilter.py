@@ -1,5 +1,6 @@
+import re
 from collections.abc import Iterable
-from fnmatch import fnmatch
+from fnmatch import fnmatch, translate
 import numpy as np
 
 from .searchfilter import SearchFilter
@@ -9,6 +10,8 @@ class StringFilter(SearchFilter):
     Implemented an argument parser for string filters and logic to match strings
     within file names.
     """
+
+    __magic_regex = re.compile(r'[*?[]')
     
     def _parse_value(self, value):
         return value
@@ -36,19 +39,49 @@ class StringFilter(SearchFilter):
             return True
         else:
             for v in self._values:
-                # Check if value matches v based on wildcards
-                if fnmatch(value, v):
+                if isinstance(v, tuple):
+                    # Ranges are compared lexically
+                    if value >= v[0] and value <= v[1]:
+                        return True
+                elif fnmatch(value, v):
+                    # Check if value matches v based on wildcards
                     return True
 
             return False
 
     def mask(self, values):
-        mask = np.full_like(values, True, dtype=bool)
+        """
+        Create a boolean mask with True where the values match the filter.
+
+        Each unique value is only matched once. Values without wildcards are
+        matched exactly with `np.isin`, wildcard patterns are combined into
+        a single compiled regular expression and ranges are compared lexically.
+        """
+
+        values = np.asarray(values)
 
         if self._values is None or len(self._values) == 0:
-            return mask
+            return np.full(values.shape, True, dtype=bool)
+
+        ranges = [ v for v in self._values if isinstance(v, tuple) ]
+        strings = [ v for v in self._values if not isinstance(v, tuple) ]
+        literals = [ v for v in strings if StringFilter.__magic_regex.search(v) is None ]
+        wildcards = [ v for v in strings if StringFilter.__magic_regex.search(v) is not None ]
+
+        # Match the unique values only and map the results back to the original shape
+        unique, inverse = np.unique(values.astype(str), return_inverse=True)
+
+        if len(literals) > 0:
+            unique_mask = np.isin(unique, literals)
         else:
-            for idx in np.ndindex(values.shape):
-                mask[idx] = self.match(values[idx])
+            unique_mask = np.full(unique.shape, False, dtype=bool)
+
+        for start, end in ranges:
+            unique_mask |= (unique >= start) & (unique <= end)
+
+        if len(wildcards) > 0:
+            regex = re.compile('|'.join(f'(?:{translate(v)})' for v in wildcards))
+            for i in np.where(~unique_mask)[0]:
+                unique_mask[i] = regex.match(unique[i]) is not None
 
-            return mask
\ No newline at end of file
+        return unique_mask[inverse].reshape(values.shape)
@@ -1,5 +1,6 @@
 from .searchfilter import SearchFilter
-from datetime import datetime
+from datetime import datetime, timezone
+import numpy as np
 import dateutil.parser as dateparser
 
 class TimeFilter(SearchFilter):
@@ -55,6 +56,23 @@ class TimeFilter(SearchFilter):
                     # Single date
                     self._values.append(self._parse_value(a))
 
+    def __to_naive_utc(self, value):
+        # numpy cannot convert timezone aware datetimes, compare them in UTC
+        if isinstance(value, datetime) and value.tzinfo is not None:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        else:
+            return value
+
+    def _get_mask_array(self, values):
+        # Compare times as datetime64 to avoid comparing arrays of datetime objects
+        values = np.asarray(values)
+        if values.dtype.kind != 'M':
+            values = np.array([ self.__to_naive_utc(v) for v in values.ravel() ], dtype='datetime64[us]').reshape(values.shape)
+        return values.astype('datetime64[us]')
+
+    def _get_mask_value(self, value):
+        return np.datetime64(self.__to_naive_utc(value), 'us')
+
     def get_glob_pattern(self):
         """
         Return a glob pattern that matches all dates in the filter.
@@ -1,3 +1,4 @@
+from .sdssmirror import SdssMirror
 from .sdss1spectrumreader import Sdss1SpectrumReader
 from .sdss1stellarspectrumreader import Sdss1StellarSpectrumReader
 from .sdss4spectrumreader import Sdss4SpectrumReader
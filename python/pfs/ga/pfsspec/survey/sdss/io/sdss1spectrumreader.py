@@ -4,6 +4,7 @@ import numpy as np
 from astropy.io import fits
 
 from pfs.ga.pfsspec.core.io import SpectrumReader
+from .sdssmirror import SdssMirror
 
 class Sdss1SpectrumReader(SpectrumReader):
     def __init__(self, orig=None):
@@ -11,8 +12,10 @@ class Sdss1SpectrumReader(SpectrumReader):
 
         if isinstance(orig, Sdss1SpectrumReader):
             self.path = orig.path
+            self.mirror = orig.mirror
         else:
             self.path = None
+            self.mirror = None
 
     def create_spectrum(self, hdus):
         # TODO: we could figure out spectrum type here from the FITS header
@@ -43,9 +46,27 @@ class Sdss1SpectrumReader(SpectrumReader):
         # .../das2/spectro/1d_26/0288/1d/spSpec-52000-0288-005.fit
         return '{:s}/spectro/{:s}/{:04d}/1d/spSpec-{:5d}-{:04d}-{:03d}.fit'.format(das, ver, int(plate), int(mjd), int(plate), int(fiber))
 
-    def load_spectrum(self, index, row):
+    def get_local_filename(self, row):
         filename = Sdss1SpectrumReader.get_filename(row['mjd'], row['plate'], row['fiber'])
-        filename = os.path.join(self.path, filename)
+        return os.path.join(self.path, filename)
+
+    def get_mirror(self):
+        if self.mirror is None:
+            self.mirror = SdssMirror(cache_dir=os.path.join(self.path, SdssMirror.MIRROR_DIR))
+        return self.mirror
+
+    def get_file(self, row):
+        filename = self.get_local_filename(row)
+
+        # DR7 files are only available from the web if the query returned their URL
+        if not os.path.isfile(filename) and 'url' in row:
+            filename = self.get_mirror().get(row['url'], filename)
+
+        return filename
+
+    def load_spectrum(self, index, row, filename=None):
+        if filename is None:
+            filename = self.get_file(row)
 
         with fits.open(filename, memmap=False) as hdus:
             spec = self.read(hdus)
@@ -1,10 +1,10 @@
 import os
 import sys
 import numpy as np
-import requests
 from astropy.io import fits
 
 from pfs.ga.pfsspec.core.io import SpectrumReader
+from .sdssmirror import SdssMirror
 
 class Sdss4SpectrumReader(SpectrumReader):
     """
@@ -20,8 +20,10 @@ class Sdss4SpectrumReader(SpectrumReader):
 
         if isinstance(orig, Sdss4SpectrumReader):
             self.path = orig.path
+            self.mirror = orig.mirror
         else:
             self.path = None
+            self.mirror = None
 
     def create_spectrum(self, hdus):
         # TODO: we could figure out spectrum type here from the FITS header
@@ -55,21 +57,27 @@ class Sdss4SpectrumReader(SpectrumReader):
         return 'sas/{:s}/sdss/spectro/redux/{:s}/spectra/lite/{:04d}/spec-{:04d}-{:5d}-{:04d}.fits'.format(
             dr, run2d, int(plate), int(plate), int(mjd), int(fiber))
 
-    def load_spectrum(self, index, row):
+    def get_local_filename(self, row):
         filename = Sdss4SpectrumReader.get_filename(row['mjd'], row['plate'], row['fiber'])
-        filename = os.path.join(self.path, filename)
+        return os.path.join(self.path, filename)
+
+    def get_mirror(self):
+        if self.mirror is None:
+            self.mirror = SdssMirror(cache_dir=os.path.join(self.path, SdssMirror.MIRROR_DIR))
+        return self.mirror
+
+    def get_file(self, row):
+        filename = self.get_local_filename(row)
         
         # If the file is not available at a local/lan path, download from the web
-        # TODO: move this logic to a generic function
         if not os.path.isfile(filename):
-            url = row['url']
-            req = requests.get(url, allow_redirects=True)
-            
-            dir, _ = os.path.split(os.path.abspath(filename))
-            os.makedirs(dir, exist_ok=True)
-            
-            with open(filename, 'wb') as f:
-                f.write(req.content)
+            filename = self.get_mirror().get(row['url'], filename)
+
+        return filename
+
+    def load_spectrum(self, index, row, filename=None):
+        if filename is None:
+            filename = self.get_file(row)
 
         with fits.open(filename, memmap=False) as hdus:
             spec = self.read(hdus)
@@ -0,0 +1,220 @@
+import os
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from ...setup_logger import logger
+from ...io.bulkdownloader import BulkDownloader
+
+class SdssMirror():
+    """
+    Implements a local mirror of remote SDSS files shared by all spectrum
+    readers, threads and processes of an import.
+
+    Files are content-addressed by the hash of their URL, so the same file is
+    never downloaded twice, regardless of the local directory layout of the
+    different data releases. Downloads are written to a temporary file and
+    renamed into place, and a per-file lock prevents concurrent workers, even
+    in different processes, from downloading the same file at once. HTTP
+    connections are pooled and failed downloads are retried.
+
+    A background prefetcher can download the files ahead of the readers. It
+    stays a fixed number of files ahead of the items the reader is done with,
+    see `advance`.
+
+    Variables
+    ---------
+    cache_dir : str
+        Root directory of the mirror.
+    threads : int
+        Number of concurrent downloads of the prefetcher.
+    retries : int
+        Number of times a failed download is retried.
+    """
+
+    # Default directory of the mirror, relative to the data directory
+    MIRROR_DIR = 'mirror'
+
+    # Default number of files the prefetcher downloads ahead of the readers
+    DEFAULT_PREFETCH = 32
+
+    def __init__(self, cache_dir=None, threads=None, retries=None, orig=None):
+        if not isinstance(orig, SdssMirror):
+            self.cache_dir = cache_dir
+            self.threads = threads if threads is not None else BulkDownloader.DEFAULT_THREADS
+            self.retries = retries if retries is not None else BulkDownloader.DEFAULT_RETRIES
+        else:
+            self.cache_dir = cache_dir if cache_dir is not None else orig.cache_dir
+            self.threads = threads if threads is not None else orig.threads
+            self.retries = retries if retries is not None else orig.retries
+
+        self.__downloader = None
+        self.__lock = threading.Lock()
+        self.__prefetch_thread = None
+        self.__prefetch_stop = None
+        self.__prefetch_cond = threading.Condition()
+        self.__prefetch_consumed = 0
+
+    def __getstate__(self):
+        # Sessions, locks and the prefetcher cannot be sent to worker processes,
+        # the workers create their own downloader when needed
+        state = self.__dict__.copy()
+        state['_SdssMirror__downloader'] = None
+        state['_SdssMirror__lock'] = None
+        state['_SdssMirror__prefetch_thread'] = None
+        state['_SdssMirror__prefetch_stop'] = None
+        state['_SdssMirror__prefetch_cond'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+        self.__prefetch_cond = threading.Condition()
+
+    def __get_downloader(self):
+        with self.__lock:
+            if self.__downloader is None:
+                self.__downloader = BulkDownloader(outdir=self.cache_dir, threads=self.threads, retries=self.retries)
+            return self.__downloader
+
+    def get_cache_filename(self, url):
+        """
+        Returns the path of the mirrored file, derived from the hash of the URL.
+        """
+
+        h = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        ext = os.path.splitext(url.split('?')[0])[1]
+        return os.path.join(self.cache_dir, h[:2], h[2:4], h + ext)
+
+    @contextmanager
+    def __file_lock(self, filename):
+        # Lock the file across processes while it is being downloaded
+        if fcntl is None:
+            yield
+            return
+
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        lockfile = filename + '.lock'
+        while True:
+            f = open(lockfile, 'a')
+            fcntl.flock(f, fcntl.LOCK_EX)
+
+            # The previous holder removes the lock file when done, in which case
+            # the lock is on a stale file and has to be taken again on a new one
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(lockfile).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            f.close()
+
+        try:
+            yield
+        finally:
+            try:
+                os.remove(lockfile)
+            except FileNotFoundError:
+                pass
+            fcntl.flock(f, fcntl.LOCK_UN)
+            f.close()
+
+    def get(self, url, filename=None):
+        """
+        Returns the path to a local copy of the file at `url`, downloading it
+        into the mirror if necessary.
+
+        Arguments
+        ---------
+        url : str
+            URL of the file.
+        filename : str
+            Local path where the file might already be available, such as a
+            directory of a local or LAN copy of the data release.
+
+        Returns
+        -------
+        str
+            Path to the local copy of the file.
+        """
+
+        if filename is not None and os.path.isfile(filename):
+            return filename
+
+        cached = self.get_cache_filename(url)
+        if not os.path.isfile(cached):
+            with self.__file_lock(cached):
+                # Another worker might have downloaded the file while waiting for the lock
+                if not os.path.isfile(cached):
+                    self.__get_downloader().download(url, os.path.relpath(cached, self.cache_dir), force=True)
+
+        return cached
+
+    #region Prefetch
+
+    def prefetch(self, items, ahead=None):
+        """
+        Starts downloading files in the background, in order, staying at most
+        `ahead` files ahead of the reader. The reader reports the items it has
+        consumed by calling `advance`.
+
+        Arguments
+        ---------
+        items : iterable
+            Tuples of URL and local path, see `get`, in the order the reader
+            consumes them.
+        ahead : int
+            Number of files downloaded ahead of the reader.
+        """
+
+        self.stop_prefetch()
+
+        ahead = ahead if ahead is not None else SdssMirror.DEFAULT_PREFETCH
+        self.__prefetch_consumed = 0
+        self.__prefetch_stop = threading.Event()
+        self.__prefetch_thread = threading.Thread(target=self.__prefetch, args=(items, ahead, self.__prefetch_stop), daemon=True)
+        self.__prefetch_thread.start()
+
+    def stop_prefetch(self):
+        if self.__prefetch_thread is not None:
+            self.__prefetch_stop.set()
+            with self.__prefetch_cond:
+                self.__prefetch_cond.notify_all()
+            self.__prefetch_thread.join()
+            self.__prefetch_thread = None
+            self.__prefetch_stop = None
+
+    def advance(self, count=1):
+        """
+        Tells the prefetcher that the reader has consumed `count` more items so
+        that it can download the next ones.
+        """
+
+        with self.__prefetch_cond:
+            self.__prefetch_consumed += count
+            self.__prefetch_cond.notify_all()
+
+    def __prefetch(self, items, ahead, stop):
+        def prefetch_item(url, filename):
+            try:
+                if not stop.is_set():
+                    self.get(url, filename)
+            except Exception as ex:
+                # The reader will try again and report the error
+                logger.warning(f'Failed to prefetch `{url}`: {ex}')
+
+        with ThreadPoolExecutor(max_workers=min(ahead, self.threads)) as executor:
+            for i, (url, filename) in enumerate(items):
+                # Wait until the reader gets close enough to the i-th item
+                with self.__prefetch_cond:
+                    self.__prefetch_cond.wait_for(lambda: stop.is_set() or i < self.__prefetch_consumed + ahead)
+                if stop.is_set():
+                    break
+                executor.submit(prefetch_item, url, filename)
+
+    #endregion
@@ -1,5 +1,3 @@
-import os
-
 from ..segue.sdssseguesurvey import SdssSegueSurvey
 from .sdss1stellarspectrumreader import Sdss1StellarSpectrumReader
 from .sdss4stellarspectrumreader import Sdss4StellarSpectrumReader
@@ -49,7 +47,7 @@ class SdssSegueSurveyReader(SdssSurveyReader):
 
     def find_objects(self):
         if self.dr == 'DR7':
-            return self.find_object_SDSS1()
+            return self.find_objects_SDSS1()
         elif self.dr == 'DR16':
             return self.find_objects_SDSS4()
         else:
@@ -70,9 +68,8 @@ class SdssSegueSurveyReader(SdssSurveyReader):
         if self.a_Fe is not None:
             where += "AND spp.alphafe BETWEEN {:f} AND {:f} \n".format(self.a_Fe[0], self.a_Fe[1])
 
-        sql = \
+        columns = \
         """
-        SELECT {} 
             s.specObjID AS id, s.mjd, s.plate, s.fiberID AS fiber, s.ra AS ra, s.dec AS dec, 
             s.z AS redshift, s.zErr AS redshift_err, s.sn_1 AS snr,
             spp.feha AS Fe_H, spp.fehaerr AS Fe_H_err, 
@@ -86,20 +83,19 @@ class SdssSegueSurveyReader(SdssSurveyReader):
             p.psfMag_i AS mag_i, p.psfMagErr_i AS mag_i_err,
             p.psfMag_z AS mag_z, p.psfMagErr_z AS mag_z_err,
             p.extinction_r AS ext
+        """
+
+        source = \
+        """
         FROM SpecObj s
             INNER JOIN sppParams spp ON spp.specobjID = s.specObjID
             INNER JOIN PhotoObj p ON p.objID = s.bestObjID
         WHERE specClass = 1 AND zConf > 0.98 
               AND p.psfMag_r > 10               -- exclude unmeasured psf mag 
               {}
-        ORDER BY s.mjd, s.plate, s.fiberID
-        """.format('' if self.top is None else 'TOP {:d}'.format(self.top), where)
-
-        if self.outdir is not None:
-            with open(os.path.join(self.outdir, "sciserver.sql"), "w") as f:
-                f.write(sql)
+        """.format(where)
 
-        return self.execute_query(sql, context=context)
+        return self.execute_paged_query(columns, source, context=context)
 
     def find_objects_SDSS4(self, context='DR16'):
         where = ''
@@ -116,9 +112,8 @@ class SdssSegueSurveyReader(SdssSurveyReader):
         if self.a_Fe is not None:
             raise ValueError("Alpha abundance not measured in {}.".format(context))
 
-        sql = \
+        columns = \
         """
-        SELECT {}
             s.specObjID AS id, s.mjd, s.plate, s.fiberID AS fiber, s.ra AS ra, s.dec AS dec, 
             s.z AS redshift, s.zErr AS redshift_err, s.snMedian AS snr,
             spp.FEHADOP AS Fe_H, spp.FEHADOPUNC AS Fe_H_err, 
@@ -133,6 +128,10 @@ class SdssSegueSurveyReader(SdssSurveyReader):
             p.psfMag_z AS mag_z, p.psfMagErr_z AS mag_z_err,
             p.extinction_r AS ext,
             dbo.fGetUrlFitsSpectrum(s.specObjID) AS url
+        """
+
+        source = \
+        """
         FROM SpecObjAll s
         INNER JOIN sppParams spp ON spp.specobjID = s.specObjID
         INNER JOIN PhotoObj p ON p.objID = s.bestObjID
@@ -140,13 +139,6 @@ class SdssSegueSurveyReader(SdssSurveyReader):
             AND instrument = 'SDSS'
             AND p.psfMag_r > 10               -- exclude unmeasured psf mag 
             {}
-        ORDER BY s.mjd, s.plate, s.fiberID
-        """.format(
-            '' if self.top is None else 'TOP {:d}'.format(self.top),
-            where)
-
-        if self.outdir is not None:
-            with open(os.path.join(self.outdir, "sciserver.sql"), "w") as f:
-                f.write(sql)
+        """.format(where)
 
-        return self.execute_query(sql, context=context)
\ No newline at end of file
+        return self.execute_paged_query(columns, source, context=context)
\ No newline at end of file
@@ -1,8 +1,17 @@
 import os
 import getpass
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
 
 from pfs.ga.pfsspec.core.setup_logger import logger
 
+try:
+    import pyarrow
+except ImportError:
+    # Query results are cached as pickles instead of Parquet files
+    pyarrow = None
+
 try:
     from SciServer import Authentication, CasJobs
 except ImportError:
@@ -12,8 +21,28 @@ except ImportError:
     CasJobs = None
 
 from ...io.surveyreader import SurveyReader
+from .sdssmirror import SdssMirror
 
 class SdssSurveyReader(SurveyReader):
+    """
+    Implements functions to query SDSS CasJobs for spectra and read them.
+
+    Large queries are split into pages of consecutive MJDs, following the
+    `ORDER BY mjd, plate, fiberID` order of the results, and the pages are
+    executed concurrently. Pages and results are cached on disk, keyed by a
+    hash of the generated SQL, so repeated imports with the same filters don't
+    query CasJobs again and interrupted queries continue with the missing pages.
+    """
+
+    # Default number of rows per page of a query
+    DEFAULT_PAGE_SIZE = 50000
+
+    # Default number of pages queried at the same time
+    DEFAULT_QUERY_THREADS = 4
+
+    # Default directory of the query cache, relative to the data directory
+    QUERY_CACHE_DIR = 'query_cache'
+
     def __init__(self, orig=None):
         super(SdssSurveyReader, self).__init__(orig=orig)
 
@@ -27,6 +56,13 @@ class SdssSurveyReader(SurveyReader):
             self.plate = orig.plate
             self.mjd = orig.mjd
             # TODO: add more filters
+
+            self.mirror_dir = orig.mirror_dir
+            self.prefetch = orig.prefetch
+
+            self.query_cache = orig.query_cache
+            self.page_size = orig.page_size
+            self.query_threads = orig.query_threads
         else:
             self.user = None
             self.token = None
@@ -38,6 +74,13 @@ class SdssSurveyReader(SurveyReader):
             self.mjd = None
             # TODO: add more filters
 
+            self.mirror_dir = None
+            self.prefetch = None
+
+            self.query_cache = None
+            self.page_size = SdssSurveyReader.DEFAULT_PAGE_SIZE
+            self.query_threads = SdssSurveyReader.DEFAULT_QUERY_THREADS
+
     def add_args(self, parser):
         super(SdssSurveyReader, self).add_args(parser)
 
@@ -50,6 +93,13 @@ class SdssSurveyReader(SurveyReader):
         parser.add_argument('--mjd', type=int, default=None, help='Limit to a single MJD')
         # TODO: add more filters
 
+        parser.add_argument('--mirror-dir', type=str, default=None, help='Local mirror of downloaded files\n')
+        parser.add_argument('--prefetch', type=int, default=None, help='Number of files to download ahead\n')
+
+        parser.add_argument('--query-cache', type=str, default=None, help='Directory of cached query results\n')
+        parser.add_argument('--page-size', type=int, default=None, help='Number of rows per query page, 0 to disable paging\n')
+        parser.add_argument('--query-threads', type=int, default=None, help='Number of pages queried at the same time\n')
+
     def init_from_args(self, config, args):
         super(SdssSurveyReader, self).init_from_args(config, args)
 
@@ -62,6 +112,13 @@ class SdssSurveyReader(SurveyReader):
         self.mjd = self.get_arg('mjd', self.mjd, args)
         # TODO: add more filters
 
+        self.mirror_dir = self.get_arg('mirror_dir', self.mirror_dir, args)
+        self.prefetch = self.get_arg('prefetch', self.prefetch, args)
+
+        self.query_cache = self.get_arg('query_cache', self.query_cache, args)
+        self.page_size = self.get_arg('page_size', self.page_size, args)
+        self.query_threads = self.get_arg('query_threads', self.query_threads, args)
+
     def create_auth_token(self):
         if self.token is None:
             if self.user is None:
@@ -74,8 +131,144 @@ class SdssSurveyReader(SurveyReader):
         self.sciserver_token = Authentication.login(username, password)
 
     def execute_query(self, sql, context='DR7'):
+        # Override to run queries against a local database, for example in tests
         return CasJobs.executeQuery(sql=sql, context=context, format="pandas")
 
+    #region Paged queries
+
+    def get_query_cache_dir(self, sql, context):
+        h = hashlib.sha256('{}\n{}'.format(context, sql).encode('utf-8')).hexdigest()
+        return os.path.join(self.query_cache, h)
+
+    def get_query_cache_ext(self):
+        return '.parquet' if pyarrow is not None else '.pickle'
+
+    def write_query_cache(self, df, filename):
+        # Write to a temporary file first so that an interrupted write is never
+        # mistaken for a complete result
+        tmp = filename + '.tmp'
+        if pyarrow is not None:
+            df.to_parquet(tmp, index=False)
+        else:
+            df.to_pickle(tmp)
+        os.replace(tmp, filename)
+
+    def read_query_cache(self, filename):
+        if pyarrow is not None:
+            return pd.read_parquet(filename)
+        else:
+            return pd.read_pickle(filename)
+
+    def get_query_pages(self, counts):
+        """
+        Splits the results into pages of consecutive MJDs with about `page_size`
+        rows each. MJDs are never split, so a page might be larger.
+
+        Arguments
+        ---------
+        counts : DataFrame
+            Number of rows `n` for each `mjd`, ordered by MJD.
+
+        Returns
+        -------
+        list of tuple
+            First and last MJD of each page.
+        """
+
+        pages = []
+        start, n = None, 0
+        for mjd, c in zip(counts['mjd'], counts['n']):
+            if start is None:
+                start = mjd
+            n += c
+            if n >= self.page_size:
+                pages.append((int(start), int(mjd)))
+                start, n = None, 0
+        if start is not None:
+            pages.append((int(start), int(mjd)))
+        return pages
+
+    def execute_paged_query(self, columns, source, context='DR7'):
+        """
+        Executes a query ordered by `mjd, plate, fiberID` in pages of
+        consecutive MJDs, and caches the results.
+
+        Arguments
+        ---------
+        columns : str
+            Column list of the SELECT clause.
+        source : str
+            FROM and WHERE clauses of the query. The spectrum table must be
+            aliased as `s` and the WHERE clause must be present.
+        context : str
+            CasJobs context of the query.
+
+        Returns
+        -------
+        DataFrame
+            Results of the query.
+        """
+
+        top = '' if self.top is None else 'TOP {:d}'.format(self.top)
+        order = 'ORDER BY s.mjd, s.plate, s.fiberID'
+        sql = 'SELECT {} {} {} {}'.format(top, columns, source, order)
+
+        if self.outdir is not None:
+            with open(os.path.join(self.outdir, "sciserver.sql"), "w") as f:
+                f.write(sql)
+
+        if self.query_cache is None:
+            return self.execute_pages(sql, columns, source, order, context)
+
+        cache_dir = self.get_query_cache_dir(sql, context)
+        result = os.path.join(cache_dir, 'result' + self.get_query_cache_ext())
+        if os.path.isfile(result):
+            logger.info('Reading cached query results from `{}`.'.format(result))
+            return self.read_query_cache(result)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(os.path.join(cache_dir, 'query.sql'), 'w') as f:
+            f.write(sql)
+
+        df = self.execute_pages(sql, columns, source, order, context, cache_dir=cache_dir)
+        self.write_query_cache(df, result)
+        logger.info('Query results cached in `{}`.'.format(result))
+
+        return df
+
+    def execute_pages(self, sql, columns, source, order, context, cache_dir=None):
+        # TOP is applied to the whole query so it cannot be paged
+        if self.top is not None or self.page_size is None or self.page_size <= 0:
+            return self.execute_query(sql, context=context)
+
+        counts = self.execute_query('SELECT s.mjd AS mjd, COUNT(*) AS n {} GROUP BY s.mjd ORDER BY s.mjd'.format(source), context=context)
+        pages = self.get_query_pages(counts)
+        if len(pages) <= 1:
+            return self.execute_query(sql, context=context)
+
+        logger.info('Executing query in {} pages.'.format(len(pages)))
+
+        def execute_page(page):
+            # Pages finished by a previous, interrupted run are read from the cache
+            filename = None
+            if cache_dir is not None:
+                filename = os.path.join(cache_dir, 'page-{:d}-{:d}{}'.format(page[0], page[1], self.get_query_cache_ext()))
+                if os.path.isfile(filename):
+                    return self.read_query_cache(filename)
+
+            df = self.execute_query('SELECT {} {} AND s.mjd BETWEEN {:d} AND {:d} {}'.format(columns, source, page[0], page[1], order), context=context)
+            if filename is not None:
+                self.write_query_cache(df, filename)
+            return df
+
+        with ThreadPoolExecutor(max_workers=self.query_threads) as executor:
+            # Results are returned in the order of the pages
+            dfs = list(executor.map(execute_page, pages))
+
+        return pd.concat(dfs, ignore_index=True)
+
+    #endregion
+
     def open_data(self, args, indir, outdir):
         super(SdssSurveyReader, self).open_data(args, indir, outdir)
 
@@ -85,10 +278,43 @@ class SdssSurveyReader(SurveyReader):
         self.reader.path = indir
         self.reader.sciserver_token = self.token
 
+        if self.query_cache is None:
+            self.query_cache = os.path.join(indir, SdssSurveyReader.QUERY_CACHE_DIR)
+
+        # All workers share the same mirror so files are downloaded only once
+        mirror_dir = self.mirror_dir if self.mirror_dir is not None else os.path.join(indir, SdssMirror.MIRROR_DIR)
+        self.reader.mirror = SdssMirror(cache_dir=mirror_dir, threads=self.threads)
+
     def find_objects(self):
         # TODO: this could be generic if we had a few more filters
         raise NotImplementedError()
 
+    def fetch_item(self, index, row):
+        # Downloading is I/O bound, reading the FITS file is left to the decoders
+        return self.reader.get_file(row)
+
+    def decode_item(self, index, row, filename):
+        return self.reader.load_spectrum(index, row, filename=filename)
+
+    def __is_prefetch(self, params):
+        return self.prefetch is not None and self.prefetch > 0 and 'url' in params.columns
+
+    def finish_item(self):
+        # The prefetcher stays ahead of the spectra that are done, not of the
+        # rows handed out to the workers, which might all be taken at once
+        self.reader.mirror.advance()
+
+    def load_survey(self, params):
+        # Download the files ahead of the workers, in the order they're loaded
+        if self.__is_prefetch(params):
+            items = zip(params['url'], (self.reader.get_local_filename(r) for r in params.to_dict('records')))
+            self.reader.mirror.prefetch(items, ahead=self.prefetch)
+
+        try:
+            return super(SdssSurveyReader, self).load_survey(params)
+        finally:
+            self.reader.mirror.stop_prefetch()
+
     def run(self):
         logger.info('Querying SkyServer for spectrum headers')
         params = self.find_objects()
@@ -1,20 +1,29 @@
 import numpy as np
 import pandas as pd
-import pickle
 
 from pfs.ga.pfsspec.core.setup_logger import logger
 from pfs.ga.pfsspec.core import PfsObject
+from .surveystore import PickleSurveyStore
+from .hdf5surveystore import Hdf5SurveyStore
+from .surveyspectra import SurveySpectra
 
 class Survey(PfsObject):
     """
     Implements functions to store survey data of any type of Spectrum implementation.
 
-    Stores data pickled.
+    Stores data either pickled, the params first and then the spectra one by one,
+    see `PickleSurveyStore`, or in HDF5 with the params as a table and the spectra
+    pickled one by one into a chunked byte array, see `Hdf5SurveyStore`.
+
+    When loaded lazily, `spectra` is a `SurveySpectra` proxy that reads the
+    spectra from the file on demand and the file is kept open until `close`
+    is called.
     """
 
-    # TODO: Can we easily rewrite this to store spectra in HDF5. Spectra are not
-    #       supposed to be uniform here but we still can pickle one by one and
-    #       store as variable length binaries or jagged arrays or similar.
+    STORE_TYPES = {
+        'pickle': PickleSurveyStore,
+        'h5': Hdf5SurveyStore,
+    }
 
     def __init__(self, orig=None):
         super(Survey, self).__init__(orig=orig)
@@ -26,27 +35,46 @@ class Survey(PfsObject):
             self.params = None
             self.spectra = None
 
+    def create_store(self, format=None):
+        format = format or self.fileformat or 'pickle'
+        if format not in Survey.STORE_TYPES:
+            raise ValueError(f'Unsupported survey file format `{format}`.')
+        return Survey.STORE_TYPES[format]()
+
     def save(self, filename=None, format=None):
         self.filename = filename or self.filename
-        self.format = format or self.fileformat
+        self.fileformat = format or self.fileformat
 
-        with open(self.filename, 'wb') as f:
-            pickle.dump(self.params, f)
-            pickle.dump(self.spectra, f)
+        with self.create_store().open(self.filename, 'w') as store:
+            store.write_params(self.params)
+            for spec in self.spectra:
+                store.append(spec)
 
-    def load(self, filename=None):
+    def load(self, filename=None, format=None, lazy=False, cache_size=None):
         self.filename = filename or self.filename
         self.fileformat = format or self.fileformat
 
-        with open(self.filename, 'rb') as f:
-            self.params = pickle.load(f)
-            self.spectra = pickle.load(f)
+        self.close()
+        if lazy:
+            store = self.create_store().open(self.filename, 'r')
+            self.params = store.read_params()
+            self.spectra = SurveySpectra(store, cache_size=cache_size)
+        else:
+            with self.create_store().open(self.filename, 'r') as store:
+                self.params = store.read_params()
+                self.spectra = list(store.read_spectra())
 
         logger.info("Loaded survey with shapes:")
         logger.info("  spectra: {}".format(len(self.spectra)))
         logger.info("  params:  {}".format(self.params.shape))
         logger.info("  columns: {}".format(self.params.columns))
 
+    def close(self):
+        # Close the file of lazily loaded spectra
+        if isinstance(self.spectra, SurveySpectra):
+            self.spectra.close()
+            self.spectra = None
+
     def add_args(self, parser):
         pass
 
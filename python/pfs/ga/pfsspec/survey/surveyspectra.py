@@ -0,0 +1,74 @@
+from collections.abc import Sequence
+
+from .repo import LruCache
+
+class SurveySpectra(Sequence):
+    """
+    Implements a read-only, sequence-like proxy over the spectra of a survey
+    store that reads the spectra on demand.
+
+    Integer indexing and slicing only read the requested spectra from the
+    store. Recently accessed spectra are kept in a small LRU cache so that
+    repeated access doesn't have to decode them again.
+
+    Variables
+    ---------
+    store : SurveyStore
+        The survey store open for reading.
+    cache_size : int
+        Maximum number of decoded spectra kept in memory.
+    """
+
+    # Default number of decoded spectra kept in memory
+    CACHE_SIZE = 1024
+
+    def __init__(self, store, cache_size=None):
+        self.__store = store
+        self.__cache = LruCache(maxsize=cache_size if cache_size is not None else SurveySpectra.CACHE_SIZE)
+
+    #region Properties
+
+    def __get_store(self):
+        return self.__store
+
+    store = property(__get_store)
+
+    def __get_cache_size(self):
+        return self.__cache.maxsize
+
+    def __set_cache_size(self, value):
+        self.__cache.maxsize = value
+
+    cache_size = property(__get_cache_size, __set_cache_size)
+
+    #endregion
+
+    def __len__(self):
+        return len(self.__store)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [ self.__get_spectrum(i) for i in range(*key.indices(len(self))) ]
+
+        n = len(self)
+        i = key + n if key < 0 else key
+        if i < 0 or i >= n:
+            raise IndexError(f'Spectrum index {key} out of range.')
+
+        return self.__get_spectrum(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.__get_spectrum(i)
+
+    def __get_spectrum(self, i):
+        spec = self.__cache.get(i)
+        if spec is None:
+            spec = self.__store.read_spectrum(i)
+            if self.__cache.maxsize != 0:
+                self.__cache.set(i, spec)
+        return spec
+
+    def close(self):
+        self.__cache.clear()
+        self.__store.close()
@@ -0,0 +1,343 @@
+import os
+import pickle
+import threading
+import numpy as np
+
+from .setup_logger import logger
+
+class SurveyStore():
+    """
+    Implements incremental, on-disk storage of the spectra of a survey.
+
+    Spectra are appended one by one, in any order, as they are produced, so the
+    survey never has to fit in memory. Each spectrum is stored along with its
+    index and reading returns the spectra ordered by index, regardless of the
+    order they were written in.
+
+    Subclasses implement the file format by overriding the protected methods
+    `_open`, `_close`, `_write_params`, `_read_params`, `_write_record` and
+    `_read_record`.
+
+    Variables
+    ---------
+    filename : str
+        Path to the file.
+    mode : str
+        File mode, one of 'r', 'w' or 'a', or None if the store is closed.
+    """
+
+    def __init__(self, filename=None, orig=None):
+        if not isinstance(orig, SurveyStore):
+            self.__filename = filename
+        else:
+            self.__filename = filename if filename is not None else orig.__filename
+
+        self.__mode = None
+        self.__keys = None
+        self.__order = None
+        self.__lock = threading.RLock()
+
+    def __getstate__(self):
+        # Locks and open files cannot be sent to worker processes, copies of
+        # the store are closed
+        state = self.__dict__.copy()
+        state['_SurveyStore__mode'] = None
+        state['_SurveyStore__lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    #region Properties
+
+    def __get_filename(self):
+        return self.__filename
+
+    def __set_filename(self, value):
+        self.__filename = value
+
+    filename = property(__get_filename, __set_filename)
+
+    def __get_mode(self):
+        return self.__mode
+
+    mode = property(__get_mode)
+
+    def __get_is_open(self):
+        return self.__mode is not None
+
+    is_open = property(__get_is_open)
+
+    def __get_lock(self):
+        return self.__lock
+
+    lock = property(__get_lock)
+
+    #endregion
+
+    def __len__(self):
+        return len(self.__keys) if self.__keys is not None else 0
+
+    def open(self, filename=None, mode='r'):
+        """
+        Opens the store for reading ('r'), writing a new file ('w') or appending
+        to an existing file ('a').
+        """
+
+        if mode not in [ 'r', 'w', 'a' ]:
+            raise ValueError(f'Invalid file mode `{mode}`.')
+
+        with self.__lock:
+            if self.is_open:
+                self.close()
+
+            self.__filename = filename if filename is not None else self.__filename
+            if self.__filename is None:
+                raise ValueError('File name of the survey store is not set.')
+
+            if mode == 'w':
+                dir = os.path.dirname(self.__filename)
+                if dir != '' and not os.path.exists(dir):
+                    os.makedirs(dir, exist_ok=True)
+
+            keys = self._open(mode)
+            self.__mode = mode
+            self.__keys = list(keys) if keys is not None else []
+            self.__order = None
+
+        return self
+
+    def close(self):
+        with self.__lock:
+            if self.is_open:
+                self._close()
+                self.__mode = None
+
+    def __ensure_mode(self, *modes):
+        if self.__mode not in modes:
+            raise IOError(f'Survey store `{self.__filename}` is not open in mode {modes}.')
+
+    def __get_order(self):
+        # Record numbers sorted by the index of the spectra
+        if self.__order is None:
+            self.__order = np.argsort(np.array(self.__keys, dtype=np.int64), kind='stable')
+        return self.__order
+
+    def get_index(self):
+        """
+        Returns the index of the stored spectra, in sorted order.
+        """
+
+        with self.__lock:
+            return np.array(self.__keys, dtype=np.int64)[self.__get_order()]
+
+    #region Read
+
+    def read_params(self):
+        with self.__lock:
+            self.__ensure_mode('r', 'a')
+            return self._read_params()
+
+    def read_spectrum(self, i):
+        """
+        Reads the i-th spectrum, in the order of the spectrum index.
+        """
+
+        with self.__lock:
+            self.__ensure_mode('r', 'a')
+            return self._read_record(self.__get_order()[i])
+
+    def read_spectra(self, indexes=None):
+        """
+        Reads the spectra at the specified positions, or all spectra if `indexes`
+        is None, in the order of the spectrum index.
+
+        Returns
+        -------
+        generator
+            Generator of spectrum objects.
+        """
+
+        if indexes is None:
+            indexes = range(len(self))
+
+        for i in indexes:
+            yield self.read_spectrum(i)
+
+    #endregion
+    #region Write
+
+    def write_params(self, params):
+        with self.__lock:
+            self.__ensure_mode('w', 'a')
+            self._write_params(params)
+
+    def append(self, spec):
+        """
+        Appends a spectrum to the store. The spectrum is serialized immediately
+        and no reference is kept to it.
+        """
+
+        with self.__lock:
+            self.__ensure_mode('w', 'a')
+
+            index = getattr(spec, 'index', None)
+            index = index if index is not None else len(self.__keys)
+
+            self._write_record(index, spec)
+            self.__keys.append(int(index))
+            self.__order = None
+
+    #endregion
+    #region Format specific functions
+
+    def _open(self, mode):
+        """
+        Opens the file and returns the index of the records already in the file.
+        """
+        raise NotImplementedError()
+
+    def _close(self):
+        raise NotImplementedError()
+
+    def _write_params(self, params):
+        raise NotImplementedError()
+
+    def _read_params(self):
+        raise NotImplementedError()
+
+    def _write_record(self, index, spec):
+        raise NotImplementedError()
+
+    def _read_record(self, r):
+        raise NotImplementedError()
+
+    #endregion
+
+class PickleSurveyStore(SurveyStore):
+    """
+    Implements a survey store as a stream of pickled objects: the params first,
+    then the spectra one by one. Each spectrum is preceded by a small pickled
+    header with its index and the length of the pickled spectrum.
+
+    This is a sequential format. The file has to be scanned once when it is
+    opened for reading to find the spectra, but only the headers are read, the
+    spectra are skipped without unpickling them. Files written by earlier
+    versions, which store all spectra as a single pickled list, can also be read.
+    """
+
+    def __init__(self, filename=None, orig=None):
+        super().__init__(filename=filename, orig=orig)
+
+        self.__file = None
+        self.__params = None
+        self.__has_params = False
+        self.__offsets = None
+        self.__spectra = None
+        self.__end = None
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_PickleSurveyStore__file'] = None
+        state['_PickleSurveyStore__spectra'] = None
+        return state
+
+    def _open(self, mode):
+        self.__params = None
+        self.__has_params = False
+        self.__offsets = []
+        self.__spectra = None
+
+        keys = []
+        if mode == 'w':
+            self.__file = open(self.filename, 'wb')
+        else:
+            self.__file = open(self.filename, 'rb')
+            keys = self.__scan()
+
+            if mode == 'a':
+                if self.__spectra is not None:
+                    raise IOError(f'Cannot append to survey file `{self.filename}` in legacy format.')
+                self.__file.close()
+                self.__file = open(self.filename, 'r+b')
+                # Drop a partially written record so that new records follow the last complete one
+                self.__file.truncate(self.__end)
+
+        return keys
+
+    def __scan(self):
+        # Find the beginning of each record in the stream from the headers
+        keys = []
+        size = os.fstat(self.__file.fileno()).st_size
+        self.__end = 0
+        try:
+            self.__params = pickle.load(self.__file)
+            self.__has_params = True
+            while True:
+                self.__end = self.__file.tell()
+                header = pickle.load(self.__file)
+                if isinstance(header, list):
+                    # Legacy format with all spectra pickled as a list
+                    self.__spectra = header
+                    keys = [ getattr(s, 'index', None) for s in header ]
+                    keys = [ k if k is not None else i for i, k in enumerate(keys) ]
+                    self.__offsets = list(range(len(header)))
+                    break
+                else:
+                    index, length = header
+                    offset = self.__file.tell()
+                    if offset + length > size:
+                        # The last record was not written completely
+                        logger.warning(f'Truncated record at the end of survey file `{self.filename}`.')
+                        break
+                    keys.append(index)
+                    self.__offsets.append(offset)
+                    self.__file.seek(length, os.SEEK_CUR)
+        except EOFError:
+            pass
+        except pickle.UnpicklingError:
+            logger.warning(f'Truncated record at the end of survey file `{self.filename}`.')
+
+        logger.debug(f'Found {len(keys)} spectra in survey file `{self.filename}`.')
+
+        return keys
+
+    def _close(self):
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+        self.__spectra = None
+
+    def _write_params(self, params):
+        if self.__has_params:
+            raise IOError(f'The params of survey file `{self.filename}` are already written.')
+        pickle.dump(params, self.__file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.__params = params
+        self.__has_params = True
+
+    def _read_params(self):
+        return self.__params
+
+    def _write_record(self, index, spec):
+        # Params always come first in the stream
+        if not self.__has_params:
+            self._write_params(None)
+        data = pickle.dumps(spec, protocol=pickle.HIGHEST_PROTOCOL)
+        self.__file.seek(0, os.SEEK_END)
+        pickle.dump((int(index), len(data)), self.__file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.__offsets.append(self.__file.tell())
+        self.__file.write(data)
+
+    def _read_record(self, r):
+        if self.__spectra is not None:
+            return self.__spectra[r]
+        else:
+            self.__file.seek(self.__offsets[r])
+            return pickle.load(self.__file)
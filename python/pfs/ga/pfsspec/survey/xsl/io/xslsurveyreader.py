@@ -1,4 +1,5 @@
 import os, re
+import pickle
 from glob import glob
 import numpy as np
 import pandas as pd
@@ -6,18 +7,30 @@ from astropy import units as u
 from astropy.coordinates import SkyCoord, Angle
 from astropy.io import fits
 
+from pfs.ga.pfsspec.core.setup_logger import logger
+from pfs.ga.pfsspec.core.util import SmartParallel
 from ..xslsurvey import XslSurvey
 from ...io.surveyreader import SurveyReader
 from .xslspectrumreader import XslSpectrumReader
 
 class XslSurveyReader(SurveyReader):
+    # Name of the file, in the output directory, where the FITS headers are cached
+    HEADER_CACHE_FILE = 'fits_headers.pickle'
+
+    # Columns of the params table copied to the spectra
+    SPECTRUM_PARAMS = [ 'ra', 'dec', 'mjd',
+                        'Fe_H', 'Fe_H_err', 'T_eff', 'T_eff_err', 'log_g', 'log_g_err',
+                        'snr' ]
+
     def __init__(self, orig=None):
         super().__init__(orig=orig)
 
         if not isinstance(orig, XslSurveyReader):
             self.reader = None
+            self.header_cache = None
         else:
             self.reader = orig.reader
+            self.header_cache = orig.header_cache
 
     def add_args(self, parser):
         super().add_args(parser)
@@ -37,7 +50,6 @@ class XslSurveyReader(SurveyReader):
         super().open_data(args, indir, outdir)
 
         self.reader = self.create_spectrum_reader()
-        self.reader.path = indir
 
     def load_file_list(self):
         ff = glob(os.path.join(self.indir, 'fits/*.fits'))
@@ -52,24 +64,89 @@ class XslSurveyReader(SurveyReader):
         files = pd.DataFrame(files)
         return files
 
+    def get_header_cache_filename(self):
+        if self.header_cache is not None:
+            return self.header_cache
+        elif self.outdir is not None:
+            return os.path.join(self.outdir, XslSurveyReader.HEADER_CACHE_FILE)
+        else:
+            return None
+
+    def load_header_cache(self):
+        """
+        Load the cached FITS headers, keyed by file name. Each entry is a tuple
+        of the modification time of the file and the header keywords.
+        """
+
+        fn = self.get_header_cache_filename()
+        if fn is not None and os.path.isfile(fn):
+            try:
+                with open(fn, 'rb') as f:
+                    return pickle.load(f)
+            except Exception as ex:
+                logger.warning(f'Cannot read FITS header cache `{fn}`: {ex}')
+
+        return {}
+
+    def save_header_cache(self, headers):
+        fn = self.get_header_cache_filename()
+        if fn is not None:
+            try:
+                # Write to a temporary file first so that an interrupted run
+                # doesn't leave a corrupt cache behind
+                os.makedirs(os.path.dirname(fn) or '.', exist_ok=True)
+                with open(fn + '.tmp', 'wb') as f:
+                    pickle.dump(headers, f)
+                os.replace(fn + '.tmp', fn)
+            except Exception as ex:
+                logger.warning(f'Cannot write FITS header cache `{fn}`: {ex}')
+
+    def read_fits_header(self, filename):
+        # Only the primary header is read, the data are never touched
+        header = fits.getheader(filename, 0)
+        headers = { k: header[k] for k in header.keys() }
+        return os.path.basename(filename), os.stat(filename).st_mtime_ns, headers
+
+    def read_fits_header_error(self, ex, filename):
+        raise ex
+
     def load_fits_headers(self):
         """
         Read all FITS headers
+
+        The primary headers of the files are read in parallel and cached by file
+        name and modification time so that subsequent runs only read new or
+        modified files.
         """
 
-        ff = glob(os.path.join(self.indir, 'fits/*.fits'))
-        fitsdata = None
+        ff = sorted(glob(os.path.join(self.indir, 'fits/*.fits')))
 
+        cache = self.load_header_cache()
+        headers = {}
+        scan = []
         for f in ff:
-            hdus = fits.open(f, memmap=False)
-            headers = { k: hdus[0].header[k] for k in hdus[0].header.keys() }
-            headers['filename'] = os.path.split(f)[1]
-            
-            if fitsdata is None:
-                fitsdata = pd.DataFrame(headers, index=['XSL_ID'])
+            fn = os.path.basename(f)
+            c = cache.get(fn)
+            if c is not None and c[0] == os.stat(f).st_mtime_ns:
+                headers[fn] = c
             else:
-                fitsdata = fitsdata.append(headers, ignore_index=True)
-
+                scan.append(f)
+
+        if len(scan) > 0:
+            logger.info(f'Reading the headers of {len(scan)} FITS files, {len(headers)} are cached.')
+            with SmartParallel(verbose=self.verbose, parallel=self.parallel, threads=self.threads) as p:
+                for fn, mtime, h in p.map(self.read_fits_header, self.read_fits_header_error, scan):
+                    headers[fn] = (mtime, h)
+            self.save_header_cache(headers)
+
+        # Build the table at once, in the order of the file names
+        rows = []
+        for fn in sorted(headers.keys()):
+            row = dict(headers[fn][1])
+            row['filename'] = fn
+            rows.append(row)
+
+        fitsdata = pd.DataFrame(rows)
         fitsdata['xsl_id'] = fitsdata['XSL_ID'].map(lambda x: int(re.search('(\d+)', x).group(0)))
 
         return fitsdata
@@ -154,38 +231,20 @@ class XslSurveyReader(SurveyReader):
 
         return params
 
-    def load_survey(self, params):
-        reader = self.create_spectrum_reader()
-        survey = self.create_survey()
-        survey.params = params
-        survey.spectra = []
-
-        for index, row in survey.params.iterrows():
-            spec = reader.load_spectrum(row['filename'])
-            spec.ra = row['ra']
-            spec.dec = row['dec']
-            spec.mjd = row['mjd']
-
-            spec.Fe_H = row['Fe_H']
-            spec.Fe_H_err = row['Fe_H_err']
-            spec.T_eff = row['T_eff']
-            spec.T_eff_err = row['T_eff_err']
-            spec.log_g = row['log_g']
-            spec.log_g_err = row['log_g_err']
-
-            spec.snr = row['snr']
-
-            survey.spectra.append(spec)
-
-        return survey
+    def load_spectrum(self, index, row):
+        spec = self.reader.load_spectrum(row['filename'])
+        spec.index = index
+        for k in XslSurveyReader.SPECTRUM_PARAMS:
+            setattr(spec, k, row[k])
+        return spec
 
     def run(self):
         files = self.load_file_list()
         fitsdata = self.load_fits_headers()
         table, tablea1 = self.load_params()
         params = self.join_params(files, fitsdata, table, tablea1)
-        survey = self.load_survey(params)
-        return survey
+        self.load_survey(params)
+        return self.survey
 
     def execute_notebooks(self, script):
         super().execute_notebooks(script)
\ No newline at end of file
@@ -0,0 +1,96 @@
+import os
+import hashlib
+import tempfile
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from unittest import TestCase
+
+from pfs.ga.pfsspec.survey.io.bulkdownloader import BulkDownloader
+
+class FlakyHandler(SimpleHTTPRequestHandler):
+    # Fail the first request to each file to test retries
+    failed = set()
+
+    def do_GET(self):
+        if self.path.startswith('/flaky/') and self.path not in FlakyHandler.failed:
+            FlakyHandler.failed.add(self.path)
+            self.send_error(503)
+        else:
+            super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+class TestBulkDownloader(TestCase):
+    def setUp(self):
+        self.srcdir = tempfile.TemporaryDirectory()
+        self.outdir = tempfile.TemporaryDirectory()
+
+        self.files = {}
+        for i in range(5):
+            data = os.urandom(1000 + i)
+            for dir in [ 'data', 'flaky' ]:
+                os.makedirs(os.path.join(self.srcdir.name, dir), exist_ok=True)
+                with open(os.path.join(self.srcdir.name, dir, f'file{i}.bin'), 'wb') as f:
+                    f.write(data)
+            self.files[f'file{i}.bin'] = data
+
+        handler = partial(FlakyHandler, directory=self.srcdir.name)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.srcdir.cleanup()
+        self.outdir.cleanup()
+
+    def get_items(self, dir='data'):
+        return [ {
+                    'url': f'{self.url}/{dir}/{fn}',
+                    'path': f'{dir}/{fn}',
+                    'size': len(data),
+                    'sha256': hashlib.sha256(data).hexdigest()
+                 } for fn, data in self.files.items() ]
+
+    def test_download_many(self):
+        with BulkDownloader(outdir=self.outdir.name, threads=3, backoff=0) as downloader:
+            res = downloader.download_many(self.get_items())
+        self.assertTrue(all(r.downloaded for r in res))
+
+        for fn, data in self.files.items():
+            with open(os.path.join(self.outdir.name, 'data', fn), 'rb') as f:
+                self.assertEqual(data, f.read())
+
+        # A new downloader skips the files listed in the manifest
+        with BulkDownloader(outdir=self.outdir.name, threads=3, backoff=0) as downloader:
+            res = downloader.download_many(self.get_items())
+        self.assertFalse(any(r.downloaded for r in res))
+
+    def test_download_retry(self):
+        with BulkDownloader(outdir=self.outdir.name, threads=2, backoff=0) as downloader:
+            res = downloader.download_many(self.get_items('flaky'))
+        self.assertTrue(all(r.downloaded for r in res))
+
+    def test_download_checksum(self):
+        item = self.get_items()[0]
+        with BulkDownloader(outdir=self.outdir.name, retries=1, backoff=0) as downloader:
+            with self.assertRaises(IOError):
+                downloader.download(item['url'], item['path'], sha256='0' * 64)
+        self.assertFalse(os.path.exists(os.path.join(self.outdir.name, item['path'])))
+
+    def test_download_resume(self):
+        item = self.get_items()[1]
+        data = self.files['file1.bin']
+        os.makedirs(os.path.join(self.outdir.name, 'data'))
+        with open(os.path.join(self.outdir.name, item['path'] + '.part'), 'wb') as f:
+            f.write(data[:100])
+
+        with BulkDownloader(outdir=self.outdir.name, backoff=0) as downloader:
+            downloader.download(item['url'], item['path'], size=item['size'], sha256=item['sha256'])
+
+        with open(os.path.join(self.outdir.name, item['path']), 'rb') as f:
+            self.assertEqual(data, f.read())
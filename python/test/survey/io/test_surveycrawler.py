@@ -0,0 +1,65 @@
+import os
+import tempfile
+import urllib.parse
+import threading
+from functools import partial
+from types import SimpleNamespace
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from unittest import TestCase
+
+from pfs.ga.pfsspec.survey.io.bulkdownloader import BulkDownloader
+from pfs.ga.pfsspec.survey.io.surveycrawler import SurveyCrawler
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+class TestSurveyCrawler(TestCase):
+    def setUp(self):
+        self.srcdir = tempfile.TemporaryDirectory()
+        self.outdir = tempfile.TemporaryDirectory()
+
+        self.files = []
+        for tract in [ 1, 2, 3 ]:
+            for patch in [ '0,0', '1,1' ]:
+                dir = os.path.join(self.srcdir.name, f'{tract:05d}', patch)
+                os.makedirs(dir)
+                for i in range(3):
+                    fn = f'{tract:05d}/{patch}/file-{i}.fits'
+                    with open(os.path.join(self.srcdir.name, fn), 'wb') as f:
+                        f.write(os.urandom(100))
+                    self.files.append(fn)
+
+        handler = partial(QuietHandler, directory=self.srcdir.name)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.srcdir.cleanup()
+        self.outdir.cleanup()
+
+    def visit(self, listing, hrefs):
+        # Descend into directories except tract 3, download the files
+        listings, files = [], []
+        for href in hrefs:
+            if href.endswith('/') and href != '00003/':
+                listings.append(SimpleNamespace(url=listing.url + href, path=listing.path + urllib.parse.unquote(href)))
+            elif href.endswith('.fits'):
+                files.append({ 'url': listing.url + href, 'path': listing.path + urllib.parse.unquote(href) })
+        return listings, files
+
+    def test_run(self):
+        with BulkDownloader(outdir=self.outdir.name, backoff=0) as downloader:
+            crawler = SurveyCrawler(downloader, self.visit, concurrency=4, list_workers=2, queue_size=2)
+            stats = crawler.run([ SimpleNamespace(url=self.url, path='') ])
+
+        self.assertEqual(7, stats.listings)
+        self.assertEqual(12, stats.files)
+        self.assertEqual(12, stats.downloaded)
+        self.assertEqual(0, len(stats.errors))
+        for fn in self.files:
+            self.assertEqual(not fn.startswith('00003'), os.path.isfile(os.path.join(self.outdir.name, fn)))
@@ -0,0 +1,67 @@
+import time
+from unittest import TestCase
+
+from pfs.ga.pfsspec.survey.io.surveypipeline import SurveyPipeline
+
+class TestSurveyPipeline(TestCase):
+    def test_run(self):
+        pipeline = SurveyPipeline(fetch_workers=4, decode_workers=2, queue_size=3)
+        results = []
+
+        def fetch(i):
+            if i == 13:
+                raise IOError('Missing file')
+            return i * 10
+
+        def decode(i, data):
+            # Odd items are skipped
+            return None if i % 2 == 1 else (i, data + 1)
+
+        stats = pipeline.run(range(100), fetch, decode, results.append)
+
+        self.assertEqual(100, stats.items)
+        self.assertEqual(50, stats.written)
+        self.assertEqual(1, len(stats.errors))
+        self.assertEqual([ (i, i * 10 + 1) for i in range(0, 100, 2) ], sorted(results))
+
+    def test_run_backpressure(self):
+        pipeline = SurveyPipeline(fetch_workers=2, decode_workers=2, queue_size=2)
+        produced = []
+        written = []
+        inflight = []
+
+        def items():
+            for i in range(20):
+                produced.append(i)
+                yield i
+
+        def write(i):
+            # Slow writer, upstream stages can only get a few items ahead
+            inflight.append(len(produced) - len(written))
+            written.append(i)
+            time.sleep(0.01)
+
+        pipeline.run(items(), lambda i: None, lambda i, data: i, write)
+
+        # Three queues, one item held by each worker and one by the producer
+        self.assertLessEqual(max(inflight), 3 * 2 + 2 + 2 + 2)
+
+    def test_run_write_error(self):
+        pipeline = SurveyPipeline(fetch_workers=2, decode_workers=2, queue_size=2)
+
+        def write(i):
+            if i == 5:
+                raise ValueError('Disk full')
+
+        with self.assertRaises(ValueError):
+            pipeline.run(range(1000), lambda i: None, lambda i, data: i, write)
+
+    def test_run_producer_error(self):
+        pipeline = SurveyPipeline(fetch_workers=2, decode_workers=2, queue_size=2)
+
+        def items():
+            yield 0
+            raise IOError('Query failed')
+
+        with self.assertRaises(IOError):
+            pipeline.run(items(), lambda i: None, lambda i, data: i, lambda i: None)
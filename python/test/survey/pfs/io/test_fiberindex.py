@@ -0,0 +1,56 @@
+from unittest import TestCase
+import numpy as np
+
+from pfs.ga.pfsspec.survey.pfs.io import FiberIndex
+
+class Product():
+    def __init__(self, fiberId):
+        self.fiberId = fiberId
+
+class TestFiberIndex(TestCase):
+    def test_get_index(self):
+        fiberId = np.array([ 5, 3, 9, 3, 1 ])
+        index = FiberIndex(fiberId)
+
+        self.assertEqual(1, index.get_index(3))
+        self.assertEqual(1, index.get_index(np.int32(3)))
+        self.assertEqual([ 2, 4, 1 ], index.get_index([ 9, 1, 3 ]).tolist())
+        self.assertEqual([ 0, -1 ], index.get_index([ 5, 7 ], required=False).tolist())
+        self.assertEqual(-1, index.get_index(7, required=False))
+        self.assertIn(9, index)
+        self.assertNotIn(7, index)
+
+        with self.assertRaises(KeyError):
+            index.get_index([ 5, 7 ])
+
+        with self.assertRaises(KeyError):
+            index.get_index(7)
+
+    def test_from_product(self):
+        data = Product(np.arange(10)[::-1])
+        index = FiberIndex.from_product(data, 'fiberId')
+        self.assertIs(index, FiberIndex.from_product(data, 'fiberId'))
+        self.assertEqual(9, index.get_index(0))
+
+    def test_from_pfsConfig(self):
+        pfsConfig = Product(np.arange(10))
+        pfsConfig.pfsDesignId = 0x6d832ca291636984
+        pfsConfig.visit = 111483
+        pfsConfig.objId = np.arange(10) + 100
+
+        index = FiberIndex.from_pfsConfig(pfsConfig, 'objId')
+        self.assertEqual(3, index.get_index(103))
+
+        # The same design and visit reuses the index
+        other = Product(np.arange(10))
+        other.pfsDesignId = pfsConfig.pfsDesignId
+        other.visit = pfsConfig.visit
+        other.objId = pfsConfig.objId.copy()
+        self.assertIs(index, FiberIndex.from_pfsConfig(other, 'objId'))
+
+        # Selected or reordered fibers of the same length get a new index
+        other = Product(np.arange(10))
+        other.pfsDesignId = pfsConfig.pfsDesignId
+        other.visit = pfsConfig.visit
+        other.objId = pfsConfig.objId[::-1]
+        self.assertEqual(6, FiberIndex.from_pfsConfig(other, 'objId').get_index(103))
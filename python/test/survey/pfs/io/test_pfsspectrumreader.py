@@ -41,6 +41,20 @@ class TestPfsSpectrumReader(TestBase):
         self.assertEqual(s.target.objId, 23870)
         self.assertEqual(s.observations.num, 1)
 
+    def test_read_many_from_pfsConfig(self):
+        filename = '/datascope/subaru/data/commissioning/gen2/pfsConfig/2024-06-01/pfsConfig-0x6d832ca291636984-111483.fits'
+        dir = os.path.dirname(filename)
+        pfsConfig = PfsConfig.read(0x6d832ca291636984, 111483, dirName=dir)
+
+        r = PfsSpectrumReader()
+        specs = r.read_many_from_pfsConfig(pfsConfig, [ PfsStellarSpectrum(), PfsStellarSpectrum() ], indices=[1945, 1946])
+        self.assertEqual(23870, specs[1].id)
+        self.assertEqual(10015, specs[1].target.catId)
+
+        s = PfsStellarSpectrum()
+        r.read_from_pfsConfig(pfsConfig, s, objid=23870)
+        self.assertEqual(specs[1].fiberid, s.fiberid)
+
     def test_read_from_pfsFiberArraySet(self):
         filename = '/datascope/subaru/data/commissioning/gen2/rerun/run17/20240604/pfsMerged/2024-06-02/v111637/pfsMerged-111637.fits'
         pfsMerged = PfsMerged.readFits(filename)
@@ -48,6 +62,30 @@ class TestPfsSpectrumReader(TestBase):
         r = PfsSpectrumReader()
         s = PfsStellarSpectrum()
         r.read_from_pfsFiberArraySet(pfsMerged, s, index=1946, wave_limits=[4000, 6000])
+        self.assertFalse(np.shares_memory(s.flux, pfsMerged.flux))
+
+        # Zero-copy mode returns views into the arrays of the product
+        z = PfsStellarSpectrum()
+        r.read_from_pfsFiberArraySet(pfsMerged, z, index=1946, wave_limits=[4000, 6000], copy=False)
+        self.assertTrue(np.shares_memory(z.flux, pfsMerged.flux))
+        self.assertTrue(np.array_equal(s.wave, z.wave))
+        self.assertTrue(np.array_equal(s.mask, z.mask))
+
+    def test_read_many_from_pfsFiberArraySet(self):
+        filename = '/datascope/subaru/data/commissioning/gen2/rerun/run17/20240604/pfsMerged/2024-06-02/v111637/pfsMerged-111637.fits'
+        pfsMerged = PfsMerged.readFits(filename)
+
+        r = PfsSpectrumReader()
+        block = r.read_block_from_pfsFiberArraySet(pfsMerged, indices=[1945, 1946], wave_limits=[4000, 6000])
+        self.assertEqual((2, block.wave.shape[1]), block.flux.shape)
+
+        s = PfsStellarSpectrum()
+        r.read_from_pfsFiberArraySet(pfsMerged, s, index=1946, wave_limits=[4000, 6000])
+
+        specs = r.read_many_from_pfsFiberArraySet(pfsMerged, [ PfsStellarSpectrum(), PfsStellarSpectrum() ],
+                                                  fiberids=pfsMerged.fiberId[[1945, 1946]], wave_limits=[4000, 6000])
+        self.assertTrue(np.array_equal(s.wave, specs[1].wave))
+        self.assertTrue(np.array_equal(s.mask, specs[1].mask))
 
     def test_read_from_both(self):
         filename = '/datascope/subaru/data/commissioning/gen2/pfsConfig/2024-06-01/pfsConfig-0x6d832ca291636984-111483.fits'
@@ -0,0 +1,149 @@
+import os
+import tempfile
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from unittest import TestCase
+
+from pfs.ga.pfsspec.survey.pfs.io import PfsSurveyDownloader
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+class TestPfsSurveyDownloader(TestCase):
+    def setUp(self):
+        self.srcdir = tempfile.TemporaryDirectory()
+        self.outdir = tempfile.TemporaryDirectory()
+
+        # Directory tree of the rerun: catalog, tract, patch
+        self.files = []
+        for tract in [ 1, 2 ]:
+            for patch in [ '0,0', '1,1' ]:
+                dir = f'pfsSingle/10015/{tract:05d}/{patch}'
+                os.makedirs(os.path.join(self.srcdir.name, 'rerun', dir))
+                for objId, visit in [ (0x5d3e, 111483), (0x5d3f, 111484) ]:
+                    fn = f'{dir}/pfsSingle-10015-{tract:05d}-{patch}-{objId:016x}-{visit:06d}.fits'
+                    with open(os.path.join(self.srcdir.name, 'rerun', fn), 'wb') as f:
+                        f.write(os.urandom(100))
+                    self.files.append(fn)
+
+        handler = partial(QuietHandler, directory=self.srcdir.name)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.srcdir.cleanup()
+        self.outdir.cleanup()
+
+    def get_downloader(self, catId=None, tract=None, patch=None, objId=None, visit=None):
+        downloader = PfsSurveyDownloader()
+        downloader.base_url = self.url
+        downloader.rerun_dir = 'rerun'
+        downloader.outdir = self.outdir.name
+        downloader.threads = 4
+        downloader.parallel = True
+        downloader.resume = False
+        downloader.max_retries = 0
+
+        for k, v in [ ('catId', catId), ('tract', tract), ('patch', patch), ('objId', objId), ('visit', visit) ]:
+            if v is not None:
+                getattr(downloader, k).parse(v)
+
+        return downloader
+
+    def get_downloaded(self):
+        return sorted(os.path.relpath(os.path.join(dir, f), self.outdir.name)
+                      for dir, _, files in os.walk(self.outdir.name)
+                      for f in files if f.endswith('.fits'))
+
+    def get_listing(self):
+        return [
+            'pfsSingle-10015-00001-1%2C1-0000000000005d3e-111483.fits',
+            'pfsSingle-10015-00001-1%2C1-0000000000005d3f-111484.fits',
+            'pfsSingle-10015-00002-0%2C0-00000000000000ff-111483.fits',
+            'pfsSingle-10016-00002-2%2C1-0000000000005d3e-111485.fits',
+            '../',
+            'notes.txt',
+        ]
+
+    def test_parse_pfsSingle_list(self):
+        downloader = self.get_downloader()
+
+        ids = downloader.parse_pfsSingle_list([])
+        self.assertEqual([ 'catId', 'tract', 'patch', 'objId', 'visit' ], list(ids.keys()))
+        self.assertTrue(all(v.shape == (0,) for v in ids.values()))
+
+        ids = downloader.parse_pfsSingle_list([ self.url + '/rerun/' + f for f in self.get_listing() ])
+        self.assertEqual([ 10015, 10015, 10015, 10016 ], ids['catId'].tolist())
+        self.assertEqual([ 1, 1, 2, 2 ], ids['tract'].tolist())
+        self.assertEqual([ '1,1', '1,1', '0,0', '2,1' ], ids['patch'].tolist())
+        self.assertEqual([ 0x5d3e, 0x5d3f, 0xff, 0x5d3e ], ids['objId'].tolist())
+        self.assertEqual([ 111483, 111484, 111483, 111485 ], ids['visit'].tolist())
+
+    def test_filter_pfsSingle_list(self):
+        downloader = self.get_downloader()
+        ids = downloader.parse_pfsSingle_list(self.get_listing())
+
+        def filter(catId=None, tract=None, patch=None, objId=None, visit=None):
+            res = downloader.filter_pfsSingle_list(ids, catId, tract, patch, objId, visit)
+            return res['objId'].tolist(), res['visit'].tolist()
+
+        # No filters
+        self.assertEqual(([ 0x5d3e, 0x5d3f, 0xff, 0x5d3e ], [ 111483, 111484, 111483, 111485 ]), filter())
+
+        # Values and lists of values
+        self.assertEqual(([ 0x5d3e ], [ 111485 ]), filter(catId=10016))
+        self.assertEqual(([ 0x5d3e, 0x5d3e ], [ 111483, 111485 ]), filter(objId=0x5d3e))
+        self.assertEqual(([ 0x5d3f, 0xff ], [ 111484, 111483 ]), filter(visit=[ 111484, 111483 ], objId=[ 0x5d3f, 0xff ]))
+
+        # Ranges given as search filters
+        visit = downloader.visit.copy()
+        visit.parse([ '111484-111485' ])
+        self.assertEqual(([ 0x5d3f, 0x5d3e ], [ 111484, 111485 ]), filter(visit=visit))
+        objId = downloader.objId.copy()
+        objId.parse([ '5d00-5dff' ])
+        self.assertEqual(([ 0x5d3f ], [ 111484 ]), filter(objId=objId, tract=1, visit=111484))
+
+        # Wildcard patch
+        patch = downloader.patch.copy()
+        patch.parse([ '*,1' ])
+        self.assertEqual(([ 0x5d3e, 0x5d3f, 0x5d3e ], [ 111483, 111484, 111485 ]), filter(patch=patch))
+
+        # Nothing matches
+        self.assertEqual(([], []), filter(catId=10017))
+
+    def test_get_pfsSingle_roots(self):
+        roots = self.get_downloader(catId=[ '10015' ]).get_pfsSingle_roots()
+        self.assertEqual([ (10015, None, None) ], [ (r.catId, r.tract, r.patch) for r in roots ])
+        self.assertTrue(roots[0].url.endswith('/rerun/pfsSingle/10015/'))
+
+        # Short ranges of tracts are expanded, patches with wildcards are listed
+        roots = self.get_downloader(catId=[ '10015' ], tract=[ '1-2' ], patch=[ '1,*' ]).get_pfsSingle_roots()
+        self.assertEqual([ (10015, 1, None), (10015, 2, None) ], [ (r.catId, r.tract, r.patch) for r in roots ])
+
+        roots = self.get_downloader(catId=[ '10015' ], tract=[ '2' ], patch=[ '1,1' ]).get_pfsSingle_roots()
+        self.assertEqual(1, len(roots))
+        self.assertTrue(roots[0].url.endswith('/rerun/pfsSingle/10015/00002/1,1/'))
+
+    def test_run(self):
+        stats = self.get_downloader(catId=[ '10015' ]).run()
+        self.assertEqual(7, stats.listings)
+        self.assertEqual(8, stats.downloaded)
+        self.assertEqual(sorted(self.files), self.get_downloaded())
+
+    def test_run_filters(self):
+        stats = self.get_downloader(catId=[ '10015' ], tract=[ '2' ], patch=[ '1,*' ], objId=[ '5d3f' ]).run()
+        self.assertEqual(2, stats.listings)
+        self.assertEqual([ 'pfsSingle/10015/00002/1,1/pfsSingle-10015-00002-1,1-0000000000005d3f-111484.fits' ],
+                         self.get_downloaded())
+
+    def test_run_errors(self):
+        # Listing of a missing catalog fails and the error is reported
+        with self.assertRaises(IOError):
+            self.get_downloader(catId=[ '10015', '10016' ]).run()
+        self.assertEqual(sorted(self.files), self.get_downloaded())
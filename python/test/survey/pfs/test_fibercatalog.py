@@ -0,0 +1,100 @@
+import os
+import tempfile
+from datetime import date
+from types import SimpleNamespace
+from unittest import TestCase
+import numpy as np
+
+from pfs.ga.pfsspec.survey.repo import IntFilter, DateFilter, StringFilter
+from pfs.ga.pfsspec.survey.pfs import PfsFiberCatalog
+
+class TestPfsFiberCatalog(TestCase):
+
+    def get_test_config(self, visit, n=10):
+        return SimpleNamespace(
+            visit = visit,
+            pfsDesignId = 0x6d832ca291636984,
+            obstime = '2024-06-01T10:00:00',
+            arms = 'brn',
+            fiberId = np.arange(1, n + 1, dtype=np.int32),
+            spectrograph = np.full(n, 1, dtype=np.int32),
+            fiberStatus = np.full(n, 1, dtype=np.int32),
+            proposalId = np.array(n * ['S24A-001']),
+            catId = np.where(np.arange(n) % 2 == 0, 10088, 1).astype(np.int32),
+            objId = np.arange(n, dtype=np.int64) + 1000,
+            tract = np.zeros(n, dtype=np.int32),
+            patch = np.array(n * ['0,0']),
+            targetType = np.full(n, 1, dtype=np.int32),
+            obCode = np.array([ f'ob_{i}' for i in range(n) ]),
+            ra = np.linspace(10, 11, n),
+            dec = np.linspace(-1, 1, n),
+        )
+
+    def test_append_query(self):
+        with tempfile.TemporaryDirectory() as root:
+            filename = os.path.join(root, 'catalog.h5')
+
+            catalog = PfsFiberCatalog(filename)
+            self.assertEqual(0, len(catalog))
+
+            configs = { v: self.get_test_config(v) for v in [ 120001, 120002 ] }
+            dates = { 120001: date(2024, 6, 1), 120002: date(2024, 6, 2) }
+            self.assertEqual(2, catalog.append(configs, dates=dates))
+            self.assertEqual(0, catalog.append(configs, dates=dates))
+            self.assertEqual(1, catalog.append({ 120003: self.get_test_config(120003) }))
+            self.assertEqual(30, len(catalog))
+
+            # Reopen the catalog from the file
+            catalog = PfsFiberCatalog(filename)
+            self.assertEqual(30, len(catalog))
+            self.assertTrue(catalog.has_visit(120003))
+
+            ids = catalog.query()
+            self.assertEqual([ 120001, 120002, 120003 ], list(ids.keys()))
+            self.assertEqual('S24A-001', ids[120001].proposalId[0])
+
+            ids = catalog.query(date=DateFilter(date(2024, 6, 2), name='date'))
+            self.assertEqual([ 120002 ], list(ids.keys()))
+
+            ids = catalog.query(visit=IntFilter((120002, 120003), name='visit'),
+                                object_filters=SimpleNamespace(
+                                    catId = IntFilter(10088, name='catId'),
+                                    obCode = StringFilter('ob_[02]', name='obCode')))
+            self.assertEqual([ 120002, 120003 ], list(ids.keys()))
+            self.assertEqual([ 1, 3 ], ids[120002].fiberId.tolist())
+            self.assertEqual([ 120002, 120002 ], ids[120002].visit.tolist())
+            self.assertEqual(0x6d832ca291636984, ids[120002].pfsDesignId[0])
+
+            ids = catalog.query(cone=(10.0, -1.0, 0.01))
+            self.assertEqual([ 1 ], ids[120001].fiberId.tolist())
+
+            ids = catalog.query(box=(10.5, 11.5, 0.0, 2.0))
+            self.assertEqual([ 6, 7, 8, 9, 10 ], ids[120003].fiberId.tolist())
+
+    def test_append_runs(self):
+        with tempfile.TemporaryDirectory() as root:
+            filename = os.path.join(root, 'catalog.h5')
+
+            catalog = PfsFiberCatalog(filename)
+            self.assertEqual(1, catalog.append({ 120001: self.get_test_config(120001, n=10) }, runs={ 120001: 'runA' }))
+            self.assertEqual(1, catalog.append({ 120001: self.get_test_config(120001, n=5) }, runs={ 120001: 'runB' }))
+            self.assertEqual(0, catalog.append({ 120001: self.get_test_config(120001, n=5) }, runs={ 120001: 'runB' }))
+
+            catalog = PfsFiberCatalog(filename)
+            self.assertTrue(catalog.has_visit(120001))
+            self.assertTrue(catalog.has_visit(120001, 'runA'))
+            self.assertTrue(catalog.has_visit(120001, 'runB'))
+            self.assertFalse(catalog.has_visit(120001, 'runC'))
+
+            ids = catalog.query(run=StringFilter('runA', name='run'))
+            self.assertEqual(10, len(ids[120001].fiberId))
+
+            ids = catalog.query(run=StringFilter('runB', name='run'))
+            self.assertEqual(5, len(ids[120001].fiberId))
+
+            # Without a run filter, the run added last wins
+            ids = catalog.query()
+            self.assertEqual(5, len(ids[120001].fiberId))
+
+            ids = catalog.query(run=StringFilter('runC', name='run'))
+            self.assertEqual({}, ids)
@@ -1,9 +1,12 @@
+import os
+import tempfile
 from unittest import TestCase
 from types import SimpleNamespace
+import numpy as np
 
 from pfs.ga.pfsspec.survey.pfs.datamodel import *
 from pfs.ga.pfsspec.survey.repo import FileSystemRepo
-from pfs.ga.pfsspec.survey.pfs import PfsGen3Repo, PfsGen3FileSystemConfig
+from pfs.ga.pfsspec.survey.pfs import PfsGen3Repo, PfsGen3FileSystemConfig, PfsFiberCatalog
 
 class TestPfsGen3Repo_FileSystem(TestCase):
 
@@ -76,4 +79,79 @@ class TestPfsGen3Repo_FileSystem(TestCase):
 
         # Get observations of a specific object
         ids = repo.find_objects(visit=[(120001, 120008)], objId=154931150335344425)
-        pass
\ No newline at end of file
+
+        # Group the observations by object
+        ids = repo.find_objects(visit=[(120001, 120008)], catId=10088, groupby='objid')
+        grouped = repo.find_objects(visit=[(120001, 120008)], catId=10088, groupby='objid_offsets')
+        self.assertEqual(len(ids), len(grouped.objId))
+        self.assertEqual(grouped.count.sum(), len(grouped.ids.objId))
+        pass
+
+    def get_test_config(self, visit, objId):
+        n = len(objId)
+        return SimpleNamespace(
+            visit = visit,
+            pfsDesignId = 0x6d832ca291636984,
+            obstime = '2024-06-01T10:00:00',
+            arms = 'brn',
+            fiberId = np.arange(1, n + 1, dtype=np.int32),
+            spectrograph = np.full(n, 1, dtype=np.int32),
+            fiberStatus = np.full(n, 1, dtype=np.int32),
+            proposalId = np.array(n * ['S24A-001']),
+            catId = np.full(n, 10088, dtype=np.int32),
+            objId = np.array(objId, dtype=np.int64),
+            tract = np.zeros(n, dtype=np.int32),
+            patch = np.array(n * ['0,0']),
+            targetType = np.full(n, 1, dtype=np.int32),
+            obCode = np.array([ f'ob_{i}' for i in range(n) ]),
+            ra = np.linspace(10, 11, n),
+            dec = np.linspace(-1, 1, n),
+        )
+
+    def test_find_objects_groupby_objid(self):
+        repo = self.get_test_repo()
+        pfs_configs = {
+            120001: self.get_test_config(120001, [ 30, -1, 10, 20 ]),
+            120002: self.get_test_config(120002, [ 20, 40, 30 ]),
+        }
+
+        # Objects are returned in the order of their first appearance
+        ids = repo.find_objects(pfs_configs=pfs_configs, groupby='objid')
+        self.assertEqual([ 30, 10, 20, 40 ], list(ids.keys()))
+        self.assertEqual([ 120001, 120002 ], ids[30].visit.tolist())
+        self.assertEqual([ 1, 3 ], ids[30].fiberId.tolist())
+        self.assertEqual([ 120002 ], ids[40].visit.tolist())
+
+        grouped = repo.find_objects(pfs_configs=pfs_configs, groupby='objid_offsets')
+        self.assertEqual([ 30, 10, 20, 40 ], grouped.objId.tolist())
+        self.assertEqual([ 0, 2, 3, 5 ], grouped.offset.tolist())
+        self.assertEqual([ 2, 1, 2, 1 ], grouped.count.tolist())
+        self.assertEqual([ 30, 30, 10, 20, 20, 40 ], grouped.ids.objId.tolist())
+
+    def test_find_objects_missing_visit(self):
+        with tempfile.TemporaryDirectory() as root:
+            repo = PfsGen3Repo(repo_type=FileSystemRepo, config=PfsGen3FileSystemConfig,
+                               fiber_catalog=os.path.join(root, 'catalog.h5'))
+
+            catalog = PfsFiberCatalog(repo.fiber_catalog)
+            catalog.append({ 120001: self.get_test_config(120001, [ 10, 20 ]) })
+
+            # Record the visits the catalog is updated with instead of reading PfsConfig files
+            updated = []
+            def update_fiber_catalog(visit=None, date=None, run=None):
+                updated.append(list(visit.values))
+                repo._PfsGen3Repo__get_catalog().append({ v: self.get_test_config(v, [ 30 ]) for v in visit.values if v != 120003 })
+            repo.update_fiber_catalog = update_fiber_catalog
+
+            ids = repo.find_objects(visit=[ 120001 ])
+            self.assertEqual([], updated)
+            self.assertEqual([ 120001 ], list(ids.keys()))
+
+            ids = repo.find_objects(visit=[ 120001, 120002 ])
+            self.assertEqual([[ 120002 ]], updated)
+            self.assertEqual([ 120001, 120002 ], list(ids.keys()))
+
+            # Visits without PfsConfig files are looked for again on each query
+            with self.assertLogs(level='WARNING'):
+                repo.find_objects(visit=[ 120003 ])
+            self.assertEqual([[ 120002 ], [ 120003 ]], updated)
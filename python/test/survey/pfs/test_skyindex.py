@@ -0,0 +1,40 @@
+from unittest import TestCase
+import numpy as np
+
+from pfs.ga.pfsspec.survey.pfs import SkyIndex
+
+class TestSkyIndex(TestCase):
+
+    def get_test_index(self):
+        ra = np.array([ 10.0, 10.5, 11.0, 359.9, 0.1, 180.0, np.nan ])
+        dec = np.array([ 0.0, 0.0, 0.0, 0.0, 0.0, 89.9, 0.0 ])
+        return SkyIndex(ra, dec)
+
+    def test_query_cone(self):
+        index = self.get_test_index()
+
+        idx = index.query_cone(10.0, 0.0, 0.6)
+        self.assertEqual([ 0, 1 ], idx.tolist())
+
+        idx = index.query_cone(0.0, 0.0, 0.2)
+        self.assertEqual([ 3, 4 ], idx.tolist())
+
+        mask = index.cone(0.0, 90.0, 0.2)
+        self.assertEqual([ 5 ], np.nonzero(mask)[0].tolist())
+
+        mask = SkyIndex.cone_mask(index.ra, index.dec, 10.0, 0.0, 0.6)
+        self.assertEqual([ 0, 1 ], np.nonzero(mask)[0].tolist())
+
+    def test_query_box(self):
+        index = self.get_test_index()
+
+        idx = index.query_box(10.2, 11.5, -1, 1)
+        self.assertEqual([ 1, 2 ], idx.tolist())
+
+        # Box wrapping around RA = 0
+        idx = index.query_box(359, 1, -1, 1)
+        self.assertEqual([ 3, 4 ], idx.tolist())
+
+        # Large box
+        idx = index.query_box(0, 270, -1, 90)
+        self.assertEqual([ 0, 1, 2, 4, 5 ], idx.tolist())
@@ -0,0 +1,72 @@
+import re
+from types import SimpleNamespace
+from unittest import TestCase
+
+from pfs.ga.pfsspec.survey.repo import IntFilter, StringFilter
+from pfs.ga.pfsspec.survey.repo.butlerrepo import ButlerRepo
+
+class Product():
+    pass
+
+class FileUri():
+    scheme = 'file'
+
+    def __init__(self, path):
+        self.ospath = path
+
+class FakeButler():
+    # Returns a fixed list of dataset refs, with file names derived from the run collection
+
+    def __init__(self, refs):
+        self.refs = refs
+
+    def query_datasets(self, name, where=None):
+        return self.refs
+
+    def getURI(self, dsref):
+        run = dsref.run.replace('/', '_')
+        return FileUri(f'/data/product_{dsref.dataId["visit"]:06d}_{run}.fits')
+
+class ParseCountingRepo(ButlerRepo):
+    def __init__(self, config=None, orig=None):
+        super().__init__(config=config, orig=orig)
+        self.parsed = 0
+
+    def parse_product_identity(self, product, path, required=True):
+        self.parsed += 1
+        return super().parse_product_identity(product, path, required=required)
+
+class TestButlerRepo(TestCase):
+    def get_test_config(self):
+        return SimpleNamespace(
+            variables = {
+                'butlercollections': 'PFS/runs',
+            },
+            products = {
+                Product: SimpleNamespace(
+                    name = 'product',
+                    params = SimpleNamespace(
+                        visit = IntFilter(name='visit', format='{:06d}'),
+                        run = StringFilter(name='run'),
+                    ),
+                    params_regex = [
+                        re.compile(r'product_(?P<visit>\d{6})_(?P<run>.+)\.fits$'),
+                    ],
+                ),
+            }
+        )
+
+    def test_find_product(self):
+        refs = [ SimpleNamespace(id=i, run='PFS/runs/a' if i < 3 else 'PFS/runs/b', dataId={ 'visit': 100 + i })
+                 for i in range(5) ]
+
+        repo = ParseCountingRepo(self.get_test_config())
+        repo._ButlerRepo__butler = FakeButler(refs)
+        files, ids = repo.find_product(Product)
+
+        self.assertEqual(5, len(files))
+        self.assertEqual([ 100, 101, 102, 103, 104 ], ids.visit)
+        self.assertEqual(3 * [ 'PFS_runs_a' ] + 2 * [ 'PFS_runs_b' ], ids.run)
+
+        # The run is parsed from a single file name of each run collection
+        self.assertEqual(2, repo.parsed)
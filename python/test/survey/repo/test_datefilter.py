@@ -1,6 +1,7 @@
 import os
 from datetime import date
 from unittest import TestCase
+import numpy as np
 
 from pfs.ga.pfsspec.survey.repo import DateFilter
 
@@ -28,4 +29,30 @@ class TestDateFilter(TestCase):
         self.assertEqual([date(2024, 1, 2), date(2025, 3, 4)], filter.values)
         
         filter.parse(['2024-01-02-2025-03-04'])
-        self.assertEqual([(date(2024, 1, 2), date(2025, 3, 4))], filter.values)
\ No newline at end of file
+        self.assertEqual([(date(2024, 1, 2), date(2025, 3, 4))], filter.values)
+
+    def test_get_glob_patterns(self):
+        filter = DateFilter(format='{:%Y%m%d}')
+
+        filter.values = [date(2024, 1, 2)]
+        self.assertEqual(['20240102'], filter.get_glob_patterns())
+
+        filter.values = [(date(2024, 1, 30), date(2024, 2, 2))]
+        self.assertEqual(['20240130', '20240131', '20240201', '20240202'], filter.get_glob_patterns())
+
+        filter.values = [(date(2024, 1, 2), date(2025, 3, 4))]
+        self.assertEqual(['[0-9][0-9][0-9][0-9][0-1][0-9][0-3][0-9]'], filter.get_glob_patterns())
+
+    def test_mask(self):
+        values = np.array([date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 5)])
+
+        filter = DateFilter()
+
+        filter.values = [date(2024, 1, 2)]
+        np.testing.assert_array_equal([False, True, False], filter.mask(values))
+
+        filter.values = [date(2024, 1, 1), (date(2024, 1, 3), date(2024, 1, 10))]
+        np.testing.assert_array_equal([True, False, True], filter.mask(values))
+
+        filter.values = [(date(2024, 1, 2), date(2024, 1, 5))]
+        np.testing.assert_array_equal([False, True, True], filter.mask(values.astype('datetime64[D]')))
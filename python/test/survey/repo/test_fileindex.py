@@ -0,0 +1,150 @@
+import os
+import re
+import time
+import tempfile
+from datetime import date
+from types import SimpleNamespace
+from enum import IntEnum
+from unittest import TestCase
+
+from pfs.ga.pfsspec.survey.repo import FileSystemRepo, IntFilter, DateFilter, StringFilter, EnumFilter
+from pfs.ga.pfsspec.survey.repo.fileindex import FileIndex
+
+class Color(IntEnum):
+    RED = 1
+    GREEN = 2
+
+class TestFileIndex(TestCase):
+
+    def get_test_config(self):
+        return SimpleNamespace(
+            variables = {
+                'datadir': None,
+            },
+            products = {
+                'product': SimpleNamespace(
+                    name = 'product',
+                    params = SimpleNamespace(
+                        run = StringFilter(name='run'),
+                        visit = IntFilter(name='visit', format='{:06d}'),
+                        date = DateFilter(name='date', format='{:%Y%m%d}'),
+                    ),
+                    params_regex = [
+                        re.compile(r'product/(?P<date>\d{8})/(\d{6})/product_(?P<visit>\d{6})_(?P<run>.+)\.fits$'),
+                    ],
+                    dir_format = [ '$datadir', 'product/{date}/{visit}' ],
+                    filename_format = 'product_{visit}_{run_}.fits',
+                ),
+            }
+        )
+
+    def create_file(self, root, d, visit, run='run1'):
+        dir = os.path.join(root, 'product', f'{d:%Y%m%d}', f'{visit:06d}')
+        os.makedirs(dir, exist_ok=True)
+        filename = os.path.join(dir, f'product_{visit:06d}_{run}.fits')
+        with open(filename, 'w'):
+            pass
+        return filename
+
+    def get_test_repo(self, root):
+        repo = FileSystemRepo(self.get_test_config(), file_index=os.path.join(root, 'index.sqlite'))
+        repo.variables['datadir'] = root
+        return repo
+
+    def test_find_product(self):
+        with tempfile.TemporaryDirectory() as root:
+            self.create_file(root, date(2024, 6, 1), 120001)
+            self.create_file(root, date(2024, 6, 1), 120002)
+            self.create_file(root, date(2024, 6, 2), 120003)
+            self.create_file(root, date(2024, 6, 2), 120004, run='run2')
+
+            repo = self.get_test_repo(root)
+
+            files, ids = repo.find_product('product')
+            self.assertEqual(4, len(files))
+            self.assertEqual([120001, 120002, 120003, 120004], ids.visit)
+            self.assertEqual(date(2024, 6, 2), ids.date[2])
+
+            files, ids = repo.find_product('product', visit=120003)
+            self.assertEqual([120003], ids.visit)
+
+            files, ids = repo.find_product('product', visit=(120002, 120003))
+            self.assertEqual([120002, 120003], ids.visit)
+
+            files, ids = repo.find_product('product', date=date(2024, 6, 2), run='run*')
+            self.assertEqual([120003, 120004], ids.visit)
+
+            files, ids = repo.find_product('product', run='run2')
+            self.assertEqual([120004], ids.visit)
+
+    def test_refresh(self):
+        with tempfile.TemporaryDirectory() as root:
+            self.create_file(root, date(2024, 6, 1), 120001)
+            filename = self.create_file(root, date(2024, 6, 1), 120002)
+
+            repo = self.get_test_repo(root)
+            files, ids = repo.find_product('product')
+            self.assertEqual(2, len(files))
+
+            # Make sure the directory modification times change
+            time.sleep(0.01)
+
+            os.remove(filename)
+            self.create_file(root, date(2024, 6, 1), 120001, run='run2')
+            self.create_file(root, date(2024, 6, 3), 120005)
+
+            files, ids = repo.find_product('product')
+            self.assertEqual(3, len(files))
+            self.assertEqual(['run1', 'run2', 'run1'], ids.run)
+            self.assertEqual([120001, 120001, 120005], ids.visit)
+
+            # A new repo should read the persisted index
+            repo = self.get_test_repo(root)
+            files, ids = repo.find_product('product', visit=120005)
+            self.assertEqual(1, len(files))
+
+    def test_find_product_glob(self):
+        with tempfile.TemporaryDirectory() as root:
+            self.create_file(root, date(2024, 6, 1), 120001)
+            self.create_file(root, date(2024, 6, 1), 120002)
+            self.create_file(root, date(2024, 6, 2), 120013)
+
+            # Without the file index, the glob patterns are expanded
+            repo = FileSystemRepo(self.get_test_config())
+            repo.variables['datadir'] = root
+
+            files, ids = repo.find_product('product', visit=[120001, (120010, 120019)])
+            self.assertEqual([120001, 120013], sorted(ids.visit))
+
+            files, ids = repo.find_product('product', date=(date(2024, 6, 2), date(2024, 6, 4)))
+            self.assertEqual([120013], ids.visit)
+
+    def test_query_glob_depth(self):
+        with tempfile.TemporaryDirectory() as root:
+            self.create_file(root, date(2024, 6, 1), 120001)
+
+            index = FileIndex(os.path.join(root, 'index.sqlite'))
+            params = { 'visit': IntFilter(name='visit') }
+            params_regex = [ re.compile(r'product_(?P<visit>\d{6})_') ]
+
+            # Index the files, then query a pattern that is a level shallower
+            files, ids = index.find('files', os.path.join(root, 'product', '*', '*', '*.fits'), params, params_regex)
+            self.assertEqual(1, len(files))
+
+            files, ids = index.query('files', os.path.join(root, 'product', '*', '*.fits'), params)
+            self.assertEqual(0, len(files))
+
+    def test_query_enum(self):
+        with tempfile.TemporaryDirectory() as root:
+            self.create_file(root, date(2024, 6, 1), 1)
+            self.create_file(root, date(2024, 6, 1), 2)
+
+            index = FileIndex(os.path.join(root, 'index.sqlite'))
+            # Repositories copy their filters, the copy must keep the enum type
+            params = { 'visit': EnumFilter(name='visit', enum_type=Color).copy() }
+            self.assertIs(Color, params['visit'].enum_type)
+            params_regex = [ re.compile(r'product_(?P<visit>\d{6})_') ]
+
+            files, ids = index.find('files', os.path.join(root, 'product', '*', '*', '*.fits'), params, params_regex)
+            self.assertEqual([ Color.RED, Color.GREEN ], ids.visit)
+            self.assertIsInstance(ids.visit[0], Color)
@@ -1,5 +1,6 @@
 import os
 from unittest import TestCase
+import numpy as np
 
 from pfs.ga.pfsspec.survey.repo import IntFilter
 
@@ -47,4 +48,43 @@ class TestIntFilter(TestCase):
         self.assertEqual('IntFilter(12345, 23456)', repr(filter))
 
         filter.values = [(12345, 12348)]
-        self.assertEqual('IntFilter((12345, 12348))', repr(filter))
\ No newline at end of file
+        self.assertEqual('IntFilter((12345, 12348))', repr(filter))
+
+    def test_get_glob_patterns(self):
+        filter = IntFilter(format='{:06d}')
+
+        filter.values = None
+        self.assertEqual(['*'], filter.get_glob_patterns())
+
+        filter.values = [120, 123]
+        self.assertEqual(['000120', '000123'], filter.get_glob_patterns())
+
+        filter.values = [120, (123, 127)]
+        self.assertEqual(['000120', '00012[3-7]'], filter.get_glob_patterns())
+
+        filter.values = [(120000, 129999)]
+        self.assertEqual(['12????'], filter.get_glob_patterns())
+
+        filter.values = [(119995, 130004)]
+        self.assertEqual(['11999[5-9]', '12????', '13000[0-4]'], filter.get_glob_patterns())
+
+        filter.values = [(1234, 98765)]
+        self.assertEqual(['*'], filter.get_glob_patterns(max_count=4))
+
+        filter = IntFilter(format='{}')
+        filter.values = [(8, 11)]
+        self.assertEqual(['8', '9', '10', '11'], filter.get_glob_patterns())
+
+    def test_mask(self):
+        values = np.array([120, 121, 125, 130])
+
+        filter = IntFilter()
+
+        filter.values = None
+        np.testing.assert_array_equal([True, True, True, True], filter.mask(values))
+
+        filter.values = [121, 130]
+        np.testing.assert_array_equal([False, True, False, True], filter.mask(values))
+
+        filter.values = [120, (124, 128)]
+        np.testing.assert_array_equal([True, False, True, False], filter.mask(values))
@@ -0,0 +1,60 @@
+import time
+from unittest import TestCase
+
+from pfs.ga.pfsspec.survey.repo import LruCache
+
+class TestLruCache(TestCase):
+    def test_get_set(self):
+        cache = LruCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual(3, cache.get('c', 3))
+
+    def test_evict(self):
+        cache = LruCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(2, len(cache))
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+
+        cache.maxsize = 1
+        self.assertEqual(1, len(cache))
+        self.assertIn('c', cache)
+
+    def test_ttl(self):
+        cache = LruCache(maxsize=2, ttl=0.01)
+        cache.set('a', 1)
+        self.assertEqual(1, cache.get('a'))
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('a'))
+        self.assertNotIn('a', cache)
+
+    def test_stamp(self):
+        stamps = { 'x': 1 }
+        cache = LruCache(maxsize=2, get_stamp=lambda v: stamps.get(v))
+        cache.set('a', 'x')
+        self.assertEqual('x', cache.get('a'))
+        stamps['x'] = 2
+        self.assertIsNone(cache.get('a'))
+
+    def test_validate(self):
+        calls = []
+        cache = LruCache(maxsize=2, get_stamp=lambda v: calls.append(v), validate=False)
+        cache.set('a', 'x')
+        self.assertEqual('x', cache.get('a'))
+        self.assertEqual(0, len(calls))
+
+    def test_stats(self):
+        cache = LruCache(maxsize=2)
+        cache.set('a', 1)
+        cache.get('a')
+        cache.get('b')
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
+        cache.reset_stats()
+        self.assertEqual(0, cache.hits)
@@ -0,0 +1,241 @@
+import os
+import re
+import tempfile
+from types import SimpleNamespace
+from unittest import TestCase
+
+from pfs.ga.pfsspec.survey.repo import FileSystemRepo, IntFilter, StringFilter
+
+class Product():
+    pass
+
+class Container():
+    pass
+
+class Exposure():
+    pass
+
+def load_product(identity, filename, dir):
+    with open(filename) as f:
+        return f.read()
+
+def load_container_product(identity, filename, dir):
+    with open(filename) as f:
+        for i, c in enumerate(f.read()):
+            yield c, SimpleNamespace(visit=identity.visit, index=i)
+
+class TestRepo(TestCase):
+
+    def get_test_config(self):
+        return SimpleNamespace(
+            variables = {
+                'datadir': None,
+            },
+            products = {
+                Product: SimpleNamespace(
+                    name = 'product',
+                    params = SimpleNamespace(
+                        visit = IntFilter(name='visit', format='{:06d}'),
+                    ),
+                    params_regex = [
+                        re.compile(r'product_(?P<visit>\d{6})\.txt$'),
+                    ],
+                    dir_format = [ '$datadir' ],
+                    filename_format = 'product_{visit}.txt',
+                    load = load_product,
+                ),
+                Container: SimpleNamespace(
+                    name = 'container',
+                    params = SimpleNamespace(
+                        visit = IntFilter(name='visit', format='{:06d}'),
+                    ),
+                    params_regex = [
+                        re.compile(r'container_(?P<visit>\d{6})\.txt$'),
+                    ],
+                    dir_format = [ '$datadir' ],
+                    filename_format = 'container_{visit}.txt',
+                ),
+                (Container, Product): SimpleNamespace(
+                    name = 'container',
+                    params = SimpleNamespace(
+                        visit = IntFilter(name='visit', format='{:06d}'),
+                    ),
+                    params_regex = [
+                        re.compile(r'container_(?P<visit>\d{6})\.txt$'),
+                    ],
+                    load = load_container_product,
+                ),
+                Exposure: SimpleNamespace(
+                    name = 'exposure',
+                    params = SimpleNamespace(
+                        visit = IntFilter(name='visit', format='{:06d}'),
+                        arm = StringFilter(name='arm'),
+                    ),
+                    params_regex = [
+                        re.compile(r'exposure_(?P<visit>\d{6})(?P<arm>[br])\.txt$'),
+                    ],
+                    dir_format = [ '$datadir' ],
+                    filename_format = 'exposure_{visit}{arm}.txt',
+                    load = load_product,
+                ),
+            }
+        )
+
+    def get_test_repo(self, root, n=20):
+        for visit in range(n):
+            with open(os.path.join(root, f'product_{visit:06d}.txt'), 'w') as f:
+                f.write(str(visit))
+
+        repo = FileSystemRepo(self.get_test_config())
+        repo.variables['datadir'] = root
+        return repo
+
+    def test_load_products(self):
+        with tempfile.TemporaryDirectory() as root:
+            repo = self.get_test_repo(root)
+            files, ids = repo.find_product(Product)
+
+            res = list(repo.load_products(Product, files=files, threads=3))
+            self.assertEqual([ str(v) for v in ids.visit ], [ data for data, _, _ in res ])
+            self.assertEqual(files, [ fn for _, _, fn in res ])
+
+            res = list(repo.load_products(Product, identities=ids, threads=3))
+            self.assertEqual([ str(v) for v in ids.visit ], [ data for data, _, _ in res ])
+
+            res = list(repo.load_products(Product, files=files, threads=2, executor='process'))
+            self.assertEqual([ str(v) for v in ids.visit ], [ data for data, _, _ in res ])
+
+    def test_load_products_missing(self):
+        with tempfile.TemporaryDirectory() as root:
+            repo = self.get_test_repo(root, n=3)
+            files, ids = repo.find_product(Product)
+            os.remove(files[1])
+
+            res = list(repo.load_products(Product, files=files, ignore_missing_files=True))
+            self.assertEqual([ str(ids.visit[0]), None, str(ids.visit[2]) ], [ data for data, _, _ in res ])
+
+            with self.assertRaises(FileNotFoundError):
+                list(repo.load_products(Product, files=files))
+
+    def test_locate_product(self):
+        with tempfile.TemporaryDirectory() as root:
+            repo = self.get_test_repo(root, n=3)
+
+            filename, identity = repo.locate_product(Product, visit=1)
+            self.assertEqual(1, identity.visit)
+            filename, identity = repo.locate_product(Product, visit=1)
+            self.assertEqual(1, repo.location_cache.hits)
+
+            # Removed files are not returned from the cache
+            os.remove(filename)
+            with self.assertRaises(FileNotFoundError):
+                repo.locate_product(Product, visit=1)
+
+    def count_find_product(self, repo):
+        # Count the searches that were not served from the cache
+        calls = []
+        find_product = repo.find_product
+        def find(*args, **kwargs):
+            calls.append(kwargs)
+            return find_product(*args, **kwargs)
+        repo.find_product = find
+        return calls
+
+    def test_prewarm_location_cache(self):
+        with tempfile.TemporaryDirectory() as root:
+            repo = self.get_test_repo(root, n=3)
+            files, ids = repo.find_product(Product)
+            repo.prewarm_location_cache(Product, files, ids)
+            calls = self.count_find_product(repo)
+
+            for visit in ids.visit:
+                filename, identity = repo.locate_product(Product, visit=visit)
+                self.assertEqual(visit, identity.visit)
+            self.assertEqual(0, len(calls))
+
+            # Prewarming doesn't fill the location cache
+            self.assertEqual(0, len(repo.location_cache))
+
+    def test_prewarm_location_cache_many(self):
+        with tempfile.TemporaryDirectory() as root:
+            repo = self.get_test_repo(root, n=0)
+            for visit in range(1500):
+                for arm in 'br':
+                    with open(os.path.join(root, f'exposure_{visit:06d}{arm}.txt'), 'w') as f:
+                        f.write(arm)
+
+            repo.location_cache.maxsize = 16
+            files, ids = repo.find_product(Exposure)
+            repo.prewarm_location_cache(Exposure, files, ids)
+            calls = self.count_find_product(repo)
+
+            for visit in range(1500):
+                filename, identity = repo.locate_product(Exposure, visit=visit, arm='r')
+                self.assertEqual((visit, 'r'), (identity.visit, identity.arm))
+            self.assertEqual(0, len(calls))
+
+    def test_prewarm_location_cache_subset(self):
+        with tempfile.TemporaryDirectory() as root:
+            repo = self.get_test_repo(root, n=0)
+            for visit in range(3):
+                for arm in 'br':
+                    with open(os.path.join(root, f'exposure_{visit:06d}{arm}.txt'), 'w') as f:
+                        f.write(arm)
+            with open(os.path.join(root, f'exposure_{3:06d}r.txt'), 'w') as f:
+                f.write('r')
+
+            files, ids = repo.find_product(Exposure)
+            repo.prewarm_location_cache(Exposure, files, ids)
+            calls = self.count_find_product(repo)
+
+            # Lookups by any parameters that identify a single file are served from the prewarmed files
+            filename, identity = repo.locate_product(Exposure, arm='b', visit=1)
+            self.assertEqual((1, 'b'), (identity.visit, identity.arm))
+            filename, identity = repo.locate_product(Exposure, visit=IntFilter(3, name='visit'))
+            self.assertEqual((3, 'r'), (identity.visit, identity.arm))
+            self.assertEqual(0, len(calls))
+
+            # Ambiguous lookups are searched for
+            with self.assertRaises(FileNotFoundError):
+                repo.locate_product(Exposure, visit=1)
+            self.assertEqual(1, len(calls))
+
+    def test_locate_product_filter(self):
+        with tempfile.TemporaryDirectory() as root:
+            repo = self.get_test_repo(root, n=3)
+
+            # Constant filters are cached by their value
+            repo.locate_product(Product, visit=IntFilter(1, name='visit'))
+            repo.locate_product(Product, visit=IntFilter(1, name='visit'))
+            repo.locate_product(Product, visit=1)
+            self.assertEqual(2, repo.location_cache.hits)
+            self.assertEqual(1, len(repo.location_cache))
+
+    def test_location_cache_validate(self):
+        with tempfile.TemporaryDirectory() as root:
+            repo = self.get_test_repo(root, n=3)
+            repo.location_cache.validate = False
+
+            filename, identity = repo.locate_product(Product, visit=1)
+            os.remove(filename)
+
+            # Without validation, the cached location is returned
+            self.assertEqual(filename, repo.locate_product(Product, visit=1)[0])
+
+    def test_iter_products_from_container(self):
+        with tempfile.TemporaryDirectory() as root:
+            repo = self.get_test_repo(root, n=0)
+            with open(os.path.join(root, 'container_000001.txt'), 'w') as f:
+                f.write('abc')
+
+            it = repo.iter_products_from_container(Container, Product, identity=SimpleNamespace(visit=1))
+            data, id, filename = next(it)
+            self.assertEqual('a', data)
+            self.assertEqual(0, id.index)
+
+            res = repo.load_products_from_container(Container, Product, identity=SimpleNamespace(visit=1))
+            self.assertEqual([ 'a', 'b', 'c' ], [ d for d, _, _ in res ])
+
+            repo.ignore_missing_files = True
+            with self.assertRaises(FileNotFoundError):
+                repo.load_products_from_container(Container, Product, identity=SimpleNamespace(visit=2))
@@ -1,5 +1,6 @@
 import os
 from unittest import TestCase
+import numpy as np
 
 from pfs.ga.pfsspec.survey.repo import StringFilter
 
@@ -57,4 +58,26 @@ class TestStringFilter(TestCase):
 
         filter.values = ['123*456']
         self.assertTrue(filter.match('123456'))
-        self.assertTrue(filter.match('123abc456'))
\ No newline at end of file
+        self.assertTrue(filter.match('123abc456'))
+
+    def test_mask(self):
+        values = np.array(['S24A-001', 'S24A-002', 'S24B-001', 'S24A-001', 'cal'])
+
+        filter = StringFilter()
+
+        filter.values = None
+        np.testing.assert_array_equal([True, True, True, True, True], filter.mask(values))
+
+        filter.values = ['S24A-001']
+        np.testing.assert_array_equal([True, False, False, True, False], filter.mask(values))
+
+        filter.values = ['S24A-*', 'cal']
+        np.testing.assert_array_equal([True, True, False, True, True], filter.mask(values))
+
+        filter.values = ['S24?-001']
+        np.testing.assert_array_equal([[True, False], [True, True]], filter.mask(values[[0, 1, 2, 3]].reshape(2, 2)))
+
+        filter.values = [('S24A-002', 'S24B-001'), 'cal']
+        np.testing.assert_array_equal([False, True, True, False, True], filter.mask(values))
+        self.assertTrue(filter.match('S24A-005'))
+        self.assertFalse(filter.match('S24A-001'))
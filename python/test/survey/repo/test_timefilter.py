@@ -2,6 +2,7 @@ import os
 from datetime import datetime
 from dateutil.tz import tz
 from unittest import TestCase
+import numpy as np
 
 from pfs.ga.pfsspec.survey.repo import TimeFilter
 
@@ -32,4 +33,20 @@ class TestTimeFilter(TestCase):
         self.assertEqual([datetime(2025, 3, 1, 7, 38, 9)], filter.values)
 
         filter.parse(['20250301T073809Z'])
-        self.assertEqual([datetime(2025, 3, 1, 7, 38, 9, tzinfo=tz.tzutc())], filter.values)
\ No newline at end of file
+        self.assertEqual([datetime(2025, 3, 1, 7, 38, 9, tzinfo=tz.tzutc())], filter.values)
+
+    def test_mask(self):
+        values = [ datetime(2024, 6, 1, 12), datetime(2024, 6, 2, 12), datetime(2024, 6, 5) ]
+
+        filter = TimeFilter()
+        np.testing.assert_array_equal([True, True, True], filter.mask(values))
+
+        filter.values = [ datetime(2024, 6, 1, 12) ]
+        np.testing.assert_array_equal([True, False, False], filter.mask(values))
+
+        filter.values = [ (datetime(2024, 6, 2), datetime(2024, 6, 4)), datetime(2024, 6, 5) ]
+        np.testing.assert_array_equal([False, True, True], filter.mask(values))
+
+        # Timezone aware values are compared in UTC
+        filter.values = [ datetime(2024, 6, 1, 14, tzinfo=tz.tzoffset(None, 7200)) ]
+        np.testing.assert_array_equal([True, False, False], filter.mask(values))
@@ -0,0 +1,118 @@
+import os
+import pickle
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from unittest import TestCase
+
+from pfs.ga.pfsspec.survey.sdss.io.sdssmirror import SdssMirror
+
+class CountingHandler(SimpleHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        CountingHandler.requests.append(self.path)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+class TestSdssMirror(TestCase):
+    def setUp(self):
+        self.srcdir = tempfile.TemporaryDirectory()
+        self.cachedir = tempfile.TemporaryDirectory()
+
+        for i in range(8):
+            with open(os.path.join(self.srcdir.name, f'spec-{i:04d}.fits'), 'wb') as f:
+                f.write(os.urandom(1000 + i))
+
+        CountingHandler.requests = []
+        handler = partial(CountingHandler, directory=self.srcdir.name)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.srcdir.cleanup()
+        self.cachedir.cleanup()
+
+    def get_mirror(self):
+        return SdssMirror(cache_dir=self.cachedir.name, threads=4, retries=0)
+
+    def read(self, filename):
+        with open(filename, 'rb') as f:
+            return f.read()
+
+    def test_get(self):
+        mirror = self.get_mirror()
+        url = self.url + '/spec-0000.fits'
+
+        filename = mirror.get(url)
+        self.assertTrue(filename.startswith(self.cachedir.name))
+        self.assertTrue(filename.endswith('.fits'))
+        self.assertEqual(self.read(os.path.join(self.srcdir.name, 'spec-0000.fits')), self.read(filename))
+
+        # Second request is served from the mirror, even by a new instance
+        self.assertEqual(filename, self.get_mirror().get(url))
+        self.assertEqual(1, len(CountingHandler.requests))
+
+        # Files available locally are not downloaded
+        local = os.path.join(self.srcdir.name, 'spec-0001.fits')
+        self.assertEqual(local, mirror.get(self.url + '/spec-0001.fits', local))
+        self.assertEqual(1, len(CountingHandler.requests))
+
+        # Lock files are removed after the download
+        for dir, _, files in os.walk(self.cachedir.name):
+            self.assertEqual([], [ f for f in files if f.endswith('.lock') ])
+
+    def test_get_concurrent(self):
+        mirror = self.get_mirror()
+        url = self.url + '/spec-0002.fits'
+
+        threads = [ threading.Thread(target=mirror.get, args=(url,)) for _ in range(8) ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(1, len(CountingHandler.requests))
+
+    def wait_requests(self, count, timeout=5):
+        start = time.monotonic()
+        while len(CountingHandler.requests) < count and time.monotonic() - start < timeout:
+            time.sleep(0.01)
+        # Give the prefetcher a chance to run further ahead than it should
+        time.sleep(0.1)
+
+    def test_prefetch(self):
+        mirror = self.get_mirror()
+        items = [ (self.url + f'/spec-{i:04d}.fits', None) for i in range(8) ]
+
+        # The prefetcher stays `ahead` files ahead of the items the reader is done with
+        mirror.prefetch(iter(items), ahead=2)
+        self.wait_requests(2)
+        self.assertEqual(2, len(CountingHandler.requests))
+
+        mirror.advance(3)
+        self.wait_requests(5)
+        self.assertEqual(5, len(CountingHandler.requests))
+
+        mirror.stop_prefetch()
+
+        # Whatever was not prefetched before stopping is downloaded on demand
+        for url, _ in items:
+            mirror.get(url)
+        self.assertEqual(8, len(CountingHandler.requests))
+
+    def test_pickle(self):
+        mirror = self.get_mirror()
+        mirror.get(self.url + '/spec-0003.fits')
+
+        mirror = pickle.loads(pickle.dumps(mirror))
+        mirror.get(self.url + '/spec-0003.fits')
+        self.assertEqual(1, len(CountingHandler.requests))
@@ -0,0 +1,89 @@
+import os
+import sqlite3
+import tempfile
+import pandas as pd
+from unittest import TestCase
+
+from pfs.ga.pfsspec.survey.sdss.io.sdsssurveyreader import SdssSurveyReader
+
+class LocalSdssSurveyReader(SdssSurveyReader):
+    # Runs the queries against a local database instead of CasJobs
+
+    def __init__(self, db, orig=None):
+        super().__init__(orig=orig)
+        self.db = db
+        self.queries = []
+
+    def execute_query(self, sql, context='DR7'):
+        self.queries.append(sql)
+        return pd.read_sql_query(sql, self.db)
+
+class TestSdssSurveyReader(TestCase):
+    COLUMNS = 's.specObjID AS id, s.mjd, s.plate, s.fiberID AS fiber'
+    SOURCE = 'FROM SpecObj s WHERE s.mjd > 0'
+
+    def setUp(self):
+        self.db = sqlite3.connect(':memory:', check_same_thread=False)
+        self.db.execute('CREATE TABLE SpecObj (specObjID INTEGER, mjd INTEGER, plate INTEGER, fiberID INTEGER)')
+        rows = [ (i, 51600 + i % 7, 266 + i % 3, 640 - i) for i in range(40) ]
+        self.db.executemany('INSERT INTO SpecObj VALUES (?, ?, ?, ?)', rows)
+
+        self.cachedir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.db.close()
+        self.cachedir.cleanup()
+
+    def get_reader(self, page_size=10, query_cache=None):
+        reader = LocalSdssSurveyReader(self.db)
+        reader.top = None
+        reader.page_size = page_size
+        reader.query_threads = 2
+        reader.query_cache = query_cache
+        return reader
+
+    def test_get_query_pages(self):
+        reader = self.get_reader(page_size=10)
+        counts = pd.DataFrame({ 'mjd': [ 1, 2, 3, 4, 5 ], 'n': [ 4, 4, 4, 12, 1 ] })
+        self.assertEqual([ (1, 3), (4, 4), (5, 5) ], reader.get_query_pages(counts))
+
+    def test_execute_paged_query(self):
+        reader = self.get_reader(page_size=0)
+        expected = reader.execute_paged_query(self.COLUMNS, self.SOURCE)
+        self.assertEqual(1, len(reader.queries))
+
+        reader = self.get_reader(page_size=10)
+        df = reader.execute_paged_query(self.COLUMNS, self.SOURCE)
+        self.assertGreater(len(reader.queries), 2)
+        pd.testing.assert_frame_equal(expected, df)
+
+    def test_execute_paged_query_cache(self):
+        reader = self.get_reader(page_size=10, query_cache=self.cachedir.name)
+        expected = reader.execute_paged_query(self.COLUMNS, self.SOURCE)
+
+        # Same query is served from the cache
+        reader = self.get_reader(page_size=10, query_cache=self.cachedir.name)
+        df = reader.execute_paged_query(self.COLUMNS, self.SOURCE)
+        self.assertEqual(0, len(reader.queries))
+        pd.testing.assert_frame_equal(expected, df)
+
+        # Different filters run a new query
+        reader = self.get_reader(page_size=10, query_cache=self.cachedir.name)
+        df = reader.execute_paged_query(self.COLUMNS, 'FROM SpecObj s WHERE s.mjd > 51601')
+        self.assertGreater(len(reader.queries), 0)
+        self.assertTrue((df['mjd'] > 51601).all())
+
+    def test_execute_paged_query_resume(self):
+        reader = self.get_reader(page_size=10, query_cache=self.cachedir.name)
+        expected = reader.execute_paged_query(self.COLUMNS, self.SOURCE)
+
+        # Pretend the previous run was interrupted after the pages were written
+        cache_dir = os.path.join(self.cachedir.name, os.listdir(self.cachedir.name)[0])
+        for f in os.listdir(cache_dir):
+            if f.startswith('result'):
+                os.remove(os.path.join(cache_dir, f))
+
+        reader = self.get_reader(page_size=10, query_cache=self.cachedir.name)
+        df = reader.execute_paged_query(self.COLUMNS, self.SOURCE)
+        self.assertEqual(1, len(reader.queries))        # Only the page counts
+        pd.testing.assert_frame_equal(expected, df)
@@ -0,0 +1,35 @@
+import os
+import tempfile
+from unittest import TestCase
+import numpy as np
+
+from pfs.ga.pfsspec.survey.hdf5surveystore import Hdf5SurveyStore
+from pfs.ga.pfsspec.survey.surveyspectra import SurveySpectra
+
+class Spectrum():
+    def __init__(self, index):
+        self.index = index
+        self.flux = np.full(10, index, dtype=float)
+
+class TestSurveySpectra(TestCase):
+    def test_getitem(self):
+        with tempfile.TemporaryDirectory() as dir:
+            fn = os.path.join(dir, 'spectra.h5')
+
+            with Hdf5SurveyStore().open(fn, 'w') as store:
+                for i in range(10):
+                    store.append(Spectrum(i))
+
+            spectra = SurveySpectra(Hdf5SurveyStore().open(fn, 'r'), cache_size=2)
+            self.assertEqual(10, len(spectra))
+            self.assertEqual(3, spectra[3].index)
+            self.assertEqual(9, spectra[-1].index)
+            self.assertEqual([ 2, 4, 6 ], [ s.index for s in spectra[2:8:2] ])
+            self.assertEqual(list(range(10)), [ s.index for s in spectra ])
+            self.assertIs(spectra[9], spectra[9])
+
+            with self.assertRaises(IndexError):
+                spectra[10]
+
+            spectra.close()
+            self.assertFalse(spectra.store.is_open)
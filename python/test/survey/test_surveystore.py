@@ -0,0 +1,146 @@
+import os
+import pickle
+import tempfile
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+
+from pfs.ga.pfsspec.survey.surveystore import PickleSurveyStore
+from pfs.ga.pfsspec.survey.hdf5surveystore import Hdf5SurveyStore
+
+class Spectrum():
+    # Number of times any spectrum was unpickled
+    loads = 0
+
+    def __init__(self, index):
+        self.index = index
+        self.flux = np.full(10, index, dtype=float)
+
+    def __setstate__(self, state):
+        Spectrum.loads += 1
+        self.__dict__.update(state)
+
+class TestPickleSurveyStore(TestCase):
+    def get_params(self):
+        return pd.DataFrame({ 'id': np.arange(5), 'snr': np.linspace(1, 5, 5) })
+
+    def test_append_read(self):
+        with tempfile.TemporaryDirectory() as dir:
+            fn = os.path.join(dir, 'spectra.dat')
+
+            with PickleSurveyStore().open(fn, 'w') as store:
+                store.write_params(self.get_params())
+                for i in [ 3, 0, 4, 1, 2 ]:
+                    store.append(Spectrum(i))
+
+            # Opening the file only reads the headers of the records
+            Spectrum.loads = 0
+            with PickleSurveyStore().open(fn, 'r') as store:
+                self.assertEqual(0, Spectrum.loads)
+                self.assertEqual(5, len(store))
+                self.assertEqual((5, 2), store.read_params().shape)
+                self.assertEqual([ 0, 1, 2, 3, 4 ], store.get_index().tolist())
+                self.assertEqual([ 0, 1, 2, 3, 4 ], [ s.index for s in store.read_spectra() ])
+                self.assertEqual(3, store.read_spectrum(3).flux[0])
+
+            with PickleSurveyStore().open(fn, 'a') as store:
+                store.append(Spectrum(5))
+                self.assertEqual(5, store.read_spectrum(5).index)
+
+            with PickleSurveyStore().open(fn, 'r') as store:
+                self.assertEqual(6, len(store))
+
+            # A partially written record at the end is ignored
+            with open(fn, 'r+b') as f:
+                f.truncate(os.path.getsize(fn) - 10)
+            with PickleSurveyStore().open(fn, 'r') as store:
+                self.assertEqual(5, len(store))
+            with PickleSurveyStore().open(fn, 'a') as store:
+                store.append(Spectrum(6))
+            with PickleSurveyStore().open(fn, 'r') as store:
+                self.assertEqual([ 0, 1, 2, 3, 4, 6 ], store.get_index().tolist())
+                self.assertEqual(6, store.read_spectrum(5).index)
+
+    def test_read_legacy(self):
+        with tempfile.TemporaryDirectory() as dir:
+            fn = os.path.join(dir, 'spectra.dat')
+
+            with open(fn, 'wb') as f:
+                pickle.dump(self.get_params(), f)
+                pickle.dump([ Spectrum(1), Spectrum(0) ], f)
+
+            with PickleSurveyStore().open(fn, 'r') as store:
+                self.assertEqual(2, len(store))
+                self.assertEqual([ 0, 1 ], [ s.index for s in store.read_spectra() ])
+
+    def test_pickle(self):
+        with tempfile.TemporaryDirectory() as dir:
+            fn = os.path.join(dir, 'spectra')
+
+            # Open stores can be sent to worker processes, the copies are closed
+            with PickleSurveyStore().open(fn, 'w') as store:
+                store.write_params(self.get_params())
+                store.append(Spectrum(0))
+                copy = pickle.loads(pickle.dumps(store))
+                self.assertFalse(copy.is_open)
+                self.assertEqual(fn, copy.filename)
+                store.append(Spectrum(1))
+
+            with PickleSurveyStore().open(fn, 'r') as store:
+                self.assertEqual(2, len(store))
+
+class TestHdf5SurveyStore(TestCase):
+    def get_params(self):
+        return pd.DataFrame({
+            'id': np.arange(5),
+            'snr': np.linspace(1, 5, 5),
+            'name': [ 'a', 'b', None, 'd', 'e' ],
+            'date': pd.date_range('2024-01-01', periods=5),
+            'flag': [ True, None, False, True, None ],
+            'mixed': np.array([ 1, 'a', None, np.nan, 2.5 ], dtype=object),
+            'count': pd.array([ 1, None, 3, 4, 5 ], dtype='Int64'),
+        })
+
+    def test_append_read(self):
+        with tempfile.TemporaryDirectory() as dir:
+            fn = os.path.join(dir, 'spectra.h5')
+
+            with Hdf5SurveyStore(chunk_size=64).open(fn, 'w') as store:
+                store.write_params(self.get_params())
+                for i in [ 3, 0, 4, 1, 2 ]:
+                    store.append(Spectrum(i))
+
+            with Hdf5SurveyStore().open(fn, 'r') as store:
+                self.assertEqual(5, len(store))
+                params = store.read_params()
+                pd.testing.assert_frame_equal(self.get_params(), params)
+                self.assertEqual([ True, None, False, True, None ], params['flag'].tolist())
+                self.assertIsNone(params['mixed'][2])
+                self.assertTrue(np.isnan(params['mixed'][3]))
+                self.assertEqual(np.datetime64('2024-01-02'), params['date'][1])
+                self.assertEqual([ 0, 1, 2, 3, 4 ], [ s.index for s in store.read_spectra() ])
+                self.assertEqual(4, store.read_spectrum(4).flux[0])
+
+            with Hdf5SurveyStore().open(fn, 'a') as store:
+                store.append(Spectrum(5))
+                self.assertEqual(5, store.read_spectrum(5).index)
+
+            with Hdf5SurveyStore().open(fn, 'r') as store:
+                self.assertEqual(6, len(store))
+                self.assertEqual([ 2, 5 ], [ s.index for s in store.read_spectra([ 2, 5 ]) ])
+
+    def test_pickle(self):
+        with tempfile.TemporaryDirectory() as dir:
+            fn = os.path.join(dir, 'spectra')
+
+            # Open stores can be sent to worker processes, the copies are closed
+            with Hdf5SurveyStore().open(fn, 'w') as store:
+                store.write_params(self.get_params())
+                store.append(Spectrum(0))
+                copy = pickle.loads(pickle.dumps(store))
+                self.assertFalse(copy.is_open)
+                self.assertEqual(fn, copy.filename)
+                store.append(Spectrum(1))
+
+            with Hdf5SurveyStore().open(fn, 'r') as store:
+                self.assertEqual(2, len(store))